@@ -0,0 +1,210 @@
+"""
+Non-interactive batch parsing.
+
+Reads many inputs (one per line, or JSONL), compiles the grammar once and
+parses the inputs across a process pool. Results are streamed to the output
+file as JSONL, in input order:
+
+    python batch.py inputs.txt -o results.jsonl --jobs 8 --trees
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from grammar_cache import DEFAULT_CACHE_DIR, load_compiled_grammar
+from grammar_compiler import compile_grammar
+from lexer import LexError
+
+DEFAULT_GRAMMAR_FILE = "grammar.txt"
+
+# Set in each worker process by _init_worker.
+_compiled = None
+
+
+def _init_worker(compiled):
+    global _compiled
+    _compiled = compiled
+
+
+def parse_record(compiled, record, with_tree=False):
+    """
+    Parses one input record and returns its JSON-serialisable result. A record
+    without a string "input" is not parsed; its result is rejected with an
+    "error" (read_records already sets one for lines that aren't valid JSON).
+    """
+    result = dict(record)
+    text = result.pop("input", None)
+    if not isinstance(text, str):
+        result["accepted"] = False
+        if text is None:
+            result.setdefault("error", "Record has no 'input'")
+        else:
+            result["error"] = f"'input' must be a string, not {type(text).__name__}"
+        return result
+    try:
+        root = compiled.parse(text)
+    except LexError as e:
+        result["accepted"] = False
+        result["error"] = str(e)
+        return result
+
+    result["accepted"] = root is not None
+    if with_tree and root is not None:
+        result["tree"] = root.to_dict()
+    return result
+
+
+def _parse_chunk(records, with_tree):
+    return [parse_record(_compiled, record, with_tree) for record in records]
+
+
+def read_records(f, input_format="lines"):
+    """
+    Yields {"line": n, "input": text} records from f.
+
+    In "jsonl" format each line is either a JSON string or an object with an
+    "input" key; other keys of the object (e.g. an id) are copied to the result.
+    A line that isn't valid JSON yields {"line": n, "error": message} instead,
+    so one bad line doesn't stop the batch.
+    """
+    for line_number, line in enumerate(f, start=1):
+        line = line.rstrip("\n")
+        if input_format == "jsonl":
+            if not line.strip():
+                continue
+            record = {"line": line_number}
+            try:
+                value = json.loads(line)
+            except json.JSONDecodeError as e:
+                record["error"] = f"Invalid JSON: {e}"
+                yield record
+                continue
+            if isinstance(value, dict):
+                record.update(value)
+            else:
+                record["input"] = value
+        else:
+            record = {"line": line_number, "input": line}
+        yield record
+
+
+def _chunked(records, chunksize):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == chunksize:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run_batch(compiled, records, out, jobs=None, chunksize=256, with_tree=False):
+    """
+    Parses records and writes one JSON line per record to out, in input order.
+    Returns (total, accepted).
+
+    Only a bounded number of chunks is in flight at once, so arbitrarily large
+    inputs are streamed rather than loaded up front.
+    """
+    total = accepted = 0
+
+    def write_results(results):
+        nonlocal total, accepted
+        for result in results:
+            total += 1
+            accepted += result["accepted"]
+            out.write(json.dumps(result) + "\n")
+
+    chunks = _chunked(records, chunksize)
+    if jobs == 1:
+        for chunk in chunks:
+            write_results([parse_record(compiled, r, with_tree) for r in chunk])
+        return total, accepted
+
+    jobs = jobs or os.cpu_count() or 1
+    with ProcessPoolExecutor(
+        max_workers=jobs, initializer=_init_worker, initargs=(compiled,)
+    ) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(_parse_chunk, chunk, with_tree))
+            if len(pending) >= jobs * 4:
+                write_results(pending.popleft().result())
+        while pending:
+            write_results(pending.popleft().result())
+
+    return total, accepted
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("inputs", help="input file, or '-' for stdin")
+    arg_parser.add_argument("-g", "--grammar", default=DEFAULT_GRAMMAR_FILE)
+    arg_parser.add_argument("-o", "--output", default="-", help="'-' for stdout")
+    arg_parser.add_argument(
+        "--format",
+        choices=["auto", "lines", "jsonl"],
+        default="auto",
+        help="input format; 'auto' picks jsonl for *.jsonl files",
+    )
+    arg_parser.add_argument(
+        "--cache-dir",
+        default=DEFAULT_CACHE_DIR,
+        help="compiled grammar cache directory; '' disables the cache",
+    )
+    arg_parser.add_argument("-j", "--jobs", type=int, default=None)
+    arg_parser.add_argument("--chunksize", type=int, default=256)
+    arg_parser.add_argument(
+        "--trees", action="store_true", help="include parse trees of accepted inputs"
+    )
+    args = arg_parser.parse_args(argv)
+
+    input_format = args.format
+    if input_format == "auto":
+        input_format = "jsonl" if args.inputs.endswith(".jsonl") else "lines"
+
+    start = time.perf_counter()
+    if args.cache_dir:
+        compiled = load_compiled_grammar(args.grammar, cache_dir=args.cache_dir)
+    else:
+        compiled = compile_grammar(args.grammar)
+    compile_seconds = time.perf_counter() - start
+
+    in_file = sys.stdin if args.inputs == "-" else open(args.inputs, encoding="utf-8")
+    out_file = (
+        sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    )
+    try:
+        start = time.perf_counter()
+        total, accepted = run_batch(
+            compiled,
+            read_records(in_file, input_format),
+            out_file,
+            jobs=args.jobs,
+            chunksize=args.chunksize,
+            with_tree=args.trees,
+        )
+        elapsed = time.perf_counter() - start
+    finally:
+        if in_file is not sys.stdin:
+            in_file.close()
+        if out_file is not sys.stdout:
+            out_file.close()
+
+    rate = total / elapsed if elapsed > 0 else float("inf")
+    print(
+        f"Loaded grammar in {compile_seconds * 1000:.1f} ms; parsed {total} inputs"
+        f" in {elapsed:.2f} s ({rate:,.0f} inputs/s), {accepted} accepted,"
+        f" {total - accepted} rejected",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
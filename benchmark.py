@@ -0,0 +1,317 @@
+"""
+Benchmark suite for grammar analysis, table building and parsing.
+
+Synthetic grammars of a chosen size are generated from the families in
+grammar_families.py, each stressing a different part of the pipeline:
+
+    wide     one non-terminal with many alternatives (large table rows)
+    deep     many precedence levels (long derivation chains, deep stacks)
+    epsilon  long runs of nullable symbols (FIRST/FOLLOW propagation)
+    regex    many regex terminals (lexer and regex fallback matching)
+
+For every grammar and input size, each phase (CFG loading, FIRST, FOLLOW, LL(1)
+table, DPDA conversion, lexing, parsing, ...) is timed separately and its peak
+memory is measured with tracemalloc. The lexer is also benchmarked with many
+keyword terminals, and dpda.DPDA.process_input on a^n b^n. Results are written
+as JSON so runs can be compared:
+
+    python benchmark.py -o before.json
+    python benchmark.py -o after.json --compare before.json
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import dpda
+from grammar_families import GRAMMARS
+from ll1_to_dpda import convert_ll1_to_dpda
+from lexer import Lexer
+from p1 import CFG
+from p2 import DPDA, TransitionIndex
+from parsing_table import CompressedLL1Table, build_ll1_parsing_table
+from tracing import NULL_TRACER
+
+RESULTS_VERSION = 1
+
+def anbn_dpda():
+    """A dpda.DPDA for a^n b^n (n >= 1), like dpda.txt."""
+    machine = dpda.DPDA()
+    machine.states = {"q0", "q1", "q2"}
+    machine.input_alphabet = {"a", "b"}
+    machine.stack_alphabet = {"A", "Z"}
+    machine.start_state = "q0"
+    machine.start_stack = "Z"
+    machine.accept_states = {"q2"}
+    machine.transitions = {
+        ("q0", "a", "Z"): ("q1", "AZ"),
+        ("q1", "a", "A"): ("q1", "AA"),
+        ("q1", "b", "A"): ("q1", ""),
+        ("q1", "", "Z"): ("q2", ""),
+    }
+    return machine
+
+
+class Recorder:
+    """Times phases (best and mean of repeat runs) and their tracemalloc peaks."""
+
+    def __init__(self, repeat=3, memory=True):
+        self.repeat = repeat
+        self.memory = memory
+        self.results = []
+
+    def phase(self, name, fn, **labels):
+        """Runs fn repeat times, records the result row and returns fn's last result."""
+        times = []
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            result = fn()
+            times.append(time.perf_counter() - start)
+
+        peak = None
+        if self.memory:
+            # A separate run: tracing allocations distorts the timings.
+            tracemalloc.start()
+            try:
+                result = fn()
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        self.results.append(
+            dict(
+                labels,
+                phase=name,
+                seconds=min(times),
+                mean_seconds=sum(times) / len(times),
+                peak_bytes=peak,
+            )
+        )
+        return result
+
+
+def bench_grammar(recorder, family, size, input_sizes, seed=0, workdir=None):
+    grammar = GRAMMARS[family](size)
+    with tempfile.NamedTemporaryFile(
+        "w", suffix=".txt", dir=workdir, delete=False, encoding="utf-8"
+    ) as f:
+        f.write(grammar.text)
+        path = f.name
+
+    try:
+        labels = {"grammar": family, "grammar_size": size, "input_tokens": None}
+        phase = recorder.phase
+        cfg = phase("cfg_load", lambda: CFG(path, tracer=NULL_TRACER), **labels)
+        phase("first", cfg.compute_first_sets, **labels)
+        phase("follow", cfg.compute_follow_sets, **labels)
+        table = phase("ll1_table", cfg.build_ll1_table, **labels)
+        parsing_table = phase(
+            "parsing_table",
+            lambda: build_ll1_parsing_table(
+                cfg.productions,
+                cfg.terminals,
+                cfg.non_terminals,
+                cfg.first_sets,
+                cfg.follow_sets,
+                epsilon="eps",
+            ),
+            **labels,
+        )
+        if parsing_table != table:
+            raise RuntimeError(f"{family}({size}): parsing_table differs from cfg.build_ll1_table()")
+        phase(
+            "compressed_table",
+            lambda: CompressedLL1Table.from_parsing_table(
+                cfg.symbols, cfg.non_terminals, cfg.terminals, table
+            ),
+            **labels,
+        )
+        trf = phase("to_dpda", lambda: convert_ll1_to_dpda(cfg, table), **labels)
+        index = phase("transition_index", lambda: TransitionIndex(trf), **labels)
+        lexer = phase("lexer_build", lambda: Lexer.from_cfg(cfg), **labels)
+    finally:
+        os.unlink(path)
+
+    rng = random.Random(seed)
+    for tokens in input_sizes:
+        text = grammar.make_input(tokens, rng)
+        labels["input_tokens"] = tokens
+        lexed = phase("lex", lambda: lexer.tokenize(text), **labels)
+        lexemes = [token.lexeme for token in lexed]
+
+        def parse(tokens, build_tree):
+            result = DPDA(
+                index, tokens, cfg.start_symbol, cfg.terminals,
+                tracer=NULL_TRACER, build_tree=build_tree,
+            ).run()
+            if result is None:
+                raise RuntimeError(f"{family}({size}) rejected its generated input")
+            return result
+
+        phase("parse", lambda: parse(lexed, False), **labels)
+        phase("parse_tree", lambda: parse(lexed, True), **labels)
+        # Untyped lexemes: the DPDA has to classify each one with the regexes.
+        phase("parse_untyped", lambda: parse(lexemes, False), **labels)
+
+
+def bench_process_input(recorder, input_sizes):
+    machine = anbn_dpda()
+    for tokens in input_sizes:
+        half = tokens // 2
+        text = "a" * half + "b" * half
+        recorder.phase(
+            "dpda_process_input",
+            lambda: machine.process_input(text),
+            grammar="anbn",
+            grammar_size=None,
+            input_tokens=tokens,
+        )
+
+
+def keyword_lexer(n, rng):
+    """
+    A Lexer over n keywords followed by a few operators, numbers and an
+    identifier regex, declared in that order as in most grammars, so every
+    keyword token is also a candidate for the later terminals. Returns
+    (lexer, make_input) like a SyntheticGrammar.
+    """
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    keywords = set()
+    while len(keywords) < n:
+        keywords.add("".join(rng.choice(letters) for _ in range(rng.randrange(3, 9))))
+    keywords = sorted(keywords)
+    operators = ["==", "=", r"\+", "-", r"\*", r"\(", r"\)"]
+    lexer = Lexer(keywords + operators + [r"[0-9]+", r"[a-zA-Z_][a-zA-Z0-9_]*"])
+
+    def make_input(tokens, rng):
+        words = []
+        for _ in range(tokens):
+            kind = rng.random()
+            if kind < 0.5:
+                words.append(rng.choice(keywords))
+            elif kind < 0.7:
+                words.append(rng.choice(keywords) + "_" + str(rng.randrange(100)))
+            elif kind < 0.8:
+                words.append(str(rng.randrange(10**6)))
+            else:
+                words.append(rng.choice(["==", "=", "+", "-", "*", "(", ")"]))
+        return " ".join(words)
+
+    return lexer, make_input
+
+
+def bench_lexer(recorder, terminal_counts, input_sizes, seed=0):
+    for n in terminal_counts:
+        rng = random.Random(seed)
+        lexer, make_input = keyword_lexer(n, rng)
+        for tokens in input_sizes:
+            text = make_input(tokens, rng)
+            recorder.phase(
+                "lex_keywords",
+                lambda: lexer.tokenize(text),
+                grammar="keywords",
+                grammar_size=n,
+                input_tokens=tokens,
+            )
+
+
+def run_suite(families, grammar_sizes, input_sizes, repeat=3, memory=True, seed=0):
+    recorder = Recorder(repeat=repeat, memory=memory)
+    for family in families:
+        for size in grammar_sizes:
+            bench_grammar(recorder, family, size, input_sizes, seed=seed)
+    bench_lexer(recorder, grammar_sizes, input_sizes, seed=seed)
+    bench_process_input(recorder, input_sizes)
+    return {
+        "version": RESULTS_VERSION,
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": sys.version.split()[0],
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "repeat": repeat,
+            "seed": seed,
+        },
+        "results": recorder.results,
+    }
+
+
+def _result_key(row):
+    return (row["grammar"], row["grammar_size"], row["input_tokens"], row["phase"])
+
+
+def compare(old, new):
+    """Yields (key, old_seconds, new_seconds) for every row present in both runs."""
+    old_rows = {_result_key(row): row for row in old["results"]}
+    for row in new["results"]:
+        previous = old_rows.get(_result_key(row))
+        if previous is not None:
+            yield _result_key(row), previous["seconds"], row["seconds"]
+
+
+def _format_key(key):
+    family, size, tokens, phase = key
+    grammar = family if size is None else f"{family}({size})"
+    return f"{grammar:<14} {'' if tokens is None else tokens:>8} {phase:<20}"
+
+
+def _int_list(value):
+    return [int(part) for part in value.split(",") if part]
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("-o", "--output", default="benchmark_results.json")
+    arg_parser.add_argument(
+        "--grammars", default=",".join(GRAMMARS), help=f"comma-separated: {', '.join(GRAMMARS)}"
+    )
+    arg_parser.add_argument("--grammar-sizes", type=_int_list, default=[10, 50, 200])
+    arg_parser.add_argument("--input-sizes", type=_int_list, default=[1000, 10000])
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument(
+        "--no-memory", action="store_true", help="skip the tracemalloc peak measurements"
+    )
+    arg_parser.add_argument("--compare", metavar="BASELINE", help="earlier results file")
+    args = arg_parser.parse_args(argv)
+
+    families = [family for family in args.grammars.split(",") if family]
+    unknown = [family for family in families if family not in GRAMMARS]
+    if unknown:
+        arg_parser.error(f"unknown grammar families: {', '.join(unknown)}")
+
+    report = run_suite(
+        families,
+        args.grammar_sizes,
+        args.input_sizes,
+        repeat=args.repeat,
+        memory=not args.no_memory,
+        seed=args.seed,
+    )
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=1)
+
+    for row in report["results"]:
+        peak = row["peak_bytes"]
+        memory = "" if peak is None else f"  peak {peak / 1024:,.0f} KiB"
+        print(f"{_format_key(_result_key(row))} {row['seconds'] * 1000:10.2f} ms{memory}")
+    print(f"Wrote {args.output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\nCompared with {args.compare} (new / old time):")
+        for key, old_seconds, new_seconds in compare(baseline, report):
+            ratio = new_seconds / old_seconds if old_seconds > 0 else float("inf")
+            print(f"{_format_key(key)} {ratio:6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
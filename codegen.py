@@ -0,0 +1,377 @@
+"""
+Generates a standalone recursive-descent parser module from an LL(1) grammar.
+
+The emitted module has one function per non-terminal. Lookahead dispatch on
+the LL(1) table is compiled into integer comparisons, and the terminal regexes
+are precompiled into its own lexer. It imports nothing from this project:
+
+    python codegen.py grammar.txt -o grammar_parser.py
+    python codegen.py grammar.txt -o grammar_parser.py --bench inputs.txt
+
+The generated parse(text) / parse_tokens(tokens) accept and reject exactly the
+inputs p2.DPDA does. With a tree_builder (parse_tree.ParseTreeBuilder,
+compact_tree.CompactTree, ...) they build the same trees; without one they only
+recognise the input and return True.
+"""
+
+import argparse
+import importlib.util
+import os
+import re
+import sys
+import time
+
+from grammar_compiler import compile_grammar
+from lexer import LexError, Lexer
+
+END_MARKER = "$"
+EPSILON = "eps"
+
+
+class _Emitter:
+    def __init__(self):
+        self.lines = []
+        self.level = 0
+
+    def line(self, text=""):
+        self.lines.append(f"{'    ' * self.level}{text}" if text else "")
+
+    def indent(self):
+        self.level += 1
+
+    def dedent(self):
+        self.level -= 1
+
+    def source(self):
+        return "\n".join(self.lines) + "\n"
+
+
+def _function_names(non_terminals):
+    names = {}
+    used = set()
+    for nt in non_terminals:
+        base = re.sub(r"\W", "_", nt)
+        name = f"_parse_{base}"
+        suffix = 1
+        while name in used:
+            suffix += 1
+            name = f"_parse_{base}_{suffix}"
+        used.add(name)
+        names[nt] = name
+    return names
+
+
+def _dispatch(parsing_table, non_terminals, kind_of):
+    """Returns {nt: [(kinds, body), ...]} with bodies in first-seen order."""
+    dispatch = {nt: [] for nt in non_terminals}
+    for (nt, terminal), body in parsing_table.items():
+        kind = kind_of.get(terminal)
+        if not body or nt not in dispatch or kind is None:
+            continue
+        for kinds, existing in dispatch[nt]:
+            if existing == body:
+                kinds.append(kind)
+                break
+        else:
+            dispatch[nt].append(([kind], body))
+    for branches in dispatch.values():
+        for kinds, _ in branches:
+            kinds.sort()
+    return dispatch
+
+
+def _condition(kinds):
+    if len(kinds) == 1:
+        return f"kind == {kinds[0]}"
+    return f"kind in {set(kinds)!r}"
+
+
+def _emit_function(out, nt, branches, names, kind_of, non_terminals, with_tree):
+    name = names[nt] + ("_tree" if with_tree else "")
+    params = "kinds, pos, tree, node, lexemes" if with_tree else "kinds, pos"
+    loops = any(body and body[-1] == nt for _, body in branches)
+
+    out.line(f"def {name}({params}):")
+    out.indent()
+    out.line(f"# {nt}")
+    if loops:
+        # A body ending in the head itself (A -> ... A) is a tail call; it is
+        # compiled as a loop so long right-recursive lists don't nest calls.
+        out.line("while True:")
+        out.indent()
+    out.line("kind = kinds[pos]")
+
+    for kinds, body in branches:
+        # The DPDA pushes nothing for an epsilon body.
+        symbols = [] if body == [EPSILON] else list(body)
+        out.line(f"if {_condition(kinds)}:")
+        out.indent()
+        out.line(f"# {nt} -> {' '.join(body)}")
+        if with_tree:
+            out.line(f"children = tree.expand(node, {tuple(symbols)!r})")
+
+        tail = bool(symbols) and symbols[-1] == nt
+        for i, symbol in enumerate(symbols):
+            if symbol in non_terminals:
+                if tail and i == len(symbols) - 1:
+                    if with_tree:
+                        out.line(f"node = children[{i}]")
+                    out.line("continue")
+                    break
+                call_args = f"kinds, pos, tree, children[{i}], lexemes" if with_tree else "kinds, pos"
+                out.line(f"pos = {names[symbol]}{'_tree' if with_tree else ''}({call_args})")
+                continue
+
+            kind = kind_of.get(symbol)
+            if kind is None:
+                # Neither a non-terminal nor a terminal the lexer can produce.
+                out.line(f"raise _Reject(pos, {symbol!r})")
+                break
+            # The dispatch already checked the first symbol if it is the only
+            # lookahead of this branch.
+            if not (i == 0 and kinds == [kind]):
+                out.line(f"if kinds[pos] != {kind}:")
+                out.indent()
+                out.line(f"raise _Reject(pos, {symbol!r})")
+                out.dedent()
+            if with_tree:
+                out.line(f"tree.set_token(children[{i}], lexemes[pos], pos)")
+            out.line("pos += 1")
+        else:
+            out.line("return pos")
+        out.dedent()
+
+    out.line(f"raise _Reject(pos, {nt!r})")
+    if loops:
+        out.dedent()
+    out.dedent()
+    out.line()
+    out.line()
+
+
+_RUNTIME = '''
+class LexError(ValueError):
+    def __init__(self, text, pos):
+        self.offset = pos
+        snippet = text[pos : pos + 10]
+        super().__init__(f"No terminal matches input at offset {pos}: {snippet!r}")
+
+
+class _Reject(Exception):
+    pass
+
+
+def _lex(text, with_lexemes):
+    """Returns (kinds, lexemes) for text, with the END kind appended."""
+    kinds = []
+    lexemes = [] if with_lexemes else None
+    master_match = _MASTER.match
+    pos = 0
+    end_of_text = len(text)
+    while pos < end_of_text:
+        m = master_match(text, pos)
+        if m is None or m.end() == pos:
+            raise LexError(text, pos)
+        end = m.end()
+        kind = _KIND_OF_GROUP[m.lastindex]
+        if kind >= 0:
+            # Longest match wins; on a tie the earlier terminal does.
+            for later, pattern in _LATER_PATTERNS[kind]:
+                candidate = pattern.match(text, pos)
+                if candidate is not None and candidate.end() > end:
+                    kind, end = later, candidate.end()
+            kinds.append(kind)
+            if with_lexemes:
+                lexemes.append(text[pos:end])
+        pos = end
+    kinds.append(END)
+    return kinds, lexemes
+
+
+def _run(kinds, lexemes, tree_builder):
+    try:
+        if tree_builder is None:
+            pos = _START(kinds, 0)
+            root = None
+        else:
+            root = tree_builder.new_root(START_SYMBOL)
+            pos = _START_TREE(kinds, 0, tree_builder, root, lexemes)
+        if kinds[pos] != END:
+            return None
+    except (_Reject, IndexError):
+        return None
+    return True if tree_builder is None else tree_builder.result(root)
+
+
+def parse(text, tree_builder=None):
+    """
+    Lexes and parses text. Returns tree_builder.result(root), or True if no
+    tree_builder is given; None if the input is rejected. Raises LexError if
+    the text can't be tokenized.
+
+    Nesting deeper than the interpreter's recursion limit raises RecursionError.
+    """
+    kinds, lexemes = _lex(text, tree_builder is not None)
+    return _run(kinds, lexemes, tree_builder)
+
+
+def parse_tokens(tokens, tree_builder=None):
+    """
+    Parses already-lexed tokens: (terminal, lexeme, ...) tuples such as
+    lexer.Token. Input ends at the first "$" token, like p2.DPDA.
+    """
+    kinds = []
+    lexemes = []
+    kind_of = _KIND_OF
+    for token in tokens:
+        if token[0] == END_MARKER:
+            break
+        kinds.append(kind_of.get(token[0], -1))
+        lexemes.append(token[1])
+    kinds.append(END)
+    return _run(kinds, lexemes, tree_builder)
+'''
+
+
+def generate_parser(cfg, parsing_table):
+    """Returns the source of a standalone parser module for cfg's LL(1) table."""
+    lexer = Lexer.from_cfg(cfg)
+    terminals = lexer.terminals
+    kind_of = {terminal: kind for kind, terminal in enumerate(terminals)}
+    kind_of[END_MARKER] = end_kind = len(terminals)
+
+    # Declared order first, so the output is stable across runs.
+    non_terminals = [nt for nt in cfg.symbols if nt in cfg.non_terminals]
+    non_terminals += sorted(cfg.non_terminals.difference(non_terminals))
+    names = _function_names(non_terminals)
+    dispatch = _dispatch(parsing_table, non_terminals, kind_of)
+
+    out = _Emitter()
+    out.line(f'"""Generated by codegen.py from {os.path.basename(cfg.grammar_file)}. Do not edit."""')
+    out.line()
+    out.line("import re")
+    out.line()
+    out.line(f"START_SYMBOL = {cfg.start_symbol!r}")
+    out.line(f"END_MARKER = {END_MARKER!r}")
+    out.line("# Token kinds are indexes into TERMINALS; END is the end-of-input marker.")
+    out.line(f"TERMINALS = {tuple(terminals)!r}")
+    out.line(f"END = {end_kind}")
+    out.line("_KIND_OF = {terminal: kind for kind, terminal in enumerate(TERMINALS)}")
+    out.line()
+    out.line(f"_MASTER = re.compile({lexer._master.pattern!r})")
+    out.line("_PATTERNS = [")
+    out.indent()
+    for pattern in lexer._patterns:
+        out.line(f"re.compile({pattern.pattern!r}),")
+    out.dedent()
+    out.line("]")
+    out.line("# Later terminals that may still match a longer lexeme than kind's.")
+    out.line("_LATER_PATTERNS = [")
+    out.indent()
+    out.line("[(later, _PATTERNS[later]) for later in range(kind + 1, len(_PATTERNS))]")
+    out.line("for kind in range(len(_PATTERNS))")
+    out.dedent()
+    out.line("]")
+    out.line("_KIND_OF_GROUP = {")
+    out.indent()
+    out.line('index: (-1 if name == "SKIP" else int(name[1:]))')
+    out.line("for name, index in _MASTER.groupindex.items()")
+    out.dedent()
+    out.line("}")
+    for line in _RUNTIME.rstrip("\n").split("\n"):
+        out.line(line)
+    out.line()
+    out.line()
+
+    for with_tree in (False, True):
+        for nt in non_terminals:
+            _emit_function(out, nt, dispatch[nt], names, kind_of, cfg.non_terminals, with_tree)
+
+    if cfg.start_symbol in names:
+        out.line(f"_START = {names[cfg.start_symbol]}")
+        out.line(f"_START_TREE = {names[cfg.start_symbol]}_tree")
+    else:
+        out.line("def _START(kinds, pos, *args):")
+        out.line(f"    raise _Reject(pos, {cfg.start_symbol!r})")
+        out.line()
+        out.line()
+        out.line("_START_TREE = _START")
+    return out.source()
+
+
+def write_parser(cfg, parsing_table, path):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(generate_parser(cfg, parsing_table))
+
+
+def load_parser(path, module_name=None):
+    """Imports a generated parser module from path."""
+    module_name = module_name or os.path.splitext(os.path.basename(path))[0]
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def benchmark(compiled, module, texts, repeat=3):
+    """
+    Parses every text with the DPDA (compiled.parse) and the generated module,
+    checking that they agree. Returns {"dpda": seconds, "generated": seconds,
+    "mismatches": [texts the two disagree on]} with the best of repeat runs.
+    """
+    def outcome(parse, text):
+        try:
+            return parse(text) is not None
+        except (LexError, module.LexError):
+            return "lex error"
+
+    mismatches = [
+        text for text in texts if outcome(compiled.parse, text) != outcome(module.parse, text)
+    ]
+
+    timings = {}
+    for label, parse in (("dpda", compiled.parse), ("generated", module.parse)):
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for text in texts:
+                outcome(parse, text)
+            best = min(best, time.perf_counter() - start)
+        timings[label] = best
+    timings["mismatches"] = mismatches
+    return timings
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("grammar", nargs="?", default="grammar.txt")
+    arg_parser.add_argument("-o", "--output", default="grammar_parser.py")
+    arg_parser.add_argument(
+        "--bench",
+        metavar="INPUTS",
+        help="file of inputs, one per line, to time the DPDA against the generated parser",
+    )
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args(argv)
+
+    compiled = compile_grammar(args.grammar)
+    write_parser(compiled.cfg, compiled.parsing_table, args.output)
+    print(f"Wrote {args.output}", file=sys.stderr)
+
+    if args.bench:
+        with open(args.bench, encoding="utf-8") as f:
+            texts = [line.rstrip("\n") for line in f]
+        result = benchmark(compiled, load_parser(args.output), texts, args.repeat)
+        dpda, generated = result["dpda"], result["generated"]
+        speedup = dpda / generated if generated > 0 else float("inf")
+        print(
+            f"{len(texts)} inputs: DPDA {dpda:.3f} s, generated {generated:.3f} s"
+            f" ({speedup:.1f}x); {len(result['mismatches'])} mismatches",
+            file=sys.stderr,
+        )
+        for text in result["mismatches"]:
+            print(f"  mismatch: {text!r}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
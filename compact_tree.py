@@ -0,0 +1,208 @@
+from array import array
+
+from parse_tree import ParseTreeNode
+
+NO_NODE = -1
+
+
+class CompactTree:
+    """
+    Array-backed parse tree.
+
+    Nodes are integers indexing parallel array('i') columns: symbol id, parent,
+    first child, next sibling and the [start, end) span of input token positions
+    the node covers. Symbol names are interned once in self.symbols, and only
+    leaves that matched a token store a lexeme. Node 0 is the root.
+
+    A CompactTree doubles as a tree builder for p2.DPDA (the same methods as
+    parse_tree.ParseTreeBuilder), e.g. DPDA(..., tree_builder=CompactTree()).
+    """
+
+    def __init__(self):
+        self.symbols = []
+        self._symbol_ids = {}
+        self.symbol_id = array("i")
+        self.parent = array("i")
+        self.first_child = array("i")
+        self.next_sibling = array("i")
+        self.span_start = array("i")
+        self.span_end = array("i")
+        self.lexemes = {}  # node -> lexeme, for leaves that matched a token
+
+    def __len__(self):
+        return len(self.symbol_id)
+
+    def _intern(self, symbol):
+        symbol_id = self._symbol_ids.get(symbol)
+        if symbol_id is None:
+            symbol_id = self._symbol_ids[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+        return symbol_id
+
+    def _add_node(self, symbol, parent, next_sibling):
+        self.symbol_id.append(self._intern(symbol))
+        self.parent.append(parent)
+        self.first_child.append(NO_NODE)
+        self.next_sibling.append(next_sibling)
+        self.span_start.append(NO_NODE)
+        self.span_end.append(NO_NODE)
+
+    # Tree builder interface used by p2.DPDA
+
+    def new_root(self, symbol):
+        self._add_node(symbol, NO_NODE, NO_NODE)
+        return len(self) - 1
+
+    def expand(self, parent, symbols):
+        first = len(self)
+        last = first + len(symbols) - 1
+        for i, symbol in enumerate(symbols):
+            node = first + i
+            self._add_node(symbol, parent, node + 1 if node < last else NO_NODE)
+        if symbols:
+            self.first_child[parent] = first
+        return range(first, last + 1)
+
+    def set_token(self, node, lexeme, position):
+        self.lexemes[node] = lexeme
+        self.span_start[node] = position
+        self.span_end[node] = position + 1
+
+    def result(self, root):
+        self._finish_spans()
+        return self
+
+    def _finish_spans(self):
+        # Children always have larger indices than their parent, so one pass in
+        # reverse index order folds every subtree's span into its parent.
+        span_start, span_end, parent = self.span_start, self.span_end, self.parent
+        for node in range(len(self) - 1, 0, -1):
+            start = span_start[node]
+            if start == NO_NODE:
+                continue
+            p = parent[node]
+            if span_start[p] == NO_NODE or start < span_start[p]:
+                span_start[p] = start
+            if span_end[node] > span_end[p]:
+                span_end[p] = span_end[node]
+
+    def graft(self, node, other):
+        """
+        Grafts another CompactTree onto node, a childless node of this tree:
+        node takes over the token, span and children of other's root, and
+        other's remaining nodes are appended in order. Returns the offset added
+        to other's node indexes (its node i > 0 becomes node i + offset).
+        """
+        offset = len(self) - 1
+        remap = [self._intern(symbol) for symbol in other.symbols]
+
+        def shift(indexes):
+            return (NO_NODE if i == NO_NODE else i + offset for i in indexes)
+
+        self.symbol_id.extend(remap[symbol_id] for symbol_id in other.symbol_id[1:])
+        self.parent.extend(node if p == 0 else p + offset for p in other.parent[1:])
+        self.first_child.extend(shift(other.first_child[1:]))
+        self.next_sibling.extend(shift(other.next_sibling[1:]))
+        self.span_start.extend(other.span_start[1:])
+        self.span_end.extend(other.span_end[1:])
+
+        first = other.first_child[0]
+        self.first_child[node] = NO_NODE if first == NO_NODE else first + offset
+        self.span_start[node] = other.span_start[0]
+        self.span_end[node] = other.span_end[0]
+        for index, lexeme in other.lexemes.items():
+            self.lexemes[node if index == 0 else index + offset] = lexeme
+        return offset
+
+    # Read access
+
+    @property
+    def root(self):
+        return NodeView(self, 0)
+
+    def node(self, index):
+        return NodeView(self, index)
+
+    def children(self, node):
+        child = self.first_child[node]
+        while child != NO_NODE:
+            yield child
+            child = self.next_sibling[child]
+
+    def to_parse_tree(self, node=0):
+        """Converts the subtree at node to ParseTreeNodes (iteratively)."""
+        symbols, lexemes = self.symbols, self.lexemes
+        root = ParseTreeNode(symbols[self.symbol_id[node]], lexemes.get(node))
+        pending = [(node, root)]
+        while pending:
+            index, converted = pending.pop()
+            for child in self.children(index):
+                converted_child = ParseTreeNode(
+                    symbols[self.symbol_id[child]], lexemes.get(child)
+                )
+                converted.children.append(converted_child)
+                pending.append((child, converted_child))
+        return root
+
+    def display(self):
+        self.root.display()
+
+
+class NodeView:
+    """Lightweight read-only view of one CompactTree node."""
+
+    __slots__ = ("tree", "index")
+
+    def __init__(self, tree, index):
+        self.tree = tree
+        self.index = index
+
+    @property
+    def symbol(self):
+        return self.tree.symbols[self.tree.symbol_id[self.index]]
+
+    @property
+    def token(self):
+        return self.tree.lexemes.get(self.index)
+
+    @property
+    def span(self):
+        """(start, end) token positions covered by the node, or None if empty."""
+        start = self.tree.span_start[self.index]
+        if start == NO_NODE:
+            return None
+        return start, self.tree.span_end[self.index]
+
+    @property
+    def parent(self):
+        parent = self.tree.parent[self.index]
+        return None if parent == NO_NODE else NodeView(self.tree, parent)
+
+    @property
+    def children(self):
+        return [NodeView(self.tree, child) for child in self.tree.children(self.index)]
+
+    def to_parse_tree(self):
+        return self.tree.to_parse_tree(self.index)
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, NodeView)
+            and self.tree is other.tree
+            and self.index == other.index
+        )
+
+    def __hash__(self):
+        return hash((id(self.tree), self.index))
+
+    def __repr__(self):
+        token = self.token
+        return f"NodeView({self.symbol}{f':{token}' if token else ''})"
+
+    def display(self):
+        pending = [(self, 0)]
+        while pending:
+            node, level = pending.pop()
+            token = node.token
+            print(f"{'  ' * level}{node.symbol}{f' ({token})' if token else ''}")
+            pending.extend((child, level + 1) for child in reversed(node.children))
@@ -1,5 +1,41 @@
+import sys
+import time
+from array import array
+
+import transition_format
+from tracing import NULL_TRACER
+
+# Why process_input stopped; kept in DPDA.last_reason.
+ACCEPTED = "accepted"
+NO_TRANSITION = "no_transition"
+EPSILON_CYCLE = "epsilon_cycle"
+STEP_BUDGET = "step_budget"
+TIME_BUDGET = "time_budget"
+
+# Problems that make TransitionTable reject an automaton at load time.
+NONDETERMINISTIC = "nondeterministic"
+
+# The time budget is checked once per this many steps.
+TIME_CHECK_INTERVAL = 1024
+
+
+class DPDAError(ValueError):
+    """An automaton failed validation; problems is a list of (code, message)."""
+
+    def __init__(self, problems):
+        self.problems = problems
+        details = "\n".join(f"  {code}: {message}" for code, message in problems)
+        super().__init__(f"Invalid DPDA:\n{details}")
+
+
 class DPDA:
-    def __init__(self):
+    def __init__(self, tracer=None, validate=True, max_steps=None, max_seconds=None):
+        """
+        validate rejects (with DPDAError, when the automaton is compiled)
+        machines with an epsilon cycle or with both epsilon and input
+        transitions for one (state, stack top). max_steps / max_seconds are the
+        default per-input budgets of process_input; None means unlimited.
+        """
         self.states = set()
         self.input_alphabet = set()
         self.stack_alphabet = set()
@@ -7,8 +43,32 @@ class DPDA:
         self.start_state = None
         self.start_stack = None
         self.accept_states = set()
+        self.tracer = tracer if tracer is not None else NULL_TRACER
+        self.validate = validate
+        self.max_steps = max_steps
+        self.max_seconds = max_seconds
+        self.last_reason = None
+        self.last_steps = 0
+        self.last_reasons = []
+        self._compiled = None
+
+    def compile(self):
+        """
+        Compiles self.transitions into a TransitionTable. read_from_file does
+        this; call it again after changing the automaton by hand (otherwise
+        process_input compiles it on first use).
+        """
+        compiled = TransitionTable(self)
+        if self.validate and compiled.problems:
+            raise DPDAError(compiled.problems)
+        self._compiled = compiled
+        return compiled
 
     def read_from_file(self, filename):
+        if transition_format.is_binary(filename):
+            self._read_binary(filename)
+            return
+
         with open(filename, "r") as file:
             self.states = set(file.readline().strip().split())
 
@@ -35,45 +95,229 @@ class DPDA:
                     key = (current_state, input_symbol, stack_top)
                     self.transitions[key] = (new_state, stack_push)
 
-    def process_input(self, input_string):
-        """پردازش رشته ورودی و تعیین پذیرفته شدن یا نشدن"""
-        stack = [self.start_stack]
-        current_state = self.start_state
+        self.compile()
+
+    def _read_binary(self, filename):
+        # Written by transition_format.write_dpda from an automaton that was
+        # validated when it was read, so compile() is left to the first
+        # process_input call.
+        with transition_format.TransitionFile(filename) as f:
+            (
+                self.start_state,
+                self.start_stack,
+                self.states,
+                self.input_alphabet,
+                self.stack_alphabet,
+                self.accept_states,
+            ) = f.machine()
+            self.transitions = dict(f.transitions())
+        self._compiled = None
+
+    def process_input(self, input_string, max_steps=None, max_seconds=None):
+        """
+        پردازش رشته ورودی و تعیین پذیرفته شدن یا نشدن
+
+        Returns True if input_string is accepted. Why it stopped is left in
+        self.last_reason (ACCEPTED, NO_TRANSITION, EPSILON_CYCLE, STEP_BUDGET or
+        TIME_BUDGET) and the number of transitions taken in self.last_steps.
+        """
+        tracer = self.tracer
+        trace_summary = tracer.summary_enabled
+        trace_full = tracer.full_enabled
+        if max_steps is None:
+            max_steps = self.max_steps
+        if max_seconds is None:
+            max_seconds = self.max_seconds
+
+        compiled = self._compiled
+        if compiled is None:
+            compiled = self.compile()
+        table = compiled.table
+        next_states = compiled.next_states
+        pushes = compiled.pushes
+        accepting = compiled.accepting
+        n_stack = compiled.n_stack
+        n_input = compiled.n_input
+        # Precomputed epsilon chains, one per (state, stack top) cell; the full
+        # trace steps through them one transition at a time instead.
+        closure = None if trace_full else compiled.closure
+        closure_at_end = None if trace_full else compiled.closure_at_end
+        cycle = compiled.cycle
+        cycle_at_end = compiled.cycle_at_end
+        closure_states = compiled.closure_states
+        closure_pushes = compiled.closure_pushes
+        closure_steps = compiled.closure_steps
+
+        step_limit = max_steps if max_steps is not None else sys.maxsize
+        deadline = time.perf_counter() + max_seconds if max_seconds is not None else None
+        # Budgets are only looked at once steps reaches check_at.
+        check_at = step_limit if deadline is None else min(step_limit, TIME_CHECK_INTERVAL)
+
+        symbols = compiled.input_symbols(input_string)
+        end = len(symbols)
+        stack = [compiled.start_stack]
+        current_state = compiled.start_state
         input_index = 0
+        steps = 0
+        reason = None
 
         while True:
-            if input_index >= len(input_string) and current_state in self.accept_states:
-                return True
+            if input_index < end:
+                at_end = False
+                input_symbol = symbols[input_index]
+            else:
+                if accepting[current_state]:
+                    reason = ACCEPTED
+                    break
+                at_end = True
+                input_symbol = EPSILON
 
-            input_symbol = (
-                input_string[input_index] if input_index < len(input_string) else ""
-            )
+            if steps >= check_at:
+                if steps >= step_limit:
+                    reason = STEP_BUDGET
+                    break
+                if time.perf_counter() > deadline:
+                    reason = TIME_BUDGET
+                    break
+                check_at = min(step_limit, steps + TIME_CHECK_INTERVAL)
 
-            stack_top = stack[-1] if stack else ""
+            stack_top = stack[-1] if stack else EMPTY_STACK
+            cell = current_state * n_stack + stack_top
+
+            transition = table[cell * n_input + input_symbol] if input_symbol > 0 else -1
+            if transition >= 0:
+                if trace_full:
+                    tracer.sink(compiled.describe(transition))
+                current_state = next_states[transition]
+                if stack_top:
+                    stack.pop()
+                stack.extend(pushes[transition])
+                input_index += 1
+                steps += 1
+                continue
 
-            transition_key = (current_state, input_symbol, stack_top)
+            if (cycle_at_end if at_end else cycle)[cell]:
+                reason = EPSILON_CYCLE
+                break
 
-            if transition_key in self.transitions:
-                new_state, stack_push = self.transitions[transition_key]
-                current_state = new_state
+            chain = -1
+            if closure is not None:
+                chain = (closure_at_end if at_end else closure)[cell]
+            if chain >= 0 and steps + closure_steps[chain] <= step_limit:
+                # The whole epsilon chain at once.
+                current_state = closure_states[chain]
                 if stack_top:
                     stack.pop()
-                if stack_push:
-                    stack.extend(list(stack_push[::-1]))
-                input_index += 1 if input_symbol else 0
+                stack.extend(closure_pushes[chain])
+                steps += closure_steps[chain]
                 continue
 
-            transition_key = (current_state, "", stack_top)
-            if transition_key in self.transitions:
-                new_state, stack_push = self.transitions[transition_key]
-                current_state = new_state
+            transition = table[cell * n_input]
+            if transition >= 0:
+                if trace_full:
+                    tracer.sink(compiled.describe(transition))
+                current_state = next_states[transition]
                 if stack_top:
                     stack.pop()
-                if stack_push:
-                    stack.extend(list(stack_push[::-1]))
+                stack.extend(pushes[transition])
+                steps += 1
+                continue
+
+            reason = NO_TRANSITION
+            break
+
+        self.last_reason = reason
+        self.last_steps = steps
+        if reason == ACCEPTED:
+            if trace_summary:
+                tracer.sink(
+                    f"Accepted '{input_string}' in state {compiled.state_names[current_state]}"
+                )
+            return True
+
+        if trace_summary:
+            if reason == NO_TRANSITION:
+                symbol = input_string[input_index] if input_index < end else ""
+                tracer.sink(
+                    f"Rejected '{input_string}': no transition for"
+                    f" ({compiled.state_names[current_state]}, {symbol or 'e'},"
+                    f" {compiled.stack_names[stack_top] or 'e'})"
+                )
+            else:
+                tracer.sink(f"Aborted '{input_string}': {reason} after {steps} steps")
+        return False
+
+    def process_batch(self, inputs, max_steps=None):
+        """
+        Runs many inputs at once and returns a list of booleans, one per input
+        in order; the reason codes are left in self.last_reasons.
+
+        The inputs are arranged in a trie and the automaton walks it depth
+        first, so the moves for a prefix shared by many inputs are made once.
+        Configurations are kept with a persistent stack (linked (symbol, rest)
+        pairs), which lets every branch continue from its parent's stack
+        without copying it. max_steps (default self.max_steps) applies to each
+        input as in process_input; the batch does not trace individual steps.
+        """
+        if max_steps is None:
+            max_steps = self.max_steps
+        step_limit = max_steps if max_steps is not None else sys.maxsize
+        compiled = self._compiled
+        if compiled is None:
+            compiled = self.compile()
+
+        inputs = list(inputs)
+        reasons = [None] * len(inputs)
+        # Trie node: [children {char: node}, indices of inputs ending here]
+        root = [{}, []]
+        for i, input_string in enumerate(inputs):
+            node = root
+            for char in input_string:
+                child = node[0].get(char)
+                if child is None:
+                    child = node[0][char] = [{}, []]
+                node = child
+            node[1].append(i)
+
+        input_ids = compiled._input_ids
+        epsilon_only = compiled.epsilon_only
+        cycle = compiled.cycle
+        n_stack = compiled.n_stack
+        start_stack = (compiled.start_stack, None)
+        pending = [(root, compiled.start_state, start_stack, 0)]
+        while pending:
+            node, state, stack, steps = pending.pop()
+            children, ending = node
+
+            if ending:
+                reason = compiled.finish(state, stack, steps, step_limit)
+                for i in ending:
+                    reasons[i] = reason
+            if not children:
                 continue
 
-            return False
+            if len(children) > 1:
+                # Epsilon moves no input symbol can pre-empt are shared by
+                # every child, so make them once before branching.
+                while steps < step_limit:
+                    cell = state * n_stack + (stack[0] if stack else EMPTY_STACK)
+                    if not epsilon_only[cell] or cycle[cell]:
+                        break
+                    state, stack, steps = compiled.epsilon_move(
+                        cell, stack, steps, step_limit
+                    )
+
+            for char, child in children.items():
+                outcome = compiled.consume(
+                    state, stack, steps, input_ids.get(char, -1), step_limit
+                )
+                if isinstance(outcome, str):
+                    _fill_subtree(child, reasons, outcome)
+                else:
+                    pending.append((child, *outcome))
+
+        self.last_reasons = reasons
+        return [reason == ACCEPTED for reason in reasons]
 
     def __str__(self):
         """نمایش رشته‌ای DPDA"""
@@ -94,9 +338,284 @@ class DPDA:
         return "\n".join(result)
 
 
+# Column 0 of every row holds the epsilon transition and stack symbol 0 is the
+# empty stack, matching the "" ('e' in the file) of dpda.DPDA.transitions.
+EPSILON = 0
+EMPTY_STACK = 0
+
+
+class TransitionTable:
+    """
+    dpda.DPDA transitions compiled to integers.
+
+    States, input symbols and stack symbols are numbered, and table is a dense
+    array('i') with one cell per (state, stack top, input symbol), holding a
+    transition number or -1. Each transition's push string is stored as stack
+    symbol ids already reversed, so a step is two array indexings, a pop and
+    an extend.
+    """
+
+    def __init__(self, dpda):
+        transitions = dpda.transitions
+        self.state_names = []
+        self.input_names = [""]
+        self.stack_names = [""]
+        state_ids = {}
+        input_ids = {"": EPSILON}
+        stack_ids = {"": EMPTY_STACK}
+
+        def intern(ids, names, name):
+            symbol_id = ids.get(name)
+            if symbol_id is None:
+                symbol_id = ids[name] = len(names)
+                names.append(name)
+            return symbol_id
+
+        # start_state/start_stack may still be None for an unloaded automaton;
+        # that simply never matches a transition, as before.
+        self.start_state = intern(state_ids, self.state_names, dpda.start_state)
+        self.start_stack = intern(stack_ids, self.stack_names, dpda.start_stack)
+        for state in [*sorted(dpda.states), *sorted(dpda.accept_states)]:
+            intern(state_ids, self.state_names, state)
+        for (state, input_symbol, stack_top), (new_state, stack_push) in transitions.items():
+            intern(state_ids, self.state_names, state)
+            intern(state_ids, self.state_names, new_state)
+            intern(input_ids, self.input_names, input_symbol)
+            intern(stack_ids, self.stack_names, stack_top)
+            for symbol in stack_push:
+                intern(stack_ids, self.stack_names, symbol)
+        self._input_ids = input_ids
+        self.n_states = len(self.state_names)
+        self.n_input = len(self.input_names)
+        self.n_stack = len(self.stack_names)
+        self.accepting = bytearray(self.n_states)
+        for state in dpda.accept_states:
+            self.accepting[state_ids[state]] = 1
+
+        self.table = array("i", [-1]) * (self.n_states * self.n_stack * self.n_input)
+        self.keys = []
+        self.next_states = []
+        self.pushes = []
+        self.consumes = []
+        for (state, input_symbol, stack_top), (new_state, stack_push) in transitions.items():
+            cell = (
+                state_ids[state] * self.n_stack + stack_ids[stack_top]
+            ) * self.n_input + input_ids[input_symbol]
+            self.table[cell] = len(self.keys)
+            self.keys.append((state, input_symbol, stack_top, new_state, stack_push))
+            self.next_states.append(state_ids[new_state])
+            self.pushes.append(tuple(stack_ids[symbol] for symbol in reversed(stack_push)))
+            self.consumes.append(bool(input_symbol))
+
+        self.problems = []
+        self._compute_epsilon_closures()
+
+    def _compute_epsilon_closures(self):
+        """
+        Precomputes, for every (state, stack top) cell with an epsilon
+        transition, the chain of epsilon moves that must follow it: the chain
+        goes on while the next stack top is known (the last move pushed
+        something) and the next cell has only an epsilon transition, so no
+        input can change the path. A chain that comes back to a cell without
+        having popped below the stack height it had there never ends; such
+        cells are marked in cycle and reported in self.problems.
+
+        closure_at_end / cycle_at_end are the same for the end of the input,
+        where the chain also stops at accepting states.
+        """
+        n_cells = self.n_states * self.n_stack
+        n_input = self.n_input
+        table = self.table
+        self.epsilon_only = epsilon_only = bytearray(n_cells)
+        has_input = bytearray(n_cells)
+        for cell in range(n_cells):
+            row = table[cell * n_input : (cell + 1) * n_input]
+            has_input[cell] = any(transition >= 0 for transition in row[1:])
+            epsilon_only[cell] = row[0] >= 0 and not has_input[cell]
+            if row[0] >= 0 and has_input[cell]:
+                state, _, stack_top, _, _ = self.keys[row[0]]
+                self.problems.append(
+                    (
+                        NONDETERMINISTIC,
+                        f"both epsilon and input transitions from ({state}, {stack_top or 'e'})",
+                    )
+                )
+
+        self.closure_states = []
+        self.closure_pushes = []
+        self.closure_steps = []
+        self.closure = array("i", [-1]) * n_cells
+        self.closure_at_end = array("i", [-1]) * n_cells
+        self.cycle = bytearray(n_cells)
+        self.cycle_at_end = bytearray(n_cells)
+        cycles = set()
+        for cell in range(n_cells):
+            if table[cell * n_input] < 0:
+                continue
+            for at_end, closure, cycle in (
+                (False, self.closure, self.cycle),
+                (True, self.closure_at_end, self.cycle_at_end),
+            ):
+                chain = self._follow_epsilon(cell, epsilon_only, at_end)
+                if chain is None:
+                    cycle[cell] = 1
+                    cycles.add(cell)
+                else:
+                    closure[cell] = len(self.closure_states)
+                    self.closure_states.append(chain[0])
+                    self.closure_pushes.append(chain[1])
+                    self.closure_steps.append(chain[2])
+
+        for cell in sorted(cycles):
+            state, stack_top = divmod(cell, self.n_stack)
+            self.problems.append(
+                (
+                    EPSILON_CYCLE,
+                    f"epsilon moves from ({self.state_names[state]},"
+                    f" {self.stack_names[stack_top] or 'e'}) never end",
+                )
+            )
+
+    def _follow_epsilon(self, cell, epsilon_only, at_end, max_steps=10000):
+        """
+        Returns (state, pushed stack ids, steps) of the epsilon chain starting
+        at cell, or None if it never ends. Chains longer than max_steps are cut
+        there (process_input continues them from the next cell).
+        """
+        n_stack, n_input = self.n_stack, self.n_input
+        table, next_states, pushes = self.table, self.next_states, self.pushes
+        pushed = []
+        heights = []  # stack height when each cell of the chain was entered
+        first_visit = {}
+        steps = 0
+        while True:
+            transition = table[cell * n_input]
+            first_visit[cell] = len(heights)
+            heights.append(len(pushed))
+            if steps:
+                pushed.pop()
+            pushed.extend(pushes[transition])
+            steps += 1
+            state = next_states[transition]
+            if not pushed or steps >= max_steps:
+                break
+            if at_end and self.accepting[state]:
+                break
+            cell = state * n_stack + pushed[-1]
+            if not epsilon_only[cell]:
+                break
+            previous = first_visit.get(cell)
+            if previous is not None:
+                # Back at a cell without having touched the stack below it:
+                # the same moves repeat forever.
+                height = heights[previous]
+                if len(pushed) >= height and min(heights[previous:]) >= height:
+                    return None
+        return state, tuple(pushed), steps
+
+    # Moves on persistent stacks, for DPDA.process_batch. A stack is None
+    # (empty) or a (symbol, rest) pair; steps is the count so far.
+
+    def _push(self, stack, stack_top, pushed):
+        if stack_top:
+            stack = stack[1]
+        for symbol in pushed:
+            stack = (symbol, stack)
+        return stack
+
+    def epsilon_move(self, cell, stack, steps, step_limit, at_end=False):
+        """
+        Makes the epsilon move(s) at cell, a whole precomputed chain if it fits
+        within step_limit. Returns (state, stack, steps), or None if cell has no
+        epsilon transition.
+        """
+        stack_top = cell % self.n_stack
+        chain = (self.closure_at_end if at_end else self.closure)[cell]
+        if chain >= 0 and steps + self.closure_steps[chain] <= step_limit:
+            return (
+                self.closure_states[chain],
+                self._push(stack, stack_top, self.closure_pushes[chain]),
+                steps + self.closure_steps[chain],
+            )
+        transition = self.table[cell * self.n_input]
+        if transition < 0:
+            return None
+        return (
+            self.next_states[transition],
+            self._push(stack, stack_top, self.pushes[transition]),
+            steps + 1,
+        )
+
+    def consume(self, state, stack, steps, input_symbol, step_limit):
+        """
+        Makes the moves up to and including reading input_symbol. Returns
+        (state, stack, steps), or the reason code if the run stops first.
+        """
+        n_stack, n_input, table = self.n_stack, self.n_input, self.table
+        while True:
+            if steps >= step_limit:
+                return STEP_BUDGET
+            stack_top = stack[0] if stack else EMPTY_STACK
+            cell = state * n_stack + stack_top
+            transition = table[cell * n_input + input_symbol] if input_symbol > 0 else -1
+            if transition >= 0:
+                return (
+                    self.next_states[transition],
+                    self._push(stack, stack_top, self.pushes[transition]),
+                    steps + 1,
+                )
+            if self.cycle[cell]:
+                return EPSILON_CYCLE
+            moved = self.epsilon_move(cell, stack, steps, step_limit)
+            if moved is None:
+                return NO_TRANSITION
+            state, stack, steps = moved
+
+    def finish(self, state, stack, steps, step_limit):
+        """Returns the reason code for a run whose input ends here."""
+        while True:
+            if self.accepting[state]:
+                return ACCEPTED
+            if steps >= step_limit:
+                return STEP_BUDGET
+            cell = state * self.n_stack + (stack[0] if stack else EMPTY_STACK)
+            if self.cycle_at_end[cell]:
+                return EPSILON_CYCLE
+            moved = self.epsilon_move(cell, stack, steps, step_limit, at_end=True)
+            if moved is None:
+                return NO_TRANSITION
+            state, stack, steps = moved
+
+    def input_symbols(self, input_string):
+        """Input symbol ids of input_string's characters; -1 for unknown ones."""
+        input_ids = self._input_ids
+        return [input_ids.get(char, -1) for char in input_string]
+
+    def describe(self, transition):
+        state, input_symbol, stack_top, new_state, stack_push = self.keys[transition]
+        return (
+            f"({state}, {input_symbol or 'e'}, {stack_top or 'e'})"
+            f" -> ({new_state}, {stack_push or 'e'})"
+        )
+
+
+def _fill_subtree(node, reasons, reason):
+    """Gives every input ending in the trie below node the same reason code."""
+    pending = [node]
+    while pending:
+        children, ending = pending.pop()
+        for i in ending:
+            reasons[i] = reason
+        pending.extend(children.values())
+
+
 def main():
     dpda = DPDA()
-    dpda.read_from_file("dpda.txt")
+    try:
+        dpda.read_from_file("dpda.txt")
+    except DPDAError as e:
+        print(e)
+        return
     print("DPDA loaded successfully!")
     print("This DPDA recognizes the language {a^n b^n | n ≥ 1}")
 
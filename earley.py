@@ -0,0 +1,331 @@
+"""
+Earley parser for grammars that are not LL(1).
+
+When CFG.build_ll1_table finds conflicts it keeps one production per cell,
+so the DPDA rejects inputs that need the others. EarleyParser parses with the
+grammar itself (the same p1.CFG) and accepts exactly the language of the
+grammar, whatever its conflicts, ambiguity or left recursion:
+
+    parser = EarleyParser(cfg)
+    root = parser.parse(compiled.tokenize("a + b"))
+
+grammar_compiler.CompiledGrammar switches to it automatically when the
+grammar has LL(1) conflicts; LL(1) grammars keep the DPDA.
+
+The chart is memoized: every item (production, dot, origin) is added to a
+chart position at most once, each non-terminal is predicted once per
+position, and each (non-terminal, origin) completion advances its waiting
+items once. Parsing takes O(n^3) time in the number of tokens at worst,
+O(n^2) for unambiguous grammars and O(n) for most practical ones. Nullable
+non-terminals are handled as in Aycock and Horspool's "Practical Earley
+Parsing" (an item waiting on a nullable symbol also skips over it).
+
+The tree is rebuilt from the item that first completed each span, so an
+ambiguous input gets one of its derivations (always the same one), built
+with the same tree builders as p2.DPDA.
+"""
+
+from grammar_analysis import compute_nullable
+from lexer import Token, TokenClassifier
+from parse_tree import ParseTreeBuilder
+from tracing import Tracer
+
+# Backpointer kinds: the symbol before the dot was a shifted token, a
+# completed non-terminal, or a nullable non-terminal skipped over; _LEO marks
+# a completed item reached through a chain of deterministic completions.
+_SCANNED = 0
+_COMPLETED = 1
+_SKIPPED = 2
+_LEO = 3
+
+
+class EarleyParser:
+    def __init__(self, cfg, epsilon="eps", classifier=None):
+        self.start_symbol = cfg.start_symbol
+        self.non_terminals = frozenset(cfg.non_terminals)
+        # Productions numbered in grammar order, with epsilon symbols dropped
+        # (a body of just 'eps' becomes empty).
+        self.heads = []
+        self.bodies = []
+        self.rules_for = {}
+        for head in cfg.non_terminals:
+            self.rules_for[head] = []
+        for head, bodies in cfg.productions.items():
+            for body in bodies:
+                self.rules_for.setdefault(head, []).append(len(self.bodies))
+                self.heads.append(head)
+                self.bodies.append(tuple(symbol for symbol in body if symbol != epsilon))
+        self.nullable = compute_nullable(cfg.productions, cfg.non_terminals, epsilon)
+        self._empty_rules = self._find_empty_rules()
+        # Classifies plain token strings, as in p2.DPDA.
+        if classifier is None:
+            classifier = TokenClassifier.from_cfg(cfg)
+        self.classifier = classifier
+
+    def _find_empty_rules(self):
+        """
+        Returns {nullable non-terminal: production} choosing, for each, a
+        production whose body only uses non-terminals chosen before it, so
+        expanding them to the empty string always terminates.
+        """
+        chosen = {}
+        changed = True
+        while changed:
+            changed = False
+            for rule, body in enumerate(self.bodies):
+                head = self.heads[rule]
+                if head not in chosen and all(symbol in chosen for symbol in body):
+                    chosen[head] = rule
+                    changed = True
+        return chosen
+
+    def parse(self, input_tokens, tracer=None, stats=None, build_tree=True, tree_builder=None):
+        """
+        Parses input_tokens (lexer.Tokens or plain token strings, optionally
+        ending in '$') like p2.DPDA.run: returns the parse tree root on
+        acceptance (True when build_tree is False) and None on rejection.
+        Plain strings are classified as terminals by self.classifier.
+        """
+        tracer = tracer if tracer is not None else Tracer()
+        tokens = []
+        for token in input_tokens:
+            if token == "$":
+                break
+            tokens.append(token)
+
+        if tracer.summary_enabled:
+            tracer.sink("\n--- Running Earley parser ---")
+        charts, leo_links = self._recognize(tokens, stats)
+        n = len(charts) - 1
+        accepted = None
+        if n == len(tokens):
+            for rule in self.rules_for.get(self.start_symbol, ()):
+                if (rule, len(self.bodies[rule]), 0) in charts[n]:
+                    accepted = (rule, len(self.bodies[rule]), 0)
+                    break
+
+        if accepted is None:
+            if tracer.summary_enabled:
+                where = f"token {n}" if n < len(tokens) else "end of input"
+                tracer.sink(f"Rejected: No parse continues at {where}.")
+            return None
+        if tracer.summary_enabled:
+            tracer.sink("Accepted")
+        if not build_tree:
+            return True
+        if tree_builder is None:
+            tree_builder = ParseTreeBuilder()
+        root = tree_builder.new_root(self.start_symbol)
+        self._build_tree(tree_builder, root, charts, leo_links, tokens, accepted, n)
+        return tree_builder.result(root)
+
+    def _recognize(self, tokens, stats=None):
+        """
+        Fills the chart. Returns the list of one {item: backpointer} dict per
+        position reached (it stops early at the first position no item gets
+        past) and the Leo links the tree is rebuilt with.
+        """
+        heads = self.heads
+        bodies = self.bodies
+        rules_for = self.rules_for
+        non_terminals = self.non_terminals
+        nullable = self.nullable
+        n = len(tokens)
+        terminals = self._terminals_of(tokens)
+
+        charts = [{(rule, 0, 0): None for rule in rules_for.get(self.start_symbol, ())}]
+        waiting = []  # per position: {non_terminal: [items whose next symbol it is]}
+        leo_tops = {}  # (origin, symbol) -> top item of its Leo chain, or None
+        leo_links = {}  # (origin, symbol) -> the item waiting for symbol there
+        items = 0
+
+        for k in range(n + 1):
+            chart = charts[k]
+            waiting_here = {}
+            waiting.append(waiting_here)
+            predicted = set()
+            completed = set()  # (head, origin) pairs already completed here
+            next_chart = {}
+            agenda = list(chart)
+
+            while agenda:
+                item = agenda.pop()
+                rule, dot, origin = item
+                body = bodies[rule]
+                if dot < len(body):
+                    symbol = body[dot]
+                    if symbol in non_terminals:
+                        waiting_here.setdefault(symbol, []).append(item)
+                        if symbol not in predicted:
+                            predicted.add(symbol)
+                            for predicted_rule in rules_for.get(symbol, ()):
+                                new = (predicted_rule, 0, k)
+                                if new not in chart:
+                                    chart[new] = None
+                                    agenda.append(new)
+                        if symbol in nullable:
+                            new = (rule, dot + 1, origin)
+                            if new not in chart:
+                                chart[new] = (_SKIPPED, item, symbol)
+                                agenda.append(new)
+                    elif k < n and terminals[k] == symbol:
+                        new = (rule, dot + 1, origin)
+                        if new not in next_chart:
+                            next_chart[new] = (_SCANNED, item, k)
+                else:
+                    head = heads[rule]
+                    if (head, origin) in completed:
+                        continue
+                    completed.add((head, origin))
+                    if origin < k:
+                        top = self._leo_top(waiting, leo_tops, leo_links, origin, head)
+                        if top is not None:
+                            if top not in chart:
+                                chart[top] = (_LEO, (origin, head), item)
+                                agenda.append(top)
+                            continue
+                    # Items waiting at origin == k may still arrive later;
+                    # those skip over head through the nullable rule above.
+                    for parent in list(waiting[origin].get(head, ())):
+                        parent_rule, parent_dot, parent_origin = parent
+                        new = (parent_rule, parent_dot + 1, parent_origin)
+                        if new not in chart:
+                            chart[new] = (_COMPLETED, parent, origin, item)
+                            agenda.append(new)
+
+            items += len(chart)
+            if k == n or not next_chart:
+                break
+            charts.append(next_chart)
+
+        if stats is not None:
+            stats.count("earley.runs")
+            stats.count("earley.items", items)
+            stats.record_max("earley.chart_positions", len(charts))
+        return charts, leo_links
+
+    def _leo_top(self, waiting, tops, links, origin, symbol):
+        """
+        Leo's optimization for right recursion. If exactly one item at origin
+        waits for symbol and symbol is its last, completing symbol there
+        completes that item too, and so on up the chain; returns the item at
+        the top of the chain, which is added in place of every completion
+        along it, or None if the chain is empty. Without this a right-
+        recursive list would make the chart quadratic in its length.
+        """
+        bodies = self.bodies
+        path = []
+        seen = set()
+        key = (origin, symbol)
+        while key not in tops and key not in seen:
+            seen.add(key)
+            waiters = waiting[key[0]].get(key[1], ())
+            if len(waiters) != 1:
+                break
+            parent = waiters[0]
+            rule, dot, parent_origin = parent
+            if dot + 1 != len(bodies[rule]):
+                break
+            path.append((key, parent))
+            head = self.heads[rule]
+            if head == self.start_symbol and parent_origin == 0:
+                # Keep the start symbol's completion in the chart.
+                key = None
+                break
+            key = (parent_origin, head)
+
+        if not path:
+            return tops.setdefault((origin, symbol), None)
+        above = tops.get(key)
+        for level_key, parent in reversed(path):
+            rule, dot, parent_origin = parent
+            if above is None:
+                above = (rule, dot + 1, parent_origin)
+            tops[level_key] = above
+            links[level_key] = parent
+        return above
+
+    def _leo_levels(self, links, key, top):
+        """
+        Returns the [(parent item, its chart position)] a Leo chain from key
+        went through, bottom first; the last parent advances to top.
+        """
+        levels = []
+        while True:
+            parent = links[key]
+            levels.append((parent, key[0]))
+            rule, dot, parent_origin = parent
+            if (rule, dot + 1, parent_origin) == top:
+                return levels
+            key = (parent_origin, self.heads[rule])
+
+    def _terminals_of(self, tokens):
+        """Returns the terminal of each token (None for an unknown string)."""
+        names = self.classifier.symbols.names
+        classify = self.classifier.classify
+        terminals = []
+        for token in tokens:
+            if isinstance(token, Token):
+                terminals.append(token.terminal)
+            else:
+                terminal_id = classify(token)
+                terminals.append(names[terminal_id] if terminal_id >= 0 else None)
+        return terminals
+
+    def _build_tree(self, tree_builder, root, charts, leo_links, tokens, item, end):
+        """
+        Builds the derivation recorded by the backpointers under root, which
+        stands for the completed item ending at end. Iterative, so deep trees
+        don't hit the recursion limit.
+        """
+        bodies = self.bodies
+        # (node, item, end, leo), or (node, symbol, None, None) for a nullable
+        # non-terminal that derives the empty string. leo is (bottom, levels,
+        # i) when item is the completion of levels[i] in a Leo chain, whose
+        # first backpointer isn't in the chart.
+        pending = [(root, item, end, None)]
+        while pending:
+            node, item, end, leo = pending.pop()
+            if end is None:
+                body = bodies[self._empty_rules[item]]
+                for child, symbol in zip(tree_builder.expand(node, body), body):
+                    pending.append((child, symbol, None, None))
+                continue
+
+            rule = item[0]
+            children = tree_builder.expand(node, bodies[rule])
+            # Walk the backpointers from the dot at the end back to the start.
+            position = end
+            for child in reversed(children):
+                backpointer = charts[position][item] if leo is None else None
+                if backpointer is not None and backpointer[0] == _LEO:
+                    levels = self._leo_levels(leo_links, backpointer[1], item)
+                    leo = (backpointer[2], levels, len(levels) - 1)
+                if leo is not None:
+                    # The completion along a Leo chain: the level below it
+                    # (or the chain's bottom item) is the completed child.
+                    bottom, levels, i = leo
+                    item, origin = levels[i]
+                    if i:
+                        below, _ = levels[i - 1]
+                        completed = (below[0], below[1] + 1, below[2])
+                        pending.append((child, completed, position, (bottom, levels, i - 1)))
+                    else:
+                        pending.append((child, bottom, position, None))
+                    position = origin
+                    leo = None
+                    continue
+
+                kind = backpointer[0]
+                item = backpointer[1]
+                if kind == _SCANNED:
+                    token_position = backpointer[2]
+                    token = tokens[token_position]
+                    lexeme = token.lexeme if isinstance(token, Token) else token
+                    tree_builder.set_token(child, lexeme, token_position)
+                    position = token_position
+                elif kind == _COMPLETED:
+                    pending.append((child, backpointer[3], position, None))
+                    position = backpointer[2]
+                else:
+                    pending.append((child, backpointer[2], None, None))
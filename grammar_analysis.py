@@ -0,0 +1,273 @@
+"""
+FIRST and FOLLOW set computation by propagation over the symbol dependency graph.
+
+Instead of sweeping every production until nothing changes, each problem is
+turned into a graph: an edge X -> Y means "the set of X includes the set of Y".
+Strongly connected components share one set (they necessarily end up equal),
+and the components are processed once each in dependency order, so every set
+is built in a single pass over the graph.
+
+Symbols are interned to small ints (symbols.SymbolTable) and every set is an
+int bitset, so unions are single big-int ORs.
+"""
+
+from symbols import SymbolTable
+
+
+def strongly_connected_components(nodes, successors):
+    """
+    Tarjan's algorithm, iterative. Returns the components of the graph as lists
+    of nodes, ordered so that every component comes after all components it has
+    edges to (i.e. dependencies first).
+    """
+    index_of = {}
+    low = {}
+    on_stack = set()
+    stack = []
+    components = []
+    next_index = 0
+
+    for root in nodes:
+        if root in index_of:
+            continue
+        index_of[root] = low[root] = next_index
+        next_index += 1
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(successors.get(root, ())))]
+
+        while work:
+            node, children = work[-1]
+            for child in children:
+                if child not in index_of:
+                    index_of[child] = low[child] = next_index
+                    next_index += 1
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(successors.get(child, ()))))
+                    break
+                if child in on_stack and index_of[child] < low[node]:
+                    low[node] = index_of[child]
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    if low[node] < low[parent]:
+                        low[parent] = low[node]
+                if low[node] == index_of[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+
+    return components
+
+
+def propagate(nodes, base, includes, stats=None, name="propagate"):
+    """
+    Solves sets[X] = base[X] | union(sets[Y] for Y in includes[X]) for every X
+    in nodes, where the sets are int bitsets. Returns {node: bitset}; nodes in
+    one cycle get the same bitset.
+
+    With a stats.Stats, counts the components (the single pass's "sweeps") and
+    the edges followed as <name>.components and <name>.edges.
+    """
+    component_of = {}
+    component_bits = []
+    components = strongly_connected_components(nodes, includes)
+    if stats is not None:
+        stats.count(f"{name}.components", len(components))
+        stats.count(f"{name}.edges", sum(len(includes.get(node, ())) for node in nodes))
+    for component_id, component in enumerate(components):
+        result = 0
+        for node in component:
+            component_of[node] = component_id
+        for node in component:
+            result |= base.get(node, 0)
+            for dependency in includes.get(node, ()):
+                dependency_component = component_of.get(dependency)
+                # Members of this component are unioned via their own bases;
+                # every other dependency's component is already final.
+                if dependency_component is not None and dependency_component != component_id:
+                    result |= component_bits[dependency_component]
+        component_bits.append(result)
+
+    return {node: component_bits[component_of[node]] for node in nodes}
+
+
+def compute_nullable(productions, non_terminals, epsilon="eps", stats=None):
+    """
+    Returns the set of non-terminals that derive the empty string.
+
+    Each production keeps a count of body symbols not yet known to be nullable;
+    when a non-terminal becomes nullable only the productions mentioning it are
+    revisited.
+    """
+    nullable = set()
+    heads = []
+    remaining = []  # per production: body symbols not yet known nullable, or None
+    occurrences = {}
+    worklist = []
+
+    for head in non_terminals:
+        for body in productions.get(head, ()):
+            production_id = len(heads)
+            count = 0
+            for symbol in body:
+                if symbol == epsilon:
+                    continue
+                if symbol not in non_terminals:
+                    # A real terminal (or undeclared symbol): never nullable.
+                    count = None
+                    break
+                count += 1
+                occurrences.setdefault(symbol, []).append(production_id)
+            heads.append(head)
+            remaining.append(count)
+            if count == 0 and head not in nullable:
+                nullable.add(head)
+                worklist.append(head)
+
+    if stats is not None:
+        stats.count("nullable.worklist_pops", len(nullable))
+    while worklist:
+        symbol = worklist.pop()
+        for production_id in occurrences.get(symbol, ()):
+            if remaining[production_id] is None:
+                continue
+            remaining[production_id] -= 1
+            head = heads[production_id]
+            if remaining[production_id] == 0 and head not in nullable:
+                nullable.add(head)
+                worklist.append(head)
+                if stats is not None:
+                    stats.count("nullable.worklist_pops")
+
+    return nullable
+
+
+def compute_first_bits(
+    productions, terminals, non_terminals, symbols, epsilon="eps", stats=None
+):
+    """
+    Returns {symbol_id: FIRST bitset} for every terminal and non-terminal, with
+    symbols interned in the given symbols.SymbolTable. epsilon is the grammar's
+    empty-string symbol; its bit is in FIRST(A) iff A is nullable. Undeclared
+    symbols reached in a body get an empty FIRST set.
+    """
+    nullable = compute_nullable(productions, non_terminals, epsilon, stats)
+    intern = symbols.intern
+    epsilon_bit = 1 << intern(epsilon)
+
+    first_bits = {}
+    for t in terminals:
+        terminal_id = intern(t)
+        first_bits[terminal_id] = 1 << terminal_id
+
+    non_terminal_ids = []
+    base = {}
+    includes = {}
+    undeclared = []
+    for head in non_terminals:
+        head_id = intern(head)
+        non_terminal_ids.append(head_id)
+        head_base = 0
+        head_includes = set()
+        for body in productions.get(head, ()):
+            for symbol in body:
+                if symbol in non_terminals:
+                    head_includes.add(intern(symbol))
+                    if symbol not in nullable:
+                        break
+                elif symbol == epsilon:
+                    continue
+                else:
+                    if symbol in terminals:
+                        head_base |= 1 << intern(symbol)
+                    else:
+                        undeclared.append(symbol)
+                    break
+        base[head_id] = head_base
+        includes[head_id] = head_includes
+
+    first_bits.update(propagate(non_terminal_ids, base, includes, stats, "first"))
+    for nt in nullable:
+        first_bits[intern(nt)] |= epsilon_bit
+    for symbol in undeclared:
+        first_bits.setdefault(intern(symbol), 0)
+    return first_bits
+
+
+def compute_follow_bits(
+    productions,
+    start_symbol,
+    non_terminals,
+    first_bits,
+    symbols,
+    epsilon="eps",
+    end_marker="$",
+    stats=None,
+):
+    """
+    Returns {non_terminal_id: FOLLOW bitset} given the FIRST bitsets.
+
+    Each body is scanned once right to left, carrying FIRST of the suffix, which
+    gives the direct FOLLOW contributions; "FOLLOW(B) includes FOLLOW(A)" edges
+    come from B being followed by a nullable (or empty) suffix in A's body.
+    """
+    intern = symbols.intern
+    epsilon_bit = 1 << intern(epsilon)
+    non_terminal_ids = [intern(nt) for nt in non_terminals]
+    base = dict.fromkeys(non_terminal_ids, 0)
+    includes = {nt_id: set() for nt_id in non_terminal_ids}
+    if start_symbol:
+        base[intern(start_symbol)] |= 1 << intern(end_marker)
+
+    for head in non_terminals:
+        head_id = intern(head)
+        for body in productions.get(head, ()):
+            trailer = 0
+            suffix_nullable = True
+            for symbol in reversed(body):
+                symbol_id = symbols.id(symbol)
+                if symbol in non_terminals:
+                    base[symbol_id] |= trailer
+                    if suffix_nullable and symbol_id != head_id:
+                        includes[symbol_id].add(head_id)
+
+                symbol_first = first_bits.get(symbol_id, 0)
+                if symbol_first & epsilon_bit:
+                    trailer |= symbol_first ^ epsilon_bit
+                else:
+                    trailer = symbol_first
+                    suffix_nullable = False
+
+    return propagate(non_terminal_ids, base, includes, stats, "follow")
+
+
+def bits_to_sets(symbols, bits_by_id):
+    """Converts {symbol_id: bitset} to {symbol_name: set of names}."""
+    return {symbols.name(symbol_id): symbols.names_of(bits) for symbol_id, bits in bits_by_id.items()}
+
+
+def compute_first_sets(productions, terminals, non_terminals, epsilon="eps"):
+    """String-set form of compute_first_bits: {symbol: FIRST(symbol)}."""
+    symbols = SymbolTable()
+    first_bits = compute_first_bits(productions, terminals, non_terminals, symbols, epsilon)
+    return bits_to_sets(symbols, first_bits)
+
+
+def compute_follow_sets(
+    productions, start_symbol, non_terminals, first_sets, epsilon="eps", end_marker="$"
+):
+    """String-set form of compute_follow_bits: {non_terminal: FOLLOW(non_terminal)}."""
+    symbols = SymbolTable()
+    first_bits = {symbols.intern(symbol): symbols.bits(first) for symbol, first in first_sets.items()}
+    follow_bits = compute_follow_bits(
+        productions, start_symbol, non_terminals, first_bits, symbols, epsilon, end_marker
+    )
+    return bits_to_sets(symbols, follow_bits)
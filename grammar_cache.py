@@ -0,0 +1,109 @@
+"""
+On-disk cache of compiled grammars.
+
+The analysed CFG (FIRST/FOLLOW sets included), the LL(1) parsing table and the
+DPDA transitions are pickled to <cache_dir>/<hash>.pickle, where <hash> is a
+SHA-256 of the grammar file contents. Editing the grammar changes the hash, so
+stale entries are never loaded; bumping CACHE_VERSION invalidates all of them.
+"""
+
+import hashlib
+import os
+import pickle
+import tempfile
+
+from grammar_compiler import CompiledGrammar, compile_grammar
+from p1 import CFG
+from stats import phase
+from tracing import NULL_TRACER
+
+# Bump whenever the pickled layout (or CFG.STATE_ATTRIBUTES) changes.
+CACHE_VERSION = 2
+DEFAULT_CACHE_DIR = ".grammar_cache"
+
+
+def grammar_hash(grammar_file):
+    with open(grammar_file, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def cache_path(digest, cache_dir=DEFAULT_CACHE_DIR):
+    return os.path.join(cache_dir, f"{digest}.pickle")
+
+
+def save_compiled_grammar(compiled, digest, cache_dir=DEFAULT_CACHE_DIR):
+    data = {
+        "version": CACHE_VERSION,
+        "hash": digest,
+        "cfg": compiled.cfg.get_state(),
+        "parsing_table": compiled.parsing_table,
+        "trf": compiled.trf,
+    }
+    os.makedirs(cache_dir, exist_ok=True)
+    # Write to a temporary file and rename it into place, so concurrent
+    # workers never see a partially written cache file.
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path(digest, cache_dir))
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def load_cached_grammar(
+    grammar_file, digest, cache_dir=DEFAULT_CACHE_DIR, tracer=NULL_TRACER, stats=None
+):
+    """Returns the cached CompiledGrammar for digest, or None if there is no usable entry."""
+    # A stale or corrupt pickle can fail in many ways (a missing module or
+    # class, a missing state key, ...); any of them just means a rebuild.
+    try:
+        with open(cache_path(digest, cache_dir), "rb") as f:
+            data = pickle.load(f)
+    except Exception:
+        return None
+
+    if (
+        not isinstance(data, dict)
+        or data.get("version") != CACHE_VERSION
+        or data.get("hash") != digest
+    ):
+        return None
+
+    try:
+        cfg = CFG.from_state(grammar_file, data["cfg"], tracer=tracer, stats=stats)
+        return CompiledGrammar(cfg, data["parsing_table"], data["trf"])
+    except Exception:
+        return None
+
+
+def load_compiled_grammar(
+    grammar_file, cache_dir=DEFAULT_CACHE_DIR, tracer=NULL_TRACER, stats=None
+):
+    """
+    Returns the CompiledGrammar for grammar_file, from the cache when the file
+    is unchanged, otherwise by compiling it and refreshing the cache.
+    """
+    digest = grammar_hash(grammar_file)
+    with phase(stats, "grammar_cache_load"):
+        compiled = load_cached_grammar(grammar_file, digest, cache_dir, tracer, stats)
+    if compiled is not None:
+        if stats is not None:
+            stats.count("grammar_cache.hits")
+        return compiled
+
+    if stats is not None:
+        stats.count("grammar_cache.misses")
+    compiled = compile_grammar(grammar_file, tracer=tracer, stats=stats)
+    try:
+        # The file was hashed and then read again by compile_grammar; if it
+        # changed in between, compiled may not be what digest names, so it
+        # isn't cached.
+        if grammar_hash(grammar_file) == digest:
+            with phase(stats, "grammar_cache_save"):
+                save_compiled_grammar(compiled, digest, cache_dir)
+    except OSError as e:
+        # A read-only or full disk shouldn't stop parsing.
+        tracer.summary(f"Warning: could not write grammar cache: {e}")
+    return compiled
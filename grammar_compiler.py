@@ -0,0 +1,88 @@
+from earley import EarleyParser
+from p1 import CFG
+from p2 import DPDA, TransitionIndex
+from ll1_to_dpda import convert_ll1_to_dpda
+from lexer import Lexer, TokenClassifier
+from stats import phase
+from tracing import NULL_TRACER
+
+
+class CompiledGrammar:
+    """
+    Everything needed to parse with one grammar: the analysed CFG, its LL(1)
+    table, the DPDA transitions and the runtime structures built from them.
+
+    Instances are picklable, so they can be built once and handed to worker
+    processes instead of every worker re-reading the grammar file.
+    """
+
+    def __init__(self, cfg, parsing_table, trf):
+        self.cfg = cfg
+        self.start_symbol = cfg.start_symbol
+        self.terminals = cfg.terminals
+        self.parsing_table = parsing_table
+        self.trf = trf
+        # The DPDA index shares the CFG's symbol ids.
+        self.index = TransitionIndex(trf, symbols=cfg.symbols)
+        self.lexer = Lexer.from_cfg(cfg)
+        # Shared by every parse, so plain token strings seen before skip the regexes.
+        self.classifier = TokenClassifier.from_cfg(cfg)
+        # A table with conflicts keeps one production per cell, so the DPDA
+        # would reject inputs that need the others; such grammars are parsed
+        # with the Earley engine instead. LL(1) grammars stay on the DPDA.
+        self.ll1_conflicts = cfg.ll1_conflicts()
+        self.earley = None
+        if self.ll1_conflicts:
+            self.earley = EarleyParser(cfg, classifier=self.classifier)
+
+    @property
+    def engine(self):
+        """The engine parse_tokens uses: "ll1" (the DPDA) or "earley"."""
+        return "ll1" if self.earley is None else "earley"
+
+    def tokenize(self, text):
+        return self.lexer.tokenize(text)
+
+    def parse(self, text, tracer=NULL_TRACER, stats=None):
+        """
+        Lexes and parses text. Returns the parse tree root, or None if the input
+        is rejected. Raises lexer.LexError if the text can't be tokenized.
+        """
+        with phase(stats, "lex"):
+            tokens = self.lexer.tokenize(text)
+        return self.parse_tokens(tokens, tracer=tracer, stats=stats)
+
+    def parse_tokens(self, tokens, tracer=NULL_TRACER, stats=None):
+        if self.earley is not None:
+            with phase(stats, "parse"):
+                return self.earley.parse(tokens, tracer=tracer, stats=stats)
+        dpda = DPDA(
+            self.index,
+            tokens,
+            self.start_symbol,
+            self.terminals,
+            tracer=tracer,
+            stats=stats,
+            classifier=self.classifier,
+        )
+        with phase(stats, "parse"):
+            return dpda.run()
+
+
+def compile_grammar(grammar_file, tracer=NULL_TRACER, stats=None):
+    """
+    Loads grammar_file and runs the full FIRST/FOLLOW -> LL(1) -> DPDA pipeline.
+    With a stats.Stats, each step is timed as its own phase.
+    """
+    with phase(stats, "grammar_load"):
+        cfg = CFG(grammar_file, tracer=tracer, stats=stats)
+    with phase(stats, "first_sets"):
+        cfg.compute_first_sets()
+    with phase(stats, "follow_sets"):
+        cfg.compute_follow_sets()
+    with phase(stats, "ll1_table"):
+        parsing_table = cfg.build_ll1_table()
+    with phase(stats, "to_dpda"):
+        trf = convert_ll1_to_dpda(cfg, parsing_table)
+    with phase(stats, "runtime_tables"):
+        return CompiledGrammar(cfg, parsing_table, trf)
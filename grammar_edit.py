@@ -0,0 +1,493 @@
+"""
+Incremental grammar analysis for editing a live grammar.
+
+GrammarEditor wraps an analysed p1.CFG together with its LL(1) table and DPDA
+transitions and keeps all of them up to date as productions are added or
+removed, without re-analysing the whole grammar:
+
+    editor = GrammarEditor(cfg)
+    report = editor.add_production("F", ["NUMBER"])
+    for conflict in report.conflicts:
+        ...
+
+An edit only revisits what can depend on the edited production: nullability
+is re-derived when it can flip, changes to FIRST and FOLLOW sets are
+propagated through the symbol dependency graphs only as far as sets actually
+change, and only the table cells (and their trf entries) of productions whose
+prediction set moved are re-entered. The results are always the same as analysing the edited
+grammar from scratch with CFG.build_ll1_table and convert_ll1_to_dpda.
+"""
+
+from collections import namedtuple
+
+from p1 import convert_ll1_to_dpda
+
+# bodies are the distinct productions predicted for M[non_terminal, terminal]
+# in grammar order; like CFG.build_ll1_table, the table keeps the last one.
+Conflict = namedtuple("Conflict", ["non_terminal", "terminal", "bodies"])
+
+# nullable_changed, first_changed and follow_changed are the sets of symbols
+# whose analysis changed; rows are the non-terminals whose table rows were
+# revisited; table_changes is {(non_terminal, terminal): (old body or None,
+# new body or None)} for the cells that changed (their trf entries changed the
+# same way); conflicts lists every conflict in those rows after the edit and
+# ll1 tells whether the whole grammar is LL(1).
+EditReport = namedtuple(
+    "EditReport",
+    [
+        "nullable_changed",
+        "first_changed",
+        "follow_changed",
+        "rows",
+        "table_changes",
+        "conflicts",
+        "ll1",
+    ],
+)
+
+_STATE = "q0"
+
+
+class GrammarEditor:
+    def __init__(self, cfg, parsing_table=None, trf=None, epsilon="eps", end_marker="$", stats=None):
+        """
+        parsing_table and trf (as returned by cfg.build_ll1_table() and
+        p1.convert_ll1_to_dpda) are built if not given; edits update them in
+        place, along with cfg's productions and FIRST/FOLLOW sets.
+        """
+        if not cfg.first_bits or not cfg.follow_bits:
+            cfg.compute_first_sets()
+            cfg.compute_follow_sets()
+        if parsing_table is None:
+            parsing_table = cfg.build_ll1_table()
+        if trf is None:
+            trf = convert_ll1_to_dpda(cfg, parsing_table)
+        self.cfg = cfg
+        self.table = parsing_table
+        self.trf = trf
+        self.symbols = cfg.symbols
+        self.epsilon = epsilon
+        self.end_marker = end_marker
+        self.stats = stats
+        self._epsilon_bit = 1 << self.symbols.intern(epsilon)
+        symbols = self.symbols
+
+        self.nullable = {
+            nt for nt in cfg.non_terminals if cfg.first_bits[symbols.id(nt)] & self._epsilon_bit
+        }
+        # symbol -> {head: [bodies of head that contain symbol]}
+        self._uses = {}
+        for head, bodies in cfg.productions.items():
+            for body in bodies:
+                self._add_uses(head, body)
+
+        # FIRST(X) includes FIRST(Y) for Y in _first_includes[X]; _first_base[X]
+        # holds X's terminals. _first_users is the reverse graph.
+        self._first_base = {}
+        self._first_includes = {}
+        self._first_users = {nt: set() for nt in cfg.non_terminals}
+        for nt in cfg.non_terminals:
+            self._update_first_edges(nt)
+
+        # FOLLOW(B) includes FOLLOW(A) for A in _follow_includes[B];
+        # _follow_feeds is the reverse graph.
+        self._follow_base = {}
+        self._follow_includes = {}
+        self._follow_feeds = {nt: set() for nt in cfg.non_terminals}
+        self._update_follow_edges(cfg.non_terminals)
+
+        # The predictions behind the table: id(body) -> prediction bitset, and
+        # (non_terminal, terminal) -> [bodies predicting it, in grammar order].
+        # _order numbers the live bodies in grammar order (new ones go last).
+        self._order = {}
+        for bodies in cfg.productions.values():
+            for body in bodies:
+                self._order[id(body)] = len(self._order)
+        self._next_order = len(self._order)
+        self._predictions = {}
+        self._cells = {}
+        self.conflicts = {}  # (non_terminal, terminal) -> Conflict
+        for nt in cfg.non_terminals:
+            bodies = cfg.productions.get(nt, ())
+            self._update_row(nt, bodies, {})
+
+    # Edits
+
+    def add_production(self, head, body):
+        """Adds head -> body (a list of symbols) and returns an EditReport."""
+        self._check_head(head)
+        body = list(body)
+        bodies = self.cfg.productions.setdefault(head, [])
+        if body in bodies:
+            return self._report(set(), set(), set(), set(), {})
+        for symbol in body:
+            self.symbols.intern(symbol)
+            if symbol not in self.cfg.non_terminals:
+                # Undeclared symbols get an empty FIRST set, as in compute_first_bits.
+                self.cfg.first_bits.setdefault(self.symbols.id(symbol), 0)
+                self.cfg.first_sets.setdefault(symbol, set())
+        bodies.append(body)
+        self._add_uses(head, body)
+        self._order[id(body)] = self._next_order
+        self._next_order += 1
+        return self._update(head, body, added=True)
+
+    def remove_production(self, head, body):
+        """Removes head -> body and returns an EditReport. Raises ValueError if absent."""
+        self._check_head(head)
+        bodies = self.cfg.productions.get(head, [])
+        body = list(body)
+        if body not in bodies:
+            raise ValueError(f"No production {head} -> {' '.join(body)}")
+        # Keep the list object that was removed: the indexes refer to it by identity.
+        body = bodies.pop(bodies.index(body))
+        del self._order[id(body)]
+        for symbol in set(body):
+            heads = self._uses[symbol]
+            heads[head] = [other for other in heads[head] if other is not body]
+            if not heads[head]:
+                del heads[head]
+        return self._update(head, body, added=False)
+
+    def _check_head(self, head):
+        if head not in self.cfg.non_terminals:
+            raise ValueError(f"Production head '{head}' not declared as non-terminal.")
+
+    # Incremental updates
+
+    def _update(self, head, body, added):
+        cfg = self.cfg
+        symbols = self.symbols
+
+        # Only adding a nullable body to a non-nullable head, or removing one
+        # from a nullable head, can change nullability.
+        nullable_changed = set()
+        if self._body_nullable(body) and (head in self.nullable) != added:
+            nullable_changed = self._update_nullable(head)
+
+        # FIRST: heads whose body prefixes may have changed get new edges, and
+        # their changes are propagated to the non-terminals that include them.
+        edge_heads = {head}
+        for symbol in nullable_changed:
+            edge_heads.update(self._uses.get(symbol, ()))
+        for nt in edge_heads:
+            self._update_first_edges(nt)
+        first_changed = self._propagate_edit(
+            edge_heads,
+            self._first_users,
+            self._first_base,
+            self._first_includes,
+            cfg.first_bits,
+            added,
+            self._epsilon_bit,
+        )
+        for nt in nullable_changed:
+            if nt in self.nullable:
+                cfg.first_bits[symbols.id(nt)] |= self._epsilon_bit
+        first_changed |= nullable_changed
+        for nt in first_changed:
+            cfg.first_sets[nt] = symbols.names_of(cfg.first_bits[symbols.id(nt)])
+
+        # Productions whose prediction may have moved: the edited one and
+        # every one mentioning a symbol whose FIRST set changed.
+        changed_bodies = {head: [body]}
+        for symbol in first_changed:
+            for other_head, bodies in self._uses.get(symbol, {}).items():
+                changed_bodies.setdefault(other_head, []).extend(bodies)
+
+        # FOLLOW: the non-terminals in the edited body, and those left of a
+        # symbol whose FIRST set changed (their trailers changed).
+        follow_seeds = {symbol for symbol in body if symbol in cfg.non_terminals}
+        for bodies in changed_bodies.values():
+            for other_body in bodies:
+                for position in range(len(other_body) - 1, 0, -1):
+                    if other_body[position] in first_changed:
+                        follow_seeds.update(
+                            s for s in other_body[:position] if s in cfg.non_terminals
+                        )
+                        break
+        self._update_follow_edges(follow_seeds)
+        follow_changed = self._propagate_edit(
+            follow_seeds,
+            self._follow_feeds,
+            self._follow_base,
+            self._follow_includes,
+            cfg.follow_bits,
+            added,
+        )
+        for nt in follow_changed:
+            cfg.follow_sets[nt] = symbols.names_of(cfg.follow_bits[symbols.id(nt)])
+            nullable_bodies = [b for b in cfg.productions.get(nt, ()) if self._body_nullable(b)]
+            if nullable_bodies:
+                changed_bodies.setdefault(nt, []).extend(nullable_bodies)
+
+        table_changes = {}
+        for nt, bodies in changed_bodies.items():
+            self._update_row(nt, bodies, table_changes)
+        if self.stats is not None:
+            self.stats.count("grammar_edit.edits")
+            self.stats.count("grammar_edit.rows", len(changed_bodies))
+            self.stats.count("grammar_edit.table_changes", len(table_changes))
+        return self._report(
+            nullable_changed, first_changed, follow_changed, set(changed_bodies), table_changes
+        )
+
+    def _update_nullable(self, head):
+        """Re-derives nullability where it can have changed; returns the flipped non-terminals."""
+        # Only the head and the non-terminals that (transitively) mention it
+        # can flip.
+        region = {head}
+        pending = [head]
+        while pending:
+            for user in self._uses.get(pending.pop(), ()):
+                if user not in region:
+                    region.add(user)
+                    pending.append(user)
+
+        before = self.nullable & region
+        self.nullable -= region
+        changed = True
+        while changed:
+            changed = False
+            for nt in region - self.nullable:
+                if any(self._body_nullable(body) for body in self.cfg.productions.get(nt, ())):
+                    self.nullable.add(nt)
+                    changed = True
+        flipped = before ^ (self.nullable & region)
+        for nt in flipped:
+            self.cfg.first_bits[self.symbols.id(nt)] &= ~self._epsilon_bit
+        return flipped
+
+    def _propagate_edit(self, seeds, users, base, includes, bits, added, epsilon_bit=0):
+        """
+        Brings the sets (bits, by symbol id) up to date after the base and
+        includes of seeds changed, following the users graph only as far as
+        sets actually change. Returns the non-terminals whose set changed.
+        epsilon_bit is left alone in every set.
+
+        Adding a production only grows sets, so the new bits of the seeds are
+        pushed to their users until nothing grows. Removing one only shrinks
+        them: every bit that may have lost its support is first deleted along
+        the users graph, then whatever is still derivable is re-derived and
+        pushed back (delete and re-derive).
+        """
+        symbol_id = self.symbols.id
+        bits_of = bits.get
+        keep = ~epsilon_bit
+        original = {}
+
+        def derive(nt, wanted=keep):
+            """The bits of wanted that nt's set gets from its base and includes."""
+            result = base.get(nt, 0) & wanted
+            for dependency in includes.get(nt, ()):
+                if result == wanted:
+                    break
+                result |= bits_of(symbol_id(dependency), 0) & wanted
+            return result
+
+        def grow(pending):
+            while pending:
+                nt, delta = pending.pop()
+                for user in users.get(nt, ()):
+                    user_id = symbol_id(user)
+                    user_bits = bits_of(user_id, 0)
+                    new = delta & ~user_bits
+                    if new:
+                        original.setdefault(user, user_bits)
+                        bits[user_id] = user_bits | new
+                        pending.append((user, new))
+
+        pending = []
+        if added:
+            for nt in seeds:
+                nt_id = symbol_id(nt)
+                old_bits = bits_of(nt_id, 0)
+                new = derive(nt) & ~old_bits
+                if new:
+                    original.setdefault(nt, old_bits)
+                    bits[nt_id] = old_bits | new
+                    pending.append((nt, new))
+            grow(pending)
+        else:
+            deleted = {}
+            for nt in seeds:
+                nt_id = symbol_id(nt)
+                old_bits = bits_of(nt_id, 0)
+                lost = old_bits & keep & ~base.get(nt, 0)
+                if lost:
+                    original.setdefault(nt, old_bits)
+                    bits[nt_id] = old_bits & ~lost
+                    deleted[nt] = deleted.get(nt, 0) | lost
+                    pending.append((nt, lost))
+            while pending:
+                nt, lost = pending.pop()
+                for user in users.get(nt, ()):
+                    user_id = symbol_id(user)
+                    user_bits = bits_of(user_id, 0)
+                    lost_here = user_bits & lost & ~base.get(user, 0)
+                    if lost_here:
+                        original.setdefault(user, user_bits)
+                        bits[user_id] = user_bits & ~lost_here
+                        deleted[user] = deleted.get(user, 0) | lost_here
+                        pending.append((user, lost_here))
+            for nt, lost in deleted.items():
+                nt_id = symbol_id(nt)
+                regained = derive(nt, lost) & ~bits[nt_id]
+                if regained:
+                    bits[nt_id] |= regained
+                    pending.append((nt, regained))
+            grow(pending)
+
+        if self.stats is not None:
+            self.stats.count("grammar_edit.visited", len(original))
+        return {nt for nt, old_bits in original.items() if bits[symbol_id(nt)] != old_bits}
+
+    # Dependency graphs
+
+    def _add_uses(self, head, body):
+        for symbol in set(body):
+            self._uses.setdefault(symbol, {}).setdefault(head, []).append(body)
+
+    def _body_nullable(self, body):
+        return all(symbol == self.epsilon or symbol in self.nullable for symbol in body)
+
+    def _update_first_edges(self, nt):
+        cfg = self.cfg
+        base = 0
+        included = set()
+        for body in cfg.productions.get(nt, ()):
+            for symbol in body:
+                if symbol in cfg.non_terminals:
+                    included.add(symbol)
+                    if symbol not in self.nullable:
+                        break
+                elif symbol == self.epsilon:
+                    continue
+                else:
+                    if symbol in cfg.terminals:
+                        base |= 1 << self.symbols.id(symbol)
+                    break
+        for old in self._first_includes.get(nt, ()):
+            self._first_users[old].discard(nt)
+        for new in included:
+            self._first_users[new].add(nt)
+        self._first_base[nt] = base
+        self._first_includes[nt] = included
+
+    def _update_follow_edges(self, nts):
+        """Rescans every occurrence of nts for their FOLLOW bases and includes."""
+        cfg = self.cfg
+        symbol_id = self.symbols.id
+        first_bits = cfg.first_bits
+        epsilon_bit = self._epsilon_bit
+        end_bit = 1 << self.symbols.intern(self.end_marker)
+        base = {nt: end_bit if nt == cfg.start_symbol else 0 for nt in nts}
+        included = {nt: set() for nt in nts}
+
+        # Each body is scanned once, however many of nts it contains.
+        scanned = set()
+        for nt in nts:
+            for head, bodies in self._uses.get(nt, {}).items():
+                for body in bodies:
+                    if id(body) in scanned:
+                        continue
+                    scanned.add(id(body))
+                    trailer = 0
+                    suffix_nullable = True
+                    for symbol in reversed(body):
+                        if symbol in base:
+                            base[symbol] |= trailer
+                            if suffix_nullable and head != symbol:
+                                included[symbol].add(head)
+                        symbol_first = first_bits.get(symbol_id(symbol), 0)
+                        if symbol_first & epsilon_bit:
+                            trailer |= symbol_first ^ epsilon_bit
+                        else:
+                            trailer = symbol_first
+                            suffix_nullable = False
+
+        for nt in nts:
+            for old in self._follow_includes.get(nt, ()):
+                self._follow_feeds[old].discard(nt)
+            for new in included[nt]:
+                self._follow_feeds[new].add(nt)
+            self._follow_base[nt] = base[nt]
+            self._follow_includes[nt] = included[nt]
+
+    # Table rows
+
+    def _predict(self, nt, body):
+        """FIRST(body) without epsilon, plus FOLLOW(nt) if body is nullable."""
+        cfg = self.cfg
+        first_bits = cfg.first_bits
+        symbols = self.symbols
+        bits = 0
+        for symbol in body:
+            symbol_first = first_bits.get(symbols.id(symbol), 0)
+            bits |= symbol_first & ~self._epsilon_bit
+            if not symbol_first & self._epsilon_bit:
+                return bits
+        return bits | cfg.follow_bits.get(symbols.id(nt), 0)
+
+    def _update_row(self, nt, bodies, table_changes):
+        """Re-enters bodies (productions of nt, or just removed from it) into nt's row."""
+        order = self._order
+        names_of = self.symbols.names_of
+        cells = self._cells
+        touched = set()
+        for body in bodies:
+            key = id(body)
+            old_bits = self._predictions.pop(key, 0)
+            new_bits = 0
+            if key in order:
+                new_bits = self._predictions[key] = self._predict(nt, body)
+            for terminal in names_of(old_bits & ~new_bits):
+                cell = cells[(nt, terminal)]
+                cell[:] = [other for other in cell if other is not body]
+                touched.add(terminal)
+            for terminal in names_of(new_bits & ~old_bits):
+                # Keep the cell in grammar order: the last body wins it.
+                cell = cells.setdefault((nt, terminal), [])
+                position = order[key]
+                index = len(cell)
+                while index and order[id(cell[index - 1])] > position:
+                    index -= 1
+                cell.insert(index, body)
+                touched.add(terminal)
+
+        for terminal in touched:
+            cell_key = (nt, terminal)
+            cell = cells.get(cell_key)
+            old_body = self.table.get(cell_key)
+            self.conflicts.pop(cell_key, None)
+            if not cell:
+                cells.pop(cell_key, None)
+                self.table.pop(cell_key, None)
+                self.trf.pop((_STATE, terminal, nt), None)
+                new_body = None
+            else:
+                new_body = self.table[cell_key] = cell[-1]
+                if new_body:
+                    self.trf[(_STATE, terminal, nt)] = (_STATE, " ".join(new_body))
+                else:
+                    self.trf.pop((_STATE, terminal, nt), None)
+                distinct = []
+                for body in cell:
+                    if body not in distinct:
+                        distinct.append(body)
+                if len(distinct) > 1:
+                    self.conflicts[cell_key] = Conflict(nt, terminal, distinct)
+            if old_body != new_body:
+                table_changes[cell_key] = (old_body, new_body)
+
+    def _report(self, nullable_changed, first_changed, follow_changed, rows, table_changes):
+        conflicts = [conflict for key, conflict in self.conflicts.items() if key[0] in rows]
+        return EditReport(
+            nullable_changed,
+            first_changed,
+            follow_changed,
+            rows,
+            table_changes,
+            conflicts,
+            not self.conflicts,
+        )
@@ -0,0 +1,150 @@
+"""
+Synthetic grammar families of a chosen size, for benchmark.py and the tests.
+
+Each family stresses a different part of the pipeline:
+
+    wide     one non-terminal with many alternatives (large table rows)
+    deep     many precedence levels (long derivation chains, deep stacks)
+    epsilon  long runs of nullable symbols (FIRST/FOLLOW propagation)
+    regex    many regex terminals (lexer and regex fallback matching)
+
+    grammar = GRAMMARS["deep"](8)
+    text = grammar.make_input(100, random.Random(0))
+"""
+
+import os
+from collections import namedtuple
+
+# text is the grammar file contents; make_input(tokens, rng) returns an input
+# text of about that many tokens that the grammar accepts.
+SyntheticGrammar = namedtuple("SyntheticGrammar", ["text", "make_input"])
+
+
+def _grammar_text(start, non_terminals, terminals, productions):
+    lines = [
+        f"START={start}",
+        f"NON_TERMINALS={','.join(non_terminals)}",
+        f"TERMINALS={','.join(terminals)},eps",
+    ]
+    lines.extend(f"{head} -> {' | '.join(bodies)}" for head, bodies in productions)
+    return "\n".join(lines) + "\n"
+
+
+def wide_grammar(n):
+    """S -> ITEM S | eps, ITEM -> K0 | ... | K(n-1), Ki -> kwi_"""
+    keywords = [f"kw{i}_" for i in range(n)]
+    wrappers = [f"K{i}" for i in range(n)]
+    productions = [("S", ["ITEM S", "eps"]), ("ITEM", wrappers)]
+    productions += [(w, [k]) for w, k in zip(wrappers, keywords)]
+    text = _grammar_text("S", ["S", "ITEM"] + wrappers, keywords, productions)
+
+    def make_input(tokens, rng):
+        return " ".join(rng.choice(keywords) for _ in range(tokens))
+
+    return SyntheticGrammar(text, make_input)
+
+
+def deep_grammar(n):
+    """n binary-operator precedence levels over numbers and parentheses."""
+    non_terminals = []
+    productions = []
+    operators = [f"o{i}" for i in range(n)]
+    for i in range(n):
+        non_terminals += [f"E{i}", f"R{i}", f"OP{i}"]
+        productions.append((f"E{i}", [f"E{i + 1} R{i}"]))
+        productions.append((f"R{i}", [f"OP{i} E{i + 1} R{i}", "eps"]))
+        productions.append((f"OP{i}", [operators[i]]))
+    non_terminals += [f"E{n}", "NUM", "LP", "RP"]
+    productions.append((f"E{n}", ["LP E0 RP", "NUM"]))
+    productions += [("NUM", [r"\d+"]), ("LP", [r"\("]), ("RP", [r"\)"])]
+    text = _grammar_text("E0", non_terminals, operators + [r"\d+", r"\(", r"\)"], productions)
+
+    def make_input(tokens, rng):
+        out = []
+        open_parens = 0
+        while True:
+            # An operand: open a parenthesis (still needing an operand) or a number.
+            if len(out) < tokens and rng.random() < 0.2:
+                out.append("(")
+                open_parens += 1
+                continue
+            out.append(str(rng.randrange(1000)))
+            if len(out) >= tokens:
+                break
+            if open_parens and rng.random() < 0.3:
+                out.append(")")
+                open_parens -= 1
+            out.append(rng.choice(operators))
+        out.extend(")" * open_parens)
+        return " ".join(out)
+
+    return SyntheticGrammar(text, make_input)
+
+
+def epsilon_grammar(n):
+    """S -> B S | eps, B -> A0 ... A(n-1) X, every Ai nullable."""
+    optional = [f"A{i}" for i in range(n)]
+    wrappers = [f"T{i}" for i in range(n)]
+    terminals = [f"a{i}_" for i in range(n)]
+    productions = [("S", ["B S", "eps"]), ("B", [" ".join(optional) + " X"])]
+    productions += [(a, [t, "eps"]) for a, t in zip(optional, wrappers)]
+    productions += [(w, [t]) for w, t in zip(wrappers, terminals)]
+    productions.append(("X", ["x_"]))
+    text = _grammar_text(
+        "S", ["S", "B", "X"] + optional + wrappers, terminals + ["x_"], productions
+    )
+
+    def make_input(tokens, rng):
+        out = []
+        while len(out) < tokens:
+            out.extend(t for t in terminals if rng.random() < 0.3)
+            out.append("x_")
+        return " ".join(out)
+
+    return SyntheticGrammar(text, make_input)
+
+
+def regex_grammar(n):
+    """S -> ITEM S | eps over n regex terminals of a few shapes."""
+    shapes = [
+        (r"r{i}:[a-z]+", lambda i, rng: f"r{i}:{'abcxyz'[: rng.randrange(1, 7)]}"),
+        (r"r{i}:\d+(\.\d+)?", lambda i, rng: f"r{i}:{rng.randrange(100)}.{rng.randrange(10)}"),
+        (r'r{i}:"[^"]*"', lambda i, rng: f'r{i}:"s{rng.randrange(100)}"'),
+    ]
+    terminals = [shapes[i % len(shapes)][0].replace("{i}", str(i)) for i in range(n)]
+    wrappers = [f"R{i}" for i in range(n)]
+    productions = [("S", ["ITEM S", "eps"]), ("ITEM", wrappers)]
+    productions += [(w, [t]) for w, t in zip(wrappers, terminals)]
+    text = _grammar_text("S", ["S", "ITEM"] + wrappers, terminals, productions)
+
+    def make_input(tokens, rng):
+        out = []
+        for _ in range(tokens):
+            i = rng.randrange(n)
+            out.append(shapes[i % len(shapes)][1](i, rng))
+        return " ".join(out)
+
+    return SyntheticGrammar(text, make_input)
+
+
+GRAMMARS = {
+    "wide": wide_grammar,
+    "deep": deep_grammar,
+    "epsilon": epsilon_grammar,
+    "regex": regex_grammar,
+}
+
+
+def write_grammars(directory, size):
+    """
+    Writes one grammar file of each family at size into directory. Returns
+    [(path, SyntheticGrammar)] in GRAMMARS order.
+    """
+    written = []
+    for family, make in GRAMMARS.items():
+        grammar = make(size)
+        path = os.path.join(directory, f"{family}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(grammar.text)
+        written.append((path, grammar))
+    return written
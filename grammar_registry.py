@@ -0,0 +1,177 @@
+"""
+In-memory registry of compiled grammars.
+
+GrammarRegistry.get(grammar_file) compiles a grammar on first use (through the
+on-disk grammar cache) and keeps the CompiledGrammar in an LRU keyed by the
+SHA-256 of the file contents, so an edited grammar is recompiled and identical
+copies of one grammar share an entry. The LRU is bounded by an estimate of the
+memory its entries hold (their pickled size); the least recently used grammars
+are evicted first, but the one just requested always stays.
+"""
+
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from grammar_cache import DEFAULT_CACHE_DIR, grammar_hash, load_compiled_grammar
+from grammar_compiler import compile_grammar
+from tracing import NULL_TRACER
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+class GrammarRegistry:
+    def __init__(
+        self,
+        max_bytes=DEFAULT_MAX_BYTES,
+        cache_dir=DEFAULT_CACHE_DIR,
+        tracer=NULL_TRACER,
+        stats=None,
+    ):
+        """cache_dir=None compiles without the on-disk cache."""
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.tracer = tracer
+        self.stats = stats
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.total_bytes = 0
+        self._entries = OrderedDict()  # digest -> (CompiledGrammar, size)
+        # path -> (mtime_ns, size, digest), so hits don't re-hash the file.
+        self._digests = {}
+        # digest -> Future of the compile in progress for it.
+        self._loading = {}
+        self._lock = threading.Lock()
+
+    def get(self, grammar_file):
+        """
+        Returns the CompiledGrammar for grammar_file's current contents. The
+        grammar is compiled outside the lock, so other grammars can be looked
+        up meanwhile; concurrent requests for the one being compiled wait for
+        that compile instead of starting their own.
+        """
+        digest = self._digest(grammar_file)
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                self._entries.move_to_end(digest)
+                self._count_hit()
+                return entry[0]
+            loading = self._loading.get(digest)
+            waiting = loading is not None
+            if waiting:
+                self._count_hit()
+            else:
+                loading = self._loading[digest] = Future()
+                self.misses += 1
+                if self.stats is not None:
+                    self.stats.count("grammar_registry.misses")
+
+        if waiting:
+            return loading.result()
+
+        try:
+            compiled = self._compile(grammar_file)
+            size = len(pickle.dumps(compiled, protocol=pickle.HIGHEST_PROTOCOL))
+        except BaseException as e:
+            with self._lock:
+                del self._loading[digest]
+            loading.set_exception(e)
+            raise
+        with self._lock:
+            del self._loading[digest]
+            self._entries[digest] = (compiled, size)
+            self.total_bytes += size
+            self._evict()
+            if self.stats is not None:
+                self.stats.record_max("grammar_registry.bytes", self.total_bytes)
+        loading.set_result(compiled)
+        return compiled
+
+    def get_cached(self, grammar_file):
+        """
+        Returns the CompiledGrammar for grammar_file if it is already loaded and
+        can be found without compiling, hashing or waiting for the lock;
+        otherwise None (call get()). Cheap enough for an event loop.
+        """
+        try:
+            st = os.stat(grammar_file)
+        except OSError:
+            return None
+        known = self._digests.get(grammar_file)
+        if known is None or known[0] != st.st_mtime_ns or known[1] != st.st_size:
+            return None
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            entry = self._entries.get(known[2])
+            if entry is None:
+                return None
+            self._entries.move_to_end(known[2])
+            self._count_hit()
+            return entry[0]
+        finally:
+            self._lock.release()
+
+    def _count_hit(self):
+        self.hits += 1
+        if self.stats is not None:
+            self.stats.count("grammar_registry.hits")
+
+    def _compile(self, grammar_file):
+        if self.cache_dir is None:
+            return compile_grammar(grammar_file, tracer=self.tracer, stats=self.stats)
+        return load_compiled_grammar(
+            grammar_file, cache_dir=self.cache_dir, tracer=self.tracer, stats=self.stats
+        )
+
+    def _digest(self, grammar_file):
+        st = os.stat(grammar_file)
+        with self._lock:
+            known = self._digests.get(grammar_file)
+        if known is not None and known[0] == st.st_mtime_ns and known[1] == st.st_size:
+            return known[2]
+        # Hashed outside the lock; a concurrent caller may hash the same file too.
+        digest = grammar_hash(grammar_file)
+        with self._lock:
+            self._digests[grammar_file] = (st.st_mtime_ns, st.st_size, digest)
+        return digest
+
+    def _evict(self):
+        entries = self._entries
+        while self.total_bytes > self.max_bytes and len(entries) > 1:
+            _, (_, size) = entries.popitem(last=False)
+            self.total_bytes -= size
+            self.evictions += 1
+            if self.stats is not None:
+                self.stats.count("grammar_registry.evictions")
+
+    def __contains__(self, grammar_file):
+        try:
+            digest = self._digest(grammar_file)
+        except OSError:
+            return False
+        with self._lock:
+            return digest in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._digests.clear()
+            self.total_bytes = 0
+
+    def counters(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+        }
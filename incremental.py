@@ -0,0 +1,248 @@
+"""
+Incremental re-parsing for editors.
+
+IncrementalParser parses a token list like p2.DPDA and records checkpoints
+(head position and a snapshot of the parse stack, whose nodes tie into the
+partial tree) every checkpoint_interval tokens. After an edit replaces a range
+of tokens it resumes from the last checkpoint before the edit, and stops as
+soon as it reaches the position of an old checkpoint after the edit with the
+same stack: from there on the old parse is still valid, so its subtrees are
+reused. Re-parse cost depends on the distance between the edit and the next
+point where the parse converges, not on the document length.
+
+Trees are built with parse_tree.ParseTreeBuilder (or any builder with an
+adopt(node, old) method and mutable nodes); compact_tree.CompactTree is
+append-only and can't be spliced.
+"""
+
+from bisect import bisect_right
+from collections import namedtuple
+
+from lexer import Token, TokenClassifier
+from p2 import ACCEPT, EXPAND, SHIFT, DPDAStep, TransitionIndex
+from parse_tree import ParseTreeBuilder
+
+# head is the number of tokens shifted when the snapshot was taken; stack is a
+# list of (symbol_id, node) pairs. Nodes may have been replaced by later edits,
+# see IncrementalParser._resolve.
+Checkpoint = namedtuple("Checkpoint", ["head", "stack"])
+
+
+class IncrementalParser:
+    def __init__(
+        self,
+        trf,
+        start_symbol,
+        terminals,
+        checkpoint_interval=64,
+        build_tree=True,
+        tree_builder=None,
+        classifier=None,
+        declared_terminals=None,
+    ):
+        if isinstance(trf, TransitionIndex):
+            self.index = trf
+        else:
+            self.index = TransitionIndex(trf)
+        self.start_symbol = start_symbol
+        self.checkpoint_interval = checkpoint_interval
+        self.build_tree = build_tree
+        if build_tree and tree_builder is None:
+            tree_builder = ParseTreeBuilder()
+        self.tree_builder = tree_builder if build_tree else None
+
+        symbols = self.index.symbols
+        self._step = DPDAStep(self.index, terminals)
+        self._bottom_id = self._step.bottom_id
+        self._start_id = symbols.intern(start_symbol)
+        # Classifies plain token strings, as in p2.DPDA.
+        if classifier is None:
+            classifier = TokenClassifier(
+                declared_terminals if declared_terminals else terminals, symbols
+            )
+        self.classifier = classifier
+
+        self.tokens = []
+        self.checkpoints = []
+        self.root_node = None
+        self.accepted = False
+        self.result = None
+        # Number of tokens shifted by the last parse() or edit().
+        self.last_shifted = 0
+        # Nodes replaced when a re-parse converged: old node -> its replacement.
+        self._forward = {}
+
+    def parse(self, tokens):
+        """Parses tokens from scratch. Returns the tree (True without one) or None."""
+        self.tokens = list(tokens)
+        self._forward = {}
+        if self.build_tree:
+            self.root_node = self.tree_builder.new_root(self.start_symbol)
+        stack = [(self._bottom_id, None), (self._start_id, self.root_node)]
+        self.checkpoints = []
+        self._run(0, stack, kept=[], candidates=[], delta=0)
+        return self.result
+
+    def edit(self, start, end, new_tokens):
+        """
+        Replaces tokens[start:end] with new_tokens and re-parses. Returns the
+        new tree (True without one) or None, as parse() does. Before the first
+        parse() this is a full parse of the edited tokens.
+        """
+        if not 0 <= start <= end <= len(self.tokens):
+            raise IndexError(f"edit range [{start}, {end}) outside 0..{len(self.tokens)}")
+        new_tokens = list(new_tokens)
+        if not self.checkpoints:
+            # Nothing parsed yet (edit() before parse()): parse from scratch.
+            return self.parse(self.tokens[:start] + new_tokens + self.tokens[end:])
+        if start == end and not new_tokens:
+            return self.result
+        delta = len(new_tokens) - (end - start)
+        self.tokens[start:end] = new_tokens
+
+        heads = [checkpoint.head for checkpoint in self.checkpoints]
+        # Configurations before reading token i depend only on tokens[:i].
+        resume = bisect_right(heads, start) - 1
+        checkpoint = self.checkpoints[resume]
+        kept = self.checkpoints[: resume + 1]
+        # Old checkpoints past the edit see the same remaining input, so the
+        # new parse can converge with any of them.
+        candidates = self.checkpoints[max(resume + 1, bisect_right(heads, end - 1)) :]
+
+        stack = [(symbol, self._resolve(node)) for symbol, node in checkpoint.stack]
+        self._run(checkpoint.head, stack, kept, candidates, delta)
+        return self.result
+
+    def insert(self, position, new_tokens):
+        return self.edit(position, position, new_tokens)
+
+    def delete(self, start, end):
+        return self.edit(start, end, ())
+
+    def _resolve(self, node):
+        forward = self._forward
+        if node is None or node not in forward:
+            return node
+        target = forward[node]
+        while target in forward:
+            target = forward[target]
+        forward[node] = target
+        return target
+
+    def _converge(self, stack, old_stack, reused):
+        """
+        Splices the old parse in if stack matches old_stack symbol for symbol.
+        reused holds old nodes this re-parse has expanded or shifted; an old
+        checkpoint still waiting on one of them can't be reused.
+        """
+        if len(stack) != len(old_stack):
+            return False
+        pairs = []
+        for (symbol, node), (old_symbol, old_node) in zip(stack, old_stack):
+            if symbol != old_symbol:
+                return False
+            old_node = self._resolve(old_node)
+            if node is not old_node:
+                if old_node in reused:
+                    return False
+                pairs.append((node, old_node))
+
+        for node, old_node in pairs:
+            if self.build_tree:
+                self.tree_builder.adopt(node, old_node)
+                self._forward[old_node] = node
+        return True
+
+    def _run(self, head, stack, kept, candidates, delta):
+        symbol_id = self.index.symbols.id
+        classify = self.classifier.classify
+        step = self._step
+        move = step.move
+        expand = step.expand
+        end_id = step.end_id
+        build_tree = self.build_tree
+        tree_builder = self.tree_builder
+        tokens = self.tokens
+        n_tokens = len(tokens)
+        interval = self.checkpoint_interval
+
+        # Nodes from the resumed snapshot that this run expands or shifts.
+        resumed = {node for _, node in stack if node is not None}
+        reused = set()
+
+        new_checkpoints = []
+        next_checkpoint = head + interval
+        if not kept:
+            new_checkpoints.append(Checkpoint(head, list(stack)))
+        candidate = 0
+        start_head = head
+        boundary = True
+
+        while True:
+            if boundary:
+                boundary = False
+                while candidate < len(candidates) and candidates[candidate].head + delta < head:
+                    candidate += 1
+                if candidate < len(candidates) and candidates[candidate].head + delta == head:
+                    old = candidates[candidate]
+                    if self._converge(stack, old.stack, reused):
+                        self.last_shifted = head - start_head
+                        self.checkpoints = (
+                            kept
+                            + new_checkpoints
+                            + [Checkpoint(c.head + delta, c.stack) for c in candidates[candidate:]]
+                        )
+                        if self.accepted:
+                            self.result = tree_builder.result(self.root_node) if build_tree else True
+                        return
+                if head >= next_checkpoint:
+                    new_checkpoints.append(Checkpoint(head, list(stack)))
+                    next_checkpoint = head + interval
+
+            if head < n_tokens:
+                token = tokens[head]
+                if isinstance(token, Token):
+                    lexeme = token.lexeme
+                    input_id = symbol_id(token.terminal)
+                else:
+                    lexeme = token
+                    input_id = classify(token)
+            else:
+                lexeme = "$"
+                input_id = end_id
+
+            stack_top_id, stack_top_node = stack[-1]
+            action, transition = move(stack_top_id, input_id)
+
+            if action == ACCEPT:
+                self._finish(kept, new_checkpoints, head - start_head, True)
+                return
+
+            if action == SHIFT:
+                stack.pop()
+                if stack_top_node in resumed:
+                    reused.add(stack_top_node)
+                if build_tree:
+                    tree_builder.set_token(stack_top_node, lexeme, head)
+                head += 1
+                boundary = True
+                continue
+
+            if action != EXPAND:
+                self._finish(kept, new_checkpoints, head - start_head, False)
+                return
+
+            expand(stack, transition, tree_builder)
+            if stack_top_node in resumed:
+                reused.add(stack_top_node)
+
+    def _finish(self, kept, new_checkpoints, shifted, accepted):
+        self.checkpoints = kept + new_checkpoints
+        self.last_shifted = shifted
+        self.accepted = accepted
+        if not accepted:
+            self.result = None
+        elif self.build_tree:
+            self.result = self.tree_builder.result(self.root_node)
+        else:
+            self.result = True
@@ -0,0 +1,479 @@
+import mmap
+import re
+from bisect import bisect_right
+from collections import OrderedDict, namedtuple
+from functools import partial
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+# terminal is the grammar terminal the lexeme was classified as (the same string
+# used in the parsing table and DPDA transitions), offset is its position in the text.
+Token = namedtuple("Token", ["terminal", "lexeme", "offset"])
+
+
+class SpanToken(Token):
+    """
+    A Token that points into a bytes-like buffer (usually a memory-mapped file)
+    instead of holding its lexeme: the tuple is (terminal, buffer, offset,
+    length), and lexeme decodes buffer[offset:offset + length] as UTF-8 each
+    time it is read. offset is a byte offset.
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, terminal, buffer, offset, length):
+        return tuple.__new__(cls, (terminal, buffer, offset, length))
+
+    @property
+    def lexeme(self):
+        _, buffer, offset, length = self
+        return str(buffer[offset : offset + length], "utf-8")
+
+    @property
+    def length(self):
+        return self[3]
+
+    @property
+    def span(self):
+        """A zero-copy memoryview of the lexeme's bytes."""
+        _, buffer, offset, length = self
+        return memoryview(buffer)[offset : offset + length]
+
+    def __repr__(self):
+        return f"SpanToken(terminal={self.terminal!r}, offset={self.offset}, length={self.length})"
+
+
+# Terminals that only exist for the FIRST/FOLLOW computations, never in input text.
+SPECIAL_TERMINALS = ("eps", "$")
+
+# Distinct token strings a TokenClassifier remembers.
+DEFAULT_CLASSIFIER_ENTRIES = 16384
+
+
+class LexError(ValueError):
+    def __init__(self, text, pos, base=0):
+        # base is the offset of text[0] in the whole input (for chunked scans).
+        self.offset = base + pos
+        offset = self.offset
+        snippet = text[pos : pos + 10]
+        if not isinstance(snippet, str):
+            snippet = str(snippet, "utf-8", "replace")
+        super().__init__(f"No terminal matches input at offset {offset}: {snippet!r}")
+
+
+class Lexer:
+    """
+    Single-pass lexer built from a grammar's regex terminals.
+
+    The terminals are combined into master patterns with a named group per
+    terminal, one per first character over just the terminals that can start
+    with it, so each token is found with a single regex match. Ties are resolved
+    with the usual lexer rules: the longest lexeme wins, and among equally long
+    lexemes the terminal declared first in the grammar wins.
+    """
+
+    def __init__(self, terminals, skip=r"\s+"):
+        self.terminals = [t for t in terminals if t not in SPECIAL_TERMINALS]
+
+        self._patterns = []
+        alternatives = []
+        for i, terminal in enumerate(self.terminals):
+            pattern = self._compile_terminal(terminal)
+            self._patterns.append(pattern)
+            alternatives.append(f"(?P<T{i}>{pattern.pattern})")
+
+        skip_alternative = f"(?P<SKIP>{skip})" if skip else None
+        # Every terminal in one pattern; codegen.py's generated lexer uses it.
+        self._master = re.compile(
+            "|".join(alternatives + ([skip_alternative] if skip else [])) or r"(?!)"
+        )
+        self._match = _compile_matcher(self._patterns, alternatives, skip_alternative, "|", r"(?!)")
+        self._skip = skip
+        self._match_bytes = None
+
+    @classmethod
+    def from_cfg(cls, cfg_instance, **kwargs):
+        """Builds a lexer from the terminals a p1.CFG loaded, in declaration order."""
+        terminals = cfg_instance.declared_terminals or sorted(cfg_instance.terminals)
+        return cls(terminals, **kwargs)
+
+    @staticmethod
+    def _compile_terminal(terminal):
+        # Grammar files written for split() input use bare symbols such as '+' or
+        # '(' as terminals; those aren't valid regexes, so treat them literally.
+        try:
+            return re.compile(terminal)
+        except re.error:
+            return re.compile(re.escape(terminal))
+
+    def tokenize(self, text):
+        """Returns the list of Tokens for text. Raises LexError on unmatched input."""
+        return list(self.scan(text))
+
+    def scan(self, text, pos=0):
+        """Yields Tokens for text, starting at pos, in a single left-to-right pass."""
+        match = self._match
+        terminals = self.terminals
+        end_of_text = len(text)
+
+        while pos < end_of_text:
+            index, end = match(text, pos)
+            if index is None:
+                raise LexError(text, pos)
+            if index >= 0:
+                yield Token(terminals[index], text[pos:end], pos)
+            pos = end
+
+    def scan_stream(self, f, chunk_size=1 << 16):
+        """
+        Yields Tokens from a text file object, reading it chunk_size characters
+        at a time, so the whole input never has to be in memory.
+
+        Every match is attempted with at least chunk_size characters of input
+        ahead of it (or the rest of the file); a token that runs into the end of
+        the buffer is retried once more input has been read. Input no terminal
+        matches raises LexError straight away, without reading further, so a
+        token only matches if some prefix of it within chunk_size characters
+        already does.
+        """
+        match = self._match
+        terminals = self.terminals
+        buffer = ""
+        base = 0  # stream offset of buffer[0]
+        pos = 0
+        eof = False
+
+        while True:
+            if not eof and len(buffer) - pos < chunk_size:
+                data = f.read(chunk_size)
+                eof = not data
+                buffer = buffer[pos:] + data
+                base += pos
+                pos = 0
+            if pos >= len(buffer):
+                return
+
+            index, end = match(buffer, pos)
+            if index is None:
+                raise LexError(buffer, pos, base)
+            if not eof and end == len(buffer):
+                # Possibly a token cut off by the chunk boundary: read more.
+                data = f.read(chunk_size)
+                eof = not data
+                buffer += data
+                continue
+            if index >= 0:
+                yield Token(terminals[index], buffer[pos:end], base + pos)
+            pos = end
+
+    def scan_buffer(self, buffer, pos=0):
+        """
+        Yields SpanTokens for a bytes-like buffer (bytes, mmap, memoryview),
+        matching the terminal patterns as bytes regexes directly over it, so
+        neither the input nor the lexemes are copied. Patterns see UTF-8 bytes:
+        classes such as \\w and \\d only match ASCII.
+        """
+        match = self._match_bytes
+        if match is None:
+            match = self._match_bytes = self._compile_bytes_matcher()
+        terminals = self.terminals
+        view = memoryview(buffer)
+        end_of_text = len(view)
+
+        while pos < end_of_text:
+            index, end = match(buffer, pos)
+            if index is None:
+                raise LexError(buffer, pos)
+            if index >= 0:
+                yield SpanToken(terminals[index], view, pos, end - pos)
+            pos = end
+
+    def _compile_bytes_matcher(self):
+        patterns = [
+            re.compile(p.pattern.encode("utf-8"), p.flags & ~re.UNICODE) for p in self._patterns
+        ]
+        alternatives = [b"(?P<T%d>%s)" % (i, p.pattern) for i, p in enumerate(patterns)]
+        skip_alternative = None
+        if self._skip:
+            skip_alternative = b"(?P<SKIP>%s)" % self._skip.encode("utf-8")
+        return _compile_matcher(patterns, alternatives, skip_alternative, b"|", rb"(?!)")
+
+
+class TokenClassifier:
+    """
+    Classifies unlexed token strings (e.g. from str.split()) as terminals, for
+    parsers that are given plain strings instead of Tokens.
+
+    A string that is itself a terminal's name is that terminal; otherwise it
+    belongs to the first terminal, in declaration order, whose pattern matches
+    the whole string, as with Lexer. The patterns are compiled once and the
+    results are kept in an LRU of at most max_entries strings, so each
+    distinct identifier or literal is only matched against the regexes once.
+    Ids come from symbols, which must be the SymbolTable the parser's tables
+    use.
+    """
+
+    def __init__(self, terminals, symbols, max_entries=DEFAULT_CLASSIFIER_ENTRIES):
+        # A set has no declaration order, so it is sorted (as Lexer.from_cfg
+        # does for a CFG without declared_terminals); pass a list, e.g. a
+        # CFG's declared_terminals, for the first-declared-wins rule.
+        if isinstance(terminals, (set, frozenset)):
+            terminals = sorted(terminals)
+        self.terminals = [t for t in terminals if t not in SPECIAL_TERMINALS]
+        self.symbols = symbols
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._exact = {t: symbols.intern(t) for t in self.terminals}
+        self._exact["$"] = symbols.intern("$")
+        # Plain literals only fullmatch their own name, which _exact covers.
+        self._patterns = [
+            (Lexer._compile_terminal(t), symbols.intern(t))
+            for t in self.terminals
+            if re.escape(t) != t
+        ]
+        self._cache = OrderedDict()  # token string -> terminal id
+
+    @classmethod
+    def from_cfg(cls, cfg_instance, **kwargs):
+        """Builds a classifier over a p1.CFG's terminals and symbol table."""
+        terminals = cfg_instance.declared_terminals or sorted(cfg_instance.terminals)
+        return cls(terminals, cfg_instance.symbols, **kwargs)
+
+    def classify(self, lexeme):
+        """Returns the id of lexeme's terminal, or -1 if no terminal matches it."""
+        terminal_id = self._exact.get(lexeme)
+        if terminal_id is not None:
+            return terminal_id
+
+        cache = self._cache
+        terminal_id = cache.get(lexeme)
+        if terminal_id is not None:
+            cache.move_to_end(lexeme)
+            self.hits += 1
+            return terminal_id
+
+        self.misses += 1
+        terminal_id = -1
+        for pattern, pattern_id in self._patterns:
+            if pattern.fullmatch(lexeme):
+                terminal_id = pattern_id
+                break
+        cache[lexeme] = terminal_id
+        if len(cache) > self.max_entries:
+            cache.popitem(last=False)
+            self.evictions += 1
+        return terminal_id
+
+    def matched_by_pattern(self, lexeme):
+        """True if lexeme's terminal was found by a regex rather than by name."""
+        return lexeme not in self._exact and self.classify(lexeme) >= 0
+
+    def clear(self):
+        self._cache.clear()
+
+    def counters(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._cache),
+            "max_entries": self.max_entries,
+        }
+
+    def __getstate__(self):
+        # Copies (e.g. sent to worker processes) start with an empty cache.
+        state = self.__dict__.copy()
+        state["_cache"] = OrderedDict()
+        return state
+
+
+class MappedFile:
+    """
+    Read-only memory map of a file, for Lexer.scan_buffer():
+
+        with MappedFile("input.txt") as buffer:
+            tree = compiled.parse_tokens(lexer.scan_buffer(buffer))
+
+    SpanTokens reference the mapping, so their lexemes can only be read while
+    it is open; the map is unmapped on close() once no tokens still use it.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            # mmap can't map an empty file.
+            if f.seek(0, 2) == 0:
+                self.buffer = b""
+            else:
+                self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        if isinstance(self.buffer, mmap.mmap):
+            try:
+                self.buffer.close()
+            except BufferError:
+                # Tokens still hold views of the map; it is unmapped when they go.
+                pass
+        self.buffer = b""
+
+    def __enter__(self):
+        return self.buffer
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _compile_matcher(patterns, alternatives, skip, separator, never):
+    """
+    Returns the match function for Lexer.scan() and friends. alternatives[i]
+    is patterns[i] as the named group T<i>, skip is the SKIP group or None;
+    separator and never are "|" and r"(?!)" as str or bytes, to match.
+
+    Rather than one master pattern over every terminal, each first character
+    gets a master pattern over only the terminals that can start with it
+    (see _later_candidates), so neither the alternation nor the search for
+    a longer match tries terminals that can't match there.
+    """
+    candidates, unknown = _later_candidates(patterns)
+    masters = {}  # candidate indexes -> master pattern
+
+    def master_for(indexes):
+        master = masters.get(indexes)
+        if master is None:
+            parts = [alternatives[i] for i in indexes]
+            if skip is not None:
+                parts.append(skip)
+            master = masters[indexes] = re.compile(separator.join(parts) or never)
+        return master
+
+    dispatch = {char: (master_for(indexes), indexes) for char, indexes in candidates.items()}
+    return partial(_longest_match, dispatch, (master_for(unknown), unknown), patterns)
+
+
+def _longest_match(dispatch, default, patterns, text, pos):
+    """
+    Returns (terminal_index, end) for the token at pos, (-1, end) for skipped
+    whitespace and (None, pos) if nothing matches. dispatch maps text[pos] to
+    (master pattern, candidate indexes), with default for other characters.
+    """
+    master, later = dispatch.get(text[pos], default)
+    m = master.match(text, pos)
+    if m is None or m.end() == pos:
+        return None, pos
+
+    group = m.lastgroup
+    end = m.end()
+    if group == "SKIP":
+        return -1, end
+
+    # Alternation stops at the first terminal that matches; a terminal
+    # declared later may still match a longer lexeme here.
+    index = int(group[1:])
+    for other in later[bisect_right(later, index) :]:
+        candidate = patterns[other].match(text, pos)
+        if candidate is not None and candidate.end() > end:
+            index, end = other, candidate.end()
+    return index, end
+
+
+# A pattern whose first character could be any of more than this many is
+# treated as undetermined.
+_MAX_FIRST_CHARS = 1024
+
+
+def _later_candidates(patterns):
+    """
+    Returns (candidates, unknown): candidates maps a first character (an int
+    for bytes patterns) to the sorted indexes of the patterns a non-empty
+    match can start with it, and unknown is the sorted indexes of the
+    patterns whose first character couldn't be determined. Both include
+    unknown, so candidates.get(c, unknown) is every pattern worth trying at c.
+    """
+    first_chars = {}
+    unknown = []
+    for index, pattern in enumerate(patterns):
+        chars = _first_chars(pattern)
+        if chars is None:
+            unknown.append(index)
+            continue
+        for char in chars:
+            first_chars.setdefault(char, []).append(index)
+    candidates = {char: tuple(sorted(indexes + unknown)) for char, indexes in first_chars.items()}
+    return candidates, tuple(unknown)
+
+
+def _first_chars(pattern):
+    """The characters a non-empty match of pattern can start with, or None."""
+    if pattern.flags & re.IGNORECASE:
+        return None
+    try:
+        chars, _ = _sequence_first(sre_parse.parse(pattern.pattern, pattern.flags))
+    except Exception:  # a construct this analysis doesn't know
+        return None
+    if chars is None or len(chars) > _MAX_FIRST_CHARS:
+        return None
+    if isinstance(pattern.pattern, str):
+        return {chr(char) for char in chars}
+    return chars
+
+
+def _sequence_first(items):
+    """(first character codes or None, nullable) of a sequence of parsed items."""
+    chars = set()
+    for op, av in items:
+        item_chars, nullable = _item_first(op, av)
+        if item_chars is None:
+            return None, False
+        chars |= item_chars
+        if not nullable:
+            return chars, False
+    return chars, True
+
+
+def _item_first(op, av):
+    if op is sre_parse.LITERAL:
+        return {av}, False
+    if op is sre_parse.IN:
+        return _class_first(av), False
+    if op is sre_parse.SUBPATTERN:
+        add_flags = av[1]
+        if add_flags & re.IGNORECASE:
+            return None, False
+        return _sequence_first(av[-1])
+    if op is sre_parse.BRANCH:
+        chars = set()
+        nullable = False
+        for branch in av[1]:
+            branch_chars, branch_nullable = _sequence_first(branch)
+            if branch_chars is None:
+                return None, False
+            chars |= branch_chars
+            nullable = nullable or branch_nullable
+        return chars, nullable
+    if op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) or op is getattr(
+        sre_parse, "POSSESSIVE_REPEAT", None
+    ):
+        low, _, item = av
+        chars, nullable = _sequence_first(item)
+        return chars, nullable or low == 0
+    if op in (sre_parse.AT, sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+        # Zero-width: the match starts with whatever follows.
+        return set(), True
+    return None, False
+
+
+def _class_first(items):
+    chars = set()
+    for op, av in items:
+        if op is sre_parse.LITERAL:
+            chars.add(av)
+        elif op is sre_parse.RANGE and av[1] - av[0] < _MAX_FIRST_CHARS:
+            chars.update(range(av[0], av[1] + 1))
+        else:  # NEGATE, CATEGORY (\d, \w, ...) or a very wide range
+            return None
+    return chars
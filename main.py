@@ -1,17 +1,24 @@
-from p1 import CFG
-from p2 import DPDA  # Only DPDA class is needed, as trf is passed directly
+from p2 import DPDA
 from parsing_table import compute_first, compute_follow, build_ll1_parsing_table
-from ll1_to_dpda import convert_ll1_to_dpda
 from parse_tree import ParseTreeNode
+from lexer import LexError, MappedFile
+from grammar_cache import DEFAULT_CACHE_DIR, load_compiled_grammar
+from stats import Stats, phase
+from tracing import Tracer
 
 
 import sys
 import os
+from functools import partial
 
 GRAMMAR_FILE = "grammar.txt"
-DPDA_TRANSITIONS_FILE = (
-    "dpda_transitions.txt"  # Optional: if you want to save/load transitions
-)
+# Compiled grammar artifacts are cached here, keyed by a hash of GRAMMAR_FILE.
+GRAMMAR_CACHE_DIR = DEFAULT_CACHE_DIR
+# 'off', 'summary' or 'full'; 'full' prints every DPDA step.
+TRACE_LEVEL = os.environ.get("TLA_TRACE", "full")
+# If set, phase timings and parser counters are collected and written as JSON
+# to this file on exit ('-' for stderr).
+STATS_FILE = os.environ.get("TLA_STATS")
 
 
 def main():
@@ -30,7 +37,15 @@ def main():
     else:
         print(f"'{GRAMMAR_FILE}' already exists. Using existing file.")
 
-    cfg = CFG(GRAMMAR_FILE)
+    tracer = Tracer(TRACE_LEVEL)
+    stats = Stats() if STATS_FILE else None
+    # Reuses the cached FIRST/FOLLOW sets, LL(1) table and DPDA transitions
+    # unless the grammar file changed since they were computed.
+    with phase(stats, "grammar"):
+        compiled = load_compiled_grammar(
+            GRAMMAR_FILE, cache_dir=GRAMMAR_CACHE_DIR, tracer=tracer, stats=stats
+        )
+    cfg = compiled.cfg
     print("\n--- Loaded Grammar ---")
     print(f"Start symbol: {cfg.start_symbol}")
     print(f"Non-terminals: {cfg.non_terminals}")
@@ -41,18 +56,16 @@ def main():
             print(f"  {nt} -> {' '.join(prod)}")
 
     print("\n--- Computing FIRST and FOLLOW sets ---")
-    cfg.compute_first_sets()
     print("\nFIRST Sets:")
     for symbol, first_set in cfg.first_sets.items():
         print(f"  FIRST({symbol}): {sorted(list(first_set))}")
 
-    cfg.compute_follow_sets()
     print("\nFOLLOW Sets:")
     for symbol, follow_set in cfg.follow_sets.items():
         print(f"  FOLLOW({symbol}): {sorted(list(follow_set))}")
 
     print("\n--- Building LL(1) Parsing Table ---")
-    parsing_table = cfg.build_ll1_table()
+    parsing_table = compiled.parsing_table
 
     terminals_sorted = sorted(list(cfg.terminals - {"eps"})) + ["$"]
     non_terminals_sorted = sorted(list(cfg.non_terminals))
@@ -76,7 +89,7 @@ def main():
         print(row_str)
 
     print("\n--- Converting LL(1) Table to DPDA Transitions ---")
-    dpda_transitions = convert_ll1_to_dpda(cfg, parsing_table)
+    dpda_transitions = compiled.trf
 
     print("Generated DPDA Transitions (for non-terminal expansions):")
     for (state, input_sym, stack_sym), (
@@ -85,29 +98,77 @@ def main():
     ) in dpda_transitions.items():
         print(f"  ({state}, {input_sym}, {stack_sym}) -> ({next_state}, {push_str})")
 
+    if compiled.earley is not None:
+        print("\nThe grammar is not LL(1); inputs are parsed with the Earley parser.")
+        for (nt, t), bodies in compiled.ll1_conflicts.items():
+            alternatives = " | ".join(" ".join(body) for body in bodies)
+            print(f"  Conflict at ({nt}, {t}): {nt} -> {alternatives}")
+
+    # The transition index and lexer are built once; every parse below reuses them.
+    transition_index = compiled.index
+    lexer = compiled.lexer
+
     while True:
         user_input = input(
             "\nEnter input string, or file to read input.txt or 'q' to quit: "
         )
+        input_file = None
         if user_input.lower() == "file":
             file_path = "./input.txt"
             if os.path.exists(file_path):
-                with open(file_path, "r", encoding="utf-8") as f:
-                    user_input = f.read().strip()
+                input_file = MappedFile(file_path)
         if user_input.lower() == "q":
             break
 
-        input_tokens = user_input.split()
+        # Tokens are produced lazily; input.txt is memory-mapped and lexed in
+        # place, its tokens are spans of the map and lexemes are only decoded
+        # for tree nodes.
+        if input_file is not None:
+            input_tokens = lexer.scan_buffer(input_file.buffer)
+        else:
+            input_tokens = lexer.scan(user_input)
 
-        dpda = DPDA(dpda_transitions, input_tokens, cfg.start_symbol, cfg.terminals)
-        parse_tree_root = dpda.run()
+        if compiled.earley is not None:
+            run = partial(compiled.earley.parse, input_tokens, tracer=tracer, stats=stats)
+        else:
+            run = DPDA(
+                transition_index,
+                input_tokens,
+                cfg.start_symbol,
+                cfg.terminals,
+                tracer=tracer,
+                stats=stats,
+                classifier=compiled.classifier,
+            ).run
+        try:
+            # Lexing is lazy, so this includes the time spent lexing.
+            with phase(stats, "lex_and_parse"):
+                parse_tree_root = run()
+        except LexError as e:
+            print(f"Rejected: {e}")
+            continue
+        finally:
+            if input_file is not None:
+                input_file.close()
 
         if parse_tree_root:
             print("\n--- Generated Parse Tree ---")
-            parse_tree_root.display()
+            with phase(stats, "tree_display"):
+                parse_tree_root.display()
         else:
             print("Parsing failed. No parse tree generated.")
 
+    if stats is not None:
+        write_stats(stats, STATS_FILE)
+
+
+def write_stats(stats, path):
+    if path == "-":
+        stats.dump(sys.stderr)
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        stats.dump(f)
+
 
 if __name__ == "__main__":
     main()
@@ -1,14 +1,43 @@
 # cfg_parser.py
 
+from grammar_analysis import bits_to_sets, compute_first_bits, compute_follow_bits
+from symbols import SymbolTable
+from tracing import Tracer
+
+
 class CFG:
-    def __init__(self, grammar_file):
+    # Everything _load_grammar and the FIRST/FOLLOW computations produce; enough
+    # to rebuild an analysed CFG without re-reading the file (see grammar_cache.py).
+    STATE_ATTRIBUTES = (
+        'start_symbol',
+        'non_terminals',
+        'terminals',
+        'declared_terminals',
+        'productions',
+        'first_sets',
+        'follow_sets',
+        'symbols',
+        'first_bits',
+        'follow_bits',
+    )
+
+    def __init__(self, grammar_file, tracer=None, stats=None):
         self.grammar_file = grammar_file
+        self.tracer = tracer if tracer is not None else Tracer()
+        self.stats = stats # optional stats.Stats; None records nothing
         self.start_symbol = None
         self.non_terminals = set()
         self.terminals = set()
+        self.declared_terminals = [] # TERMINALS in file order; the lexer uses it as match priority
         self.productions = {} # {NonTerminal: [[RHS_symbols_1], [RHS_symbols_2]]}
         self.first_sets = {}
         self.follow_sets = {}
+        # Every symbol interned to a small int; FIRST/FOLLOW are kept as int
+        # bitsets over these ids ({symbol_id: bits}), first_sets/follow_sets are
+        # the same sets spelled out as names.
+        self.symbols = SymbolTable()
+        self.first_bits = {}
+        self.follow_bits = {}
         self._load_grammar()
 
     def _load_grammar(self):
@@ -23,6 +52,7 @@ class CFG:
         B -> b B | eps
         C -> c
         """
+        declared_non_terminals = []
         with open(self.grammar_file, 'r', encoding='utf-8') as f:
             for line in f:
                 line = line.strip()
@@ -32,9 +62,12 @@ class CFG:
                 if line.startswith("START="):
                     self.start_symbol = line.split('=')[1].strip()
                 elif line.startswith("NON_TERMINALS="):
-                    self.non_terminals.update(line.split('=')[1].split(','))
+                    declared_non_terminals.extend(line.split('=')[1].split(','))
+                    self.non_terminals.update(declared_non_terminals)
                 elif line.startswith("TERMINALS="):
-                    self.terminals.update(line.split('=')[1].split(','))
+                    declared = line.split('=')[1].split(',')
+                    self.terminals.update(declared)
+                    self.declared_terminals.extend(t for t in declared if t not in self.declared_terminals)
                     # Ensure 'eps' (epsilon) is treated as a special terminal in FIRST sets
                     # but not generally in input terminals, and '$' is also a special terminal.
                     if 'eps' not in self.terminals: # Make sure 'eps' is explicitly in terminals for FIRST calculations
@@ -58,110 +91,70 @@ class CFG:
         if self.start_symbol and self.start_symbol not in self.non_terminals:
             raise ValueError(f"Start symbol '{self.start_symbol}' not declared as a non-terminal.")
 
+        # Intern in file order so symbol ids don't depend on set iteration order.
+        for symbol in self.declared_terminals + ['$', 'eps'] + declared_non_terminals:
+            self.symbols.intern(symbol)
+        for bodies in self.productions.values():
+            for body in bodies:
+                for symbol in body:
+                    self.symbols.intern(symbol)
+
+    def get_state(self):
+        return {name: getattr(self, name) for name in self.STATE_ATTRIBUTES}
+
+    @classmethod
+    def from_state(cls, grammar_file, state, tracer=None, stats=None):
+        """Rebuilds a CFG from get_state() output instead of parsing grammar_file."""
+        cfg = cls.__new__(cls)
+        cfg.grammar_file = grammar_file
+        cfg.tracer = tracer if tracer is not None else Tracer()
+        cfg.stats = stats
+        for name in cls.STATE_ATTRIBUTES:
+            setattr(cfg, name, state[name])
+        return cfg
+
     def compute_first_sets(self):
         """
         Computes the FIRST set for all non-terminals and terminals.
         """
-        # Initialize FIRST sets: terminals have themselves
-        self.first_sets = {t: {t} for t in self.terminals}
-        # Non-terminals start with empty sets
-        for nt in self.non_terminals:
-            self.first_sets[nt] = set()
-
-        changed = True
-        while changed:
-            changed = False
-            for head in self.non_terminals:
-                for body in self.productions[head]:
-                    # Rule 1: If X -> aα, then add 'a' to FIRST(X)
-                    # Rule 2: If X -> ε, then add 'ε' to FIRST(X)
-                    # Rule 3: If X -> Y1 Y2 ... Yk
-                    #         Add FIRST(Y1) \ {ε} to FIRST(X)
-                    #         If ε is in FIRST(Y1), add FIRST(Y2) \ {ε} to FIRST(X)
-                    #         ...
-                    #         If ε is in all FIRST(Yi) for i=1 to k, then add ε to FIRST(X)
-                    
-                    all_symbols_derive_epsilon = True
-                    for symbol in body:
-                        # Ensure symbol has an entry in first_sets
-                        if symbol not in self.first_sets:
-                            # If it's a terminal not yet in first_sets (e.g., if grammar has error)
-                            # or if it's a non-terminal not yet initialized, handle gracefully.
-                            # For well-formed grammars, this case shouldn't happen.
-                            self.first_sets[symbol] = {symbol} if symbol in self.terminals else set()
-
-                        # Add FIRST(symbol) (excluding epsilon) to FIRST(head)
-                        old_size = len(self.first_sets[head])
-                        self.first_sets[head].update(self.first_sets[symbol] - {'eps'})
-                        if len(self.first_sets[head]) != old_size:
-                            changed = True
-
-                        # If current symbol doesn't derive epsilon, stop looking at next symbols
-                        if 'eps' not in self.first_sets[symbol]:
-                            all_symbols_derive_epsilon = False
-                            break
-                    
-                    # If all symbols in the body derive epsilon, then head can also derive epsilon
-                    if all_symbols_derive_epsilon and 'eps' not in self.first_sets[head]:
-                        self.first_sets[head].add('eps')
-                        changed = True
+        # Rule 1: If X -> aα, then add 'a' to FIRST(X)
+        # Rule 2: If X -> ε, then add 'ε' to FIRST(X)
+        # Rule 3: If X -> Y1 Y2 ... Yk, add FIRST(Yi) \ {ε} for each Yi whose
+        #         prefix Y1..Yi-1 derives ε, and ε if all of them derive ε.
+        # See grammar_analysis.py for how the fixpoint is solved.
+        self.first_bits = compute_first_bits(
+            self.productions,
+            self.terminals,
+            self.non_terminals,
+            self.symbols,
+            epsilon='eps',
+            stats=self.stats,
+        )
+        self.first_sets = bits_to_sets(self.symbols, self.first_bits)
 
     def compute_follow_sets(self):
         """
         Computes the FOLLOW set for all non-terminals.
         Requires FIRST sets to be computed first.
         """
-        if not self.first_sets:
+        if not self.first_bits:
             self.compute_first_sets() # Ensure FIRST sets are available
 
-        # Initialize FOLLOW sets: empty for all non-terminals
-        self.follow_sets = {nt: set() for nt in self.non_terminals}
         # Rule 1: Place $ in FOLLOW(Start_Symbol)
-        self.follow_sets[self.start_symbol].add('$')
-
-        changed = True
-        while changed:
-            changed = False
-            for head, bodies in self.productions.items():
-                for body in bodies:
-                    for i, symbol_B in enumerate(body):
-                        if symbol_B in self.non_terminals: # Only compute FOLLOW for non-terminals
-                            # Rule 2: If A -> αBβ, then everything in FIRST(β) (except ε) is in FOLLOW(B)
-                            # Rule 3: If A -> αB or A -> αBβ and ε is in FIRST(β),
-                            #         then everything in FOLLOW(A) is in FOLLOW(B)
-                            
-                            # Case for β (symbols after B)
-                            beta_part = body[i+1:]
-                            if beta_part:
-                                first_of_beta = set()
-                                all_beta_derive_epsilon = True
-                                for beta_symbol in beta_part:
-                                    if beta_symbol not in self.first_sets: # Handle undefined symbols in productions gracefully
-                                        # This means grammar is ill-defined, but try to continue
-                                        all_beta_derive_epsilon = False
-                                        break
-                                    
-                                    first_of_beta.update(self.first_sets[beta_symbol] - {'eps'})
-                                    if 'eps' not in self.first_sets[beta_symbol]:
-                                        all_beta_derive_epsilon = False
-                                        break
-                                
-                                old_size = len(self.follow_sets[symbol_B])
-                                self.follow_sets[symbol_B].update(first_of_beta)
-                                if len(self.follow_sets[symbol_B]) != old_size:
-                                    changed = True
-
-                                # If beta can derive epsilon, then FOLLOW(head) also goes to FOLLOW(symbol_B)
-                                if all_beta_derive_epsilon:
-                                    old_size = len(self.follow_sets[symbol_B])
-                                    self.follow_sets[symbol_B].update(self.follow_sets[head])
-                                    if len(self.follow_sets[symbol_B]) != old_size:
-                                        changed = True
-                            else: # Rule 3: A -> αB (B is at the end of production)
-                                old_size = len(self.follow_sets[symbol_B])
-                                self.follow_sets[symbol_B].update(self.follow_sets[head])
-                                if len(self.follow_sets[symbol_B]) != old_size:
-                                    changed = True
+        # Rule 2: If A -> αBβ, then everything in FIRST(β) (except ε) is in FOLLOW(B)
+        # Rule 3: If A -> αB or A -> αBβ and ε is in FIRST(β),
+        #         then everything in FOLLOW(A) is in FOLLOW(B)
+        self.follow_bits = compute_follow_bits(
+            self.productions,
+            self.start_symbol,
+            self.non_terminals,
+            self.first_bits,
+            self.symbols,
+            epsilon='eps',
+            end_marker='$',
+            stats=self.stats,
+        )
+        self.follow_sets = bits_to_sets(self.symbols, self.follow_bits)
 
     def build_ll1_table(self):
         """
@@ -194,9 +187,11 @@ class CFG:
                 # Rule 1: For each terminal 'a' in FIRST(body), add M[head, a] = body
                 for terminal in first_of_body:
                     if (head, terminal) in parsing_table and parsing_table[(head, terminal)] != body:
-                        print(f"LL(1) conflict detected for M[{head}, {terminal}]: "
-                              f"Existing: {parsing_table[(head, terminal)]}, New: {body}")
+                        self.tracer.summary(f"LL(1) conflict detected for M[{head}, {terminal}]: "
+                                            f"Existing: {parsing_table[(head, terminal)]}, New: {body}")
                         ll1_conflict_detected = True
+                        if self.stats is not None:
+                            self.stats.count("ll1_table.conflicts")
                     parsing_table[(head, terminal)] = body
                 
                 # Rule 2: If epsilon is in FIRST(body), for each terminal 'b' in FOLLOW(head), add M[head, b] = body
@@ -225,18 +220,53 @@ class CFG:
                     if can_derive_epsilon:
                         for terminal in self.follow_sets.get(head, set()):
                             if (head, terminal) in parsing_table and parsing_table[(head, terminal)] != body:
-                                print(f"LL(1) conflict detected for M[{head}, {terminal}]: "
-                                      f"Existing: {parsing_table[(head, terminal)]}, New: {body}")
+                                self.tracer.summary(f"LL(1) conflict detected for M[{head}, {terminal}]: "
+                                                    f"Existing: {parsing_table[(head, terminal)]}, New: {body}")
                                 ll1_conflict_detected = True
+                                if self.stats is not None:
+                                    self.stats.count("ll1_table.conflicts")
                             parsing_table[(head, terminal)] = body
 
+        if self.stats is not None:
+            self.stats.count("ll1_table.entries", len(parsing_table))
         if ll1_conflict_detected:
-            print("\nGrammar is NOT LL(1) due to conflicts.")
+            self.tracer.summary("\nGrammar is NOT LL(1) due to conflicts.")
         else:
-            print("\nGrammar is LL(1).")
+            self.tracer.summary("\nGrammar is LL(1).")
 
         return parsing_table
 
+    def ll1_conflicts(self):
+        """
+        Returns the cells build_ll1_table would overwrite, as
+        {(NonTerminal, Terminal): [ProductionRHS_list, ...]} listing every
+        distinct body predicted for the cell in grammar order. Empty iff the
+        grammar is LL(1). Nothing is printed or counted.
+        """
+        if not self.first_sets or not self.follow_sets:
+            self.compute_first_sets()
+            self.compute_follow_sets()
+
+        predicted = {}
+        for head in self.non_terminals:
+            for body in self.productions[head]:
+                # Same prediction set as build_ll1_table: FIRST(body) without
+                # 'eps', plus FOLLOW(head) when the whole body derives epsilon.
+                terminals = set()
+                for symbol in body:
+                    first = self.first_sets.get(symbol, set())
+                    terminals.update(first - {'eps'})
+                    if 'eps' not in first:
+                        break
+                else:
+                    terminals.update(self.follow_sets.get(head, set()))
+                for terminal in terminals:
+                    bodies = predicted.setdefault((head, terminal), [])
+                    if body not in bodies:
+                        bodies.append(body)
+
+        return {cell: bodies for cell, bodies in predicted.items() if len(bodies) > 1}
+
 
 # This function was previously in ll1_to_dpda.py or directly in main.py,
 # but main.py's import expects it from cfg_parser.py
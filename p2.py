@@ -1,100 +1,419 @@
-from parse_tree import ParseTreeNode
+from parse_tree import ParseTreeBuilder
+from lexer import Token, TokenClassifier
+from tracing import Tracer
+from symbols import SymbolTable
+from parsing_table import CombTable, EMPTY
+import transition_format
+from array import array
+from collections import deque
+from functools import partial
+from itertools import islice
 import re
 
 
+class TransitionIndex:
+    """
+    Compiled lookup structure for a DPDA transition function.
+
+    The flat ``trf`` dict {(state, input_symbol, stack_top): (next_state, push_string)}
+    is compiled once over interned symbol ids (self.symbols). Each (state, stack_top)
+    pair owns a row of an integer table indexed by input symbol id, whose cells
+    point into self.transitions; each row also keeps precompiled regex fallbacks in
+    the order the transitions appear in ``trf`` (that order is the match priority).
+    The table is almost entirely empty, so it is stored as a parsing_table.CombTable.
+    """
+
+    def __init__(self, trf, symbols=None):
+        self.trf = trf
+        self.symbols = symbols if symbols is not None else SymbolTable()
+        intern = self.symbols.intern
+        # The DPDA's stack bottom and end-of-input marker.
+        intern("Z")
+        intern("$")
+
+        self.transitions = []  # (next_state, push_ids, push_names)
+        self._rows = {}  # (state, stack_top_id) -> row
+        self._patterns = []  # row -> [(compiled input_symbol, transition)]
+        self._state_rows = {}  # state -> array of row per stack_top_id
+        cells = []  # row -> {input_id: transition}
+
+        for (state, input_symbol, stack_top), (next_state, push_string) in trf.items():
+            row_key = (state, intern(stack_top))
+            row = self._rows.get(row_key)
+            if row is None:
+                row = self._rows[row_key] = len(self._patterns)
+                self._patterns.append([])
+                cells.append({})
+
+            push_names = () if push_string == "eps" else tuple(push_string.split())
+            transition = len(self.transitions)
+            self.transitions.append(
+                (next_state, tuple(intern(symbol) for symbol in push_names), push_names)
+            )
+            cells[row].setdefault(intern(input_symbol), transition)
+
+            # Plain literals can only fullmatch themselves, so the exact table
+            # already covers them and they don't need a regex fallback.
+            if re.escape(input_symbol) == input_symbol:
+                continue
+            try:
+                self._patterns[row].append((re.compile(input_symbol), transition))
+            except re.error:
+                continue
+
+        self.table = CombTable.from_rows(cells, len(self.symbols))
+
+    def rows_for(self, state):
+        """Returns an array mapping stack-top ids to table rows (EMPTY if none) for state."""
+        rows = self._state_rows.get(state)
+        if rows is None or len(rows) < len(self.symbols):
+            rows = array("i", [EMPTY]) * len(self.symbols)
+            for (row_state, stack_top_id), row in self._rows.items():
+                if row_state == state:
+                    rows[stack_top_id] = row
+            self._state_rows[state] = rows
+        return rows
+
+    def lookup_id(self, rows, stack_top_id, input_id, lexeme=None):
+        """
+        Returns (transition, used_regex) where transition indexes self.transitions
+        or is EMPTY. rows comes from rows_for(state). If no transition is keyed by
+        input_id itself, an unclassified lexeme is tried against the row's regexes.
+        """
+        row = rows[stack_top_id] if stack_top_id < len(rows) else EMPTY
+        if row == EMPTY:
+            return EMPTY, False
+
+        transition = self.table.get(row, input_id)
+        if transition != EMPTY or lexeme is None:
+            return transition, False
+
+        for pattern, transition in self._patterns[row]:
+            if pattern.fullmatch(lexeme):
+                return transition, True
+        return EMPTY, False
+
+    def lookup(self, state, input_symbol, stack_top):
+        """
+        Returns (next_state, push_symbols, used_regex) for the given configuration,
+        or (None, None, False) if no transition applies.
+        """
+        symbols = self.symbols
+        transition, used_regex = self.lookup_id(
+            self.rows_for(state),
+            symbols.id(stack_top, len(symbols)),
+            symbols.id(input_symbol),
+            input_symbol,
+        )
+        if transition == EMPTY:
+            return None, None, False
+        next_state, _, push_names = self.transitions[transition]
+        return next_state, push_names, used_regex
+
+
+# Moves of the LL(1) DPDA, as decided by DPDAStep.move().
+ACCEPT = 0
+SHIFT = 1
+EXPAND = 2
+REJECT = 3
+
+
+class DPDAStep:
+    """
+    The move rule of the LL(1) DPDA over a TransitionIndex, shared by all of
+    its drivers (DPDA.run, incremental.IncrementalParser and parallel._run).
+    Each driver keeps its own loop for its own bookkeeping (lookahead,
+    checkpoints, split points), asks move() what the next step is and lets
+    expand() rewrite the stack for an EXPAND.
+    """
+
+    def __init__(self, index, terminals, state="q0"):
+        symbols = index.symbols
+        self.index = index
+        self.bottom_id = symbols.intern("Z")
+        self.end_id = symbols.intern("$")
+        self.terminal_ids = frozenset(symbols.intern(t) for t in terminals)
+        self.rows = index.rows_for(state)
+        # Stack entries each transition pushes when no tree is built.
+        self._bare_pushes = [
+            tuple((pushed_id, None) for pushed_id in reversed(push_ids))
+            for _, push_ids, _ in index.transitions
+        ]
+        # move() runs once per parser step, so it is a partial over a plain
+        # function rather than a method reading attributes each time.
+        self.move = partial(
+            _move,
+            self.bottom_id,
+            self.end_id,
+            self.terminal_ids,
+            self.rows,
+            index.table.get,
+        )
+
+    def expand(self, stack, transition, tree_builder=None):
+        """
+        Replaces the top of stack with transition's push string, whose
+        symbols become children of the popped node when tree_builder is given.
+        Returns the popped (symbol_id, node).
+        """
+        top = stack.pop()
+        if tree_builder is not None:
+            _, push_ids, push_names = self.index.transitions[transition]
+            children = tree_builder.expand(top[1], push_names)
+            stack.extend(zip(reversed(push_ids), reversed(children)))
+        else:
+            stack.extend(self._bare_pushes[transition])
+        return top
+
+
+_ACCEPT_MOVE = (ACCEPT, EMPTY)
+_SHIFT_MOVE = (SHIFT, EMPTY)
+_REJECT_MOVE = (REJECT, EMPTY)
+
+
+def _move(bottom_id, end_id, terminal_ids, rows, table_get, stack_top_id, input_id):
+    """
+    DPDAStep.move(stack_top_id, input_id): returns (move, transition) for the
+    top of stack against the lookahead input_id. ACCEPT at the stack bottom
+    and end of input, SHIFT when the top is the lookahead's terminal, EXPAND
+    with the transition to apply, or REJECT. transition is EMPTY unless move
+    is EXPAND.
+    """
+    if stack_top_id == input_id:
+        if stack_top_id in terminal_ids:
+            return _SHIFT_MOVE
+    elif stack_top_id == bottom_id and input_id == end_id:
+        return _ACCEPT_MOVE
+    row = rows[stack_top_id] if stack_top_id < len(rows) else EMPTY
+    if row == EMPTY:
+        return _REJECT_MOVE
+    transition = table_get(row, input_id)
+    if transition == EMPTY:
+        return _REJECT_MOVE
+    return EXPAND, transition
+
+
 class DPDA:
-    def __init__(self, trf, input_tokens, start_symbol, terminals):
+    # Full-level trace lines show at most this many input tokens / stack symbols,
+    # so a step costs the same regardless of how long the input is.
+    TRACE_WINDOW = 20
+
+    def __init__(
+        self,
+        trf,
+        input_tokens,
+        start_symbol,
+        terminals,
+        tracer=None,
+        build_tree=True,
+        tree_builder=None,
+        stats=None,
+        classifier=None,
+        declared_terminals=None,
+    ):
+        """
+        input_tokens can be any iterable of token strings or lexer.Tokens,
+        including a generator; it is consumed lazily with one token of
+        lookahead and ends at the first '$' (added if the stream has none).
+        With build_tree=False no parse tree is kept, so memory is bounded by
+        the parse stack depth rather than the input size. tree_builder selects
+        the tree representation (parse_tree.ParseTreeBuilder by default, or a
+        compact_tree.CompactTree). stats is an optional stats.Stats that
+        run() adds its shift/expansion counts and per-transition hits to.
+        Plain token strings are classified as terminals by classifier, a
+        lexer.TokenClassifier over the index's symbols; pass the grammar's
+        own so its cache is shared across runs. Otherwise one is built from
+        declared_terminals (the terminals in declaration order, which decides
+        between overlapping patterns as in lexer.Lexer), or from terminals
+        sorted by name if that isn't given.
+        """
         self.head = 0
-        self.trf = trf
+        # Accept either the raw trf dict or an index built once per grammar.
+        if isinstance(trf, TransitionIndex):
+            self.index = trf
+        else:
+            self.index = TransitionIndex(trf)
+        self.trf = self.index.trf
         self.state = "q0"
 
-        self.input = list(input_tokens)
-        if not self.input or self.input[-1] != "$":
-            self.input.append("$")
+        self._tokens = iter(input_tokens)
+        self._lookahead = deque()
+        self._exhausted = False
+
+        self.build_tree = build_tree
+        if build_tree:
+            if tree_builder is None:
+                tree_builder = ParseTreeBuilder()
+            self.tree_builder = tree_builder
+            self.root_node = self.tree_builder.new_root(start_symbol)
+        else:
+            self.tree_builder = None
+            self.root_node = None
 
-        self.root_node = ParseTreeNode(start_symbol)
-        self.stack = [("Z", None), (start_symbol, self.root_node)]
+        # The stack holds (symbol_id, node) pairs over the index's interned symbols.
+        symbols = self.index.symbols
+        self._step = DPDAStep(self.index, terminals, self.state)
+        self._bottom_id = self._step.bottom_id
+        if classifier is None:
+            classifier = TokenClassifier(
+                declared_terminals if declared_terminals else terminals, symbols
+            )
+        self.classifier = classifier
+        self.stack = [(self._bottom_id, None), (symbols.intern(start_symbol), self.root_node)]
         self._terminals = terminals
+        self.tracer = tracer if tracer is not None else Tracer()
+        self.stats = stats
+
+    def _fill_lookahead(self, n):
+        """Buffers up to n upcoming tokens; the buffered stream always ends in '$'."""
+        lookahead = self._lookahead
+        while len(lookahead) < n and not self._exhausted:
+            token = next(self._tokens, "$")
+            lookahead.append(token)
+            if token == "$":
+                self._exhausted = True
+
+    def _trace_status(self):
+        window = self.TRACE_WINDOW
+        self._fill_lookahead(window + 1)
+        upcoming = list(islice(self._lookahead, window))
+        current_input_display = " ".join(
+            t.lexeme if isinstance(t, Token) else t for t in upcoming
+        )
+        if len(self._lookahead) > window:
+            current_input_display += " ..."
+
+        names = self.index.symbols.names
+        stack_symbols_display = "".join([names[s] for s, _ in self.stack[-window:]])
+        if len(self.stack) > window:
+            stack_symbols_display = "..." + stack_symbols_display
 
-    def _print_status(self):
-        current_input_display = " ".join(self.input[self.head :])
-        stack_symbols_display = "".join([s for s, _ in self.stack])
-        print(
+        self.tracer.sink(
             f"{current_input_display:20s} ['{stack_symbols_display}'] {self.state:5s}"
         )
 
     def run(self):
-        print("\n--- Running DPDA (with Parse Tree Building) ---")
-        self._print_status()
-
-        while True:
-            current_input_symbol = self.input[self.head]
-
-            if not self.stack:
-                print("Rejected: Stack is empty prematurely.")
-                return None
-
-            stack_top_symbol, stack_top_node = self.stack[-1]
-
-            if stack_top_symbol == "Z" and current_input_symbol == "$":
-                print("Accepted")
-                return self.root_node
-
-            if stack_top_symbol in self._terminals and (
-                stack_top_symbol == current_input_symbol
-                or re.match(stack_top_symbol, current_input_symbol)
-            ):
-                self.stack.pop()
-                stack_top_node.token = current_input_symbol
-                self.head += 1
-                self._print_status()
-                continue
+        """
+        Parses the input. Returns the parse tree root on acceptance (True when
+        build_tree is False) and None on rejection.
+        """
+        tracer = self.tracer
+        trace_summary = tracer.summary_enabled
+        trace_full = tracer.full_enabled
+
+        if trace_summary:
+            tracer.sink("\n--- Running DPDA (with Parse Tree Building) ---")
+        if trace_full:
+            self._trace_status()
+
+        lookahead = self._lookahead
+        build_tree = self.build_tree
+        tree_builder = self.tree_builder
+        stack = self.stack
+        names = self.index.symbols.names
+        symbol_id = self.index.symbols.id
+        classify = self.classifier.classify
+        step = self._step
+        move = step.move
+        expand = step.expand
+        stats = self.stats
+        collect = stats is not None
+        shifts = expansions = 0
+        max_depth = len(stack)
+        self._fill_lookahead(1)
+        input_id = None
+
+        try:
+            while True:
+                # Each token is classified once, when it becomes the lookahead.
+                # Tokens from lexer.Lexer are already classified; plain strings
+                # go through the classifier, which matches each distinct string
+                # against the regexes once, so only terminal ids are compared
+                # below. A Token's lexeme is only read when a tree node needs it
+                # (a lexer.SpanToken decodes it from the input buffer on access).
+                if input_id is None:
+                    current_token = lookahead[0]
+                    if isinstance(current_token, Token):
+                        current_lexeme = None
+                        input_id = symbol_id(current_token.terminal)
+                        is_classified = True
+                    else:
+                        current_lexeme = current_token
+                        input_id = classify(current_token)
+                        is_classified = False
+                    # Whether the token's terminal came from a regex, for stats.
+                    used_regex = (
+                        collect
+                        and not is_classified
+                        and self.classifier.matched_by_pattern(current_lexeme)
+                    )
+
+                if not stack:
+                    if trace_summary:
+                        tracer.sink("Rejected: Stack is empty prematurely.")
+                    return None
+
+                stack_top_id, stack_top_node = stack[-1]
+                action, transition = move(stack_top_id, input_id)
 
-            transition_key = (self.state, current_input_symbol, stack_top_symbol)
-            next_state, push_string_rhs = self.trf.get(transition_key, (None, None))
-            # print("\n\nNice one")
-            # print(transition_key)
-            # print(self.trf.get(transition_key, (None, None)))
-            temp_dict = {
-                key: value
-                for key, value in self.trf.items()
-                if re.fullmatch(key[1], current_input_symbol)
-                and key[0] == self.state
-                and key[2] == stack_top_symbol
-            }
-            if next_state is None and len(temp_dict) != 0:
-                print("Out of normal ones , using regex")
-                next_state, push_string_rhs = list(temp_dict.values())[0]
-            # print(
-            #     {
-            #         key: value
-            #         for key, value in self.trf.items()
-            #         if re.fullmatch(key[1], current_input_symbol)
-            #         and key[0] == self.state
-            #         and key[2] == stack_top_symbol
-            #     }
-            # )
-
-            if next_state is not None:
-                popped_symbol, popped_node = self.stack.pop()
-
-                if push_string_rhs != "eps":
-                    rhs_symbols = push_string_rhs.split()
-
-                    for symbol in reversed(rhs_symbols):
-                        child_node = ParseTreeNode(symbol)
-                        popped_node.add_child(child_node)
-                        self.stack.append((symbol, child_node))
-
-                self._print_status()
-            else:
-                print(
-                    f"Rejected: No valid transition for ({self.state}, {current_input_symbol}, {stack_top_symbol})."
-                )
-                return None
+                if action == ACCEPT:
+                    if trace_summary:
+                        tracer.sink("Accepted")
+                    return tree_builder.result(self.root_node) if build_tree else True
+
+                if action == SHIFT:
+                    stack.pop()
+                    if build_tree:
+                        tree_builder.set_token(
+                            stack_top_node,
+                            current_token.lexeme if is_classified else current_lexeme,
+                            self.head,
+                        )
+                    if collect:
+                        shifts += 1
+                    lookahead.popleft()
+                    if not lookahead:
+                        self._fill_lookahead(1)
+                    input_id = None
+                    self.head += 1
+                    if trace_full:
+                        self._trace_status()
+                    continue
+
+                if action == EXPAND:
+                    expand(stack, transition, tree_builder)
+
+                    if collect:
+                        expansions += 1
+                        stats.transition_hit(self.state, names[stack_top_id], used_regex)
+                        if len(stack) > max_depth:
+                            max_depth = len(stack)
+
+                    if trace_full:
+                        self._trace_status()
+                else:
+                    if trace_summary:
+                        current_input_symbol = (
+                            current_token.terminal if is_classified else current_token
+                        )
+                        tracer.sink(
+                            f"Rejected: No valid transition for ({self.state}, {current_input_symbol}, {names[stack_top_id]})."
+                        )
+                    return None
+        finally:
+            if collect:
+                stats.count("dpda.runs")
+                stats.count("dpda.shifts", shifts)
+                stats.count("dpda.expansions", expansions)
+                stats.record_max("dpda.max_stack_depth", max_depth)
 
 
 def load_transitions(filename):
+    # Files written by transition_format.write_trf load without text parsing.
+    if transition_format.is_binary(filename):
+        with transition_format.TransitionFile(filename) as f:
+            return f.transitions()
+
     trf = {}
     with open(filename, "r", encoding="utf-8") as f:
         for line in f:
@@ -0,0 +1,263 @@
+"""
+Parallel parsing of one large input.
+
+Long inputs are usually lists at the top level: a sum of many terms under
+E -> T E_prime, E_prime -> PLUS T E_prime | eps, or a file of items under
+PROGRAM -> ITEM PROGRAM | eps. Such a list is a non-terminal L at the end of
+the start symbol's right spine (so $ is in FOLLOW(L)) with a tail-recursive
+production L -> X ... L. Wherever the sequential parse is about to expand that
+production at the top level, its stack is exactly [Z, L] and the lookahead is
+a token in FIRST(X ... L), so the rest of the input can be parsed without
+knowing what came before.
+
+parse_parallel() picks such an L, splits the tokens at separator tokens (the
+terminals in FIRST of its tail production), and parses every chunk but the
+first in a worker process starting from [Z, L]. A chunk is valid only if the
+chunk before it ended at the split point with exactly [Z, L] on the stack; the
+chunks are checked in order, a chunk whose assumption turned out wrong (e.g. a
+'+' inside parentheses) is re-parsed in this process from the real stack, and
+the chunk trees are grafted onto the L node left by the chunk before. The
+parse is deterministic, so the result is the same CompactTree, node for node,
+as a sequential parse with DPDA(..., tree_builder=CompactTree()).
+
+    tree = parse_parallel(compiled, text, jobs=8)
+"""
+
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from compact_tree import CompactTree
+from p2 import ACCEPT, EXPAND, SHIFT, DPDAStep
+from tracing import NULL_TRACER
+
+# Runner outcomes.
+ACCEPTED = "accepted"
+REJECTED = "rejected"
+# Stopped at the split point with the stack exactly [Z, L].
+AT_SPLIT = "at_split"
+# Reached the split point, but the next move shifts the separator.
+MISSED_SPLIT = "missed_split"
+
+# Chunks smaller than this aren't worth sending to a worker.
+DEFAULT_MIN_CHUNK_TOKENS = 2048
+
+# Set in each worker process by _init_worker.
+_compiled = None
+
+
+def _init_worker(compiled):
+    global _compiled
+    _compiled = compiled
+
+
+def find_list_non_terminals(cfg):
+    """
+    Returns [(L, separators)] for the list non-terminals parse_parallel can
+    split at: L is on the start symbol's right spine, $ is in FOLLOW(L) and L
+    has a tail-recursive production whose FIRST set (the separators) can't be
+    empty.
+    """
+    spine = []
+    pending = [cfg.start_symbol]
+    while pending:
+        non_terminal = pending.pop()
+        if non_terminal in spine:
+            continue
+        spine.append(non_terminal)
+        for body in cfg.productions.get(non_terminal, ()):
+            if body and body[-1] in cfg.non_terminals:
+                pending.append(body[-1])
+
+    found = []
+    for non_terminal in spine:
+        if "$" not in cfg.follow_sets.get(non_terminal, ()):
+            continue
+        for body in cfg.productions[non_terminal]:
+            if len(body) < 2 or body[-1] != non_terminal:
+                continue
+            separators = set()
+            for symbol in body:
+                first = cfg.first_sets.get(symbol, {symbol})
+                separators.update(first - {"eps"})
+                if "eps" not in first:
+                    break
+            else:
+                continue
+            found.append((non_terminal, frozenset(separators)))
+    return found
+
+
+def _run(step, ids, lexemes, base, head, stop, stack, tree, list_id):
+    """
+    Runs the LL(1) DPDA (a p2.DPDAStep) over ids (input symbol ids; lexemes[i]
+    belongs to ids[i] and base + i is its global token position) from head
+    with stack, a list of (symbol_id, node) pairs. If stop is not None the run
+    ends once head reaches stop: with AT_SPLIT when the stack becomes [Z, L],
+    or with MISSED_SPLIT before a shift. Returns the outcome and the live stack.
+    """
+    move = step.move
+    expand = step.expand
+    set_token = tree.set_token
+
+    while True:
+        stack_top_id, stack_top_node = stack[-1]
+        if head == stop:
+            if len(stack) == 2 and stack_top_id == list_id:
+                return AT_SPLIT, stack
+        action, transition = move(stack_top_id, ids[head])
+
+        if action == ACCEPT:
+            return ACCEPTED, stack
+
+        if action == SHIFT:
+            if head == stop:
+                return MISSED_SPLIT, stack
+            stack.pop()
+            set_token(stack_top_node, lexemes[head], base + head)
+            head += 1
+            continue
+
+        if action != EXPAND:
+            return REJECTED, stack
+        expand(stack, transition, tree)
+
+
+def _parse_chunk(ids, lexemes, base, list_id, last):
+    """Worker: parses one chunk from [Z, L]. Returns (outcome, tree, stack)."""
+    step = DPDAStep(_compiled.index, _compiled.terminals)
+    tree = CompactTree()
+    root = tree.new_root(step.index.symbols.name(list_id))
+    stack = [(step.bottom_id, None), (list_id, root)]
+    stop = None if last else len(lexemes)
+    outcome, stack = _run(step, ids, lexemes, base, 0, stop, stack, tree, list_id)
+    return outcome, tree, stack
+
+
+def _choose_list(compiled, ids):
+    """Returns (L id, positions of its separator tokens) with the most separators."""
+    symbols = compiled.index.symbols
+    best = None
+    for non_terminal, separators in find_list_non_terminals(compiled.cfg):
+        separator_ids = {symbols.id(t) for t in separators}
+        positions = [i for i, input_id in enumerate(ids) if input_id in separator_ids]
+        if best is None or len(positions) > len(best[1]):
+            best = (symbols.id(non_terminal), positions)
+    return best
+
+
+def _split_points(positions, n_tokens, n_chunks, min_chunk_tokens):
+    """Picks up to n_chunks - 1 separator positions spaced about evenly."""
+    size = max(min_chunk_tokens, n_tokens // max(n_chunks, 1))
+    splits = []
+    target = size
+    for position in positions:
+        if position >= target and n_tokens - position >= min_chunk_tokens:
+            splits.append(position)
+            target = position + size
+    return splits
+
+
+def parse_parallel(
+    compiled,
+    text,
+    jobs=None,
+    chunks_per_job=4,
+    min_chunk_tokens=DEFAULT_MIN_CHUNK_TOKENS,
+    executor=None,
+):
+    """
+    Lexes and parses text with compiled (a grammar_compiler.CompiledGrammar),
+    splitting it across worker processes where the grammar allows. Returns the
+    CompactTree, or None if the input is rejected. Raises lexer.LexError if
+    the text can't be tokenized. An executor passed in must have been started
+    with initializer=_init_worker, initargs=(compiled,).
+    """
+    return parse_tokens_parallel(
+        compiled,
+        compiled.tokenize(text),
+        jobs=jobs,
+        chunks_per_job=chunks_per_job,
+        min_chunk_tokens=min_chunk_tokens,
+        executor=executor,
+    )
+
+
+def parse_tokens_parallel(
+    compiled,
+    tokens,
+    jobs=None,
+    chunks_per_job=4,
+    min_chunk_tokens=DEFAULT_MIN_CHUNK_TOKENS,
+    executor=None,
+):
+    """parse_parallel() for a list of lexer.Tokens."""
+    if compiled.earley is not None:
+        # Chunks are only independent under the deterministic LL(1) parse.
+        return compiled.earley.parse(tokens, tracer=NULL_TRACER, tree_builder=CompactTree())
+    step = DPDAStep(compiled.index, compiled.terminals)
+    symbol_id = compiled.index.symbols.id
+    ids = array("i", (symbol_id(token.terminal) for token in tokens))
+    ids.append(symbol_id("$"))
+    lexemes = [token.lexeme for token in tokens]
+    n_tokens = len(lexemes)
+
+    tree = CompactTree()
+    root = tree.new_root(compiled.start_symbol)
+    stack = [(symbol_id("Z"), None), (symbol_id(compiled.start_symbol), root)]
+
+    chosen = _choose_list(compiled, ids)
+    splits = []
+    if chosen is not None and (jobs != 1 or executor is not None):
+        list_id, positions = chosen
+        workers = jobs or os.cpu_count() or 1
+        splits = _split_points(positions, n_tokens, workers * chunks_per_job, min_chunk_tokens)
+    if not splits:
+        outcome, _ = _run(step, ids, lexemes, 0, 0, None, stack, tree, -1)
+        return tree.result(root) if outcome == ACCEPTED else None
+
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(
+            max_workers=jobs, initializer=_init_worker, initargs=(compiled,)
+        )
+    try:
+        bounds = list(zip(splits, splits[1:] + [n_tokens]))
+        futures = [
+            executor.submit(
+                _parse_chunk,
+                ids[start : end + 1],
+                lexemes[start:end],
+                start,
+                list_id,
+                end == n_tokens,
+            )
+            for start, end in bounds
+        ]
+
+        outcome, stack = _run(step, ids, lexemes, 0, 0, splits[0], stack, tree, list_id)
+        for (start, end), future in zip(bounds, futures):
+            last = end == n_tokens
+            if outcome == REJECTED:
+                return None
+            if outcome == AT_SPLIT:
+                # The worker started from the real stack, so its chunk is valid.
+                chunk_outcome, chunk, chunk_stack = future.result()
+                hole = stack[-1][1]
+                offset = tree.graft(hole, chunk)
+                outcome = chunk_outcome
+                stack = [
+                    (symbol, hole if node == 0 else None if node is None else node + offset)
+                    for symbol, node in chunk_stack
+                ]
+            else:
+                # MISSED_SPLIT: carry on from the real stack in this process.
+                future.cancel()
+                outcome, stack = _run(
+                    step, ids, lexemes, 0, start, None if last else end, stack, tree, list_id
+                )
+    finally:
+        if own_executor:
+            executor.shutdown(cancel_futures=True)
+
+    return tree.result(root) if outcome == ACCEPTED else None
@@ -1,4 +1,6 @@
 class ParseTreeNode:
+    __slots__ = ("symbol", "children", "token")
+
     def __init__(self, symbol, token=None):
         self.symbol = symbol
         self.children = []
@@ -15,3 +17,51 @@ class ParseTreeNode:
         print(f"{indent}{self.symbol}{f' ({self.token})' if self.token else ''}")
         for child in self.children:
             child.display(level + 1)
+
+    def to_dict(self):
+        """
+        Converts the subtree to nested dicts ({"symbol", "token", "children"}),
+        e.g. for JSON output. Iterative, so deep trees don't hit the recursion limit.
+        """
+        root = {"symbol": self.symbol, "token": self.token, "children": []}
+        pending = [(self, root)]
+        while pending:
+            node, converted = pending.pop()
+            for child in node.children:
+                converted_child = {
+                    "symbol": child.symbol,
+                    "token": child.token,
+                    "children": [],
+                }
+                converted["children"].append(converted_child)
+                pending.append((child, converted_child))
+        return root
+
+
+class ParseTreeBuilder:
+    """
+    Builds ParseTreeNode trees for p2.DPDA.
+
+    This is the default tree builder; compact_tree.CompactTree implements the
+    same methods (new_root, expand, set_token, result) for an array-backed tree.
+    """
+
+    def new_root(self, symbol):
+        return ParseTreeNode(symbol)
+
+    def expand(self, parent, symbols):
+        """Gives parent one child per symbol, in order, and returns the children."""
+        children = [ParseTreeNode(symbol) for symbol in symbols]
+        parent.children = children
+        return children
+
+    def set_token(self, node, lexeme, position):
+        node.token = lexeme
+
+    def adopt(self, node, old):
+        """Makes node take over old's (already built) children and token."""
+        node.children = old.children
+        node.token = old.token
+
+    def result(self, root):
+        return root
@@ -1,132 +1,248 @@
-def compute_first(productions, terminals, non_terminals):
-    first_sets = {symbol: set() for symbol in non_terminals.union(terminals)}
-
-    for t in terminals:
-        first_sets[t].add(t)
-
-    changed = True
-    while changed:
-        changed = False
-        for nt in non_terminals:
-            for production in productions[nt]:
-                if production == ["ε"]:
-                    if "ε" not in first_sets[nt]:
-                        first_sets[nt].add("ε")
-                        changed = True
-                    continue
-
-                all_symbols_can_derive_epsilon = True
-                for symbol in production:
-                    old_len = len(first_sets[nt])
-                    first_sets[nt].update(first_sets[symbol] - {"ε"})
-                    if len(first_sets[nt]) > old_len:
-                        changed = True
-
-                    if "ε" not in first_sets[symbol]:
-                        all_symbols_can_derive_epsilon = False
-                        break
+from array import array
 
-                if all_symbols_can_derive_epsilon:
-                    if "ε" not in first_sets[nt]:
-                        first_sets[nt].add("ε")
-                        changed = True
-    return first_sets
+import grammar_analysis
+
+# Marks an empty cell in a CombTable or CompressedLL1Table.
+EMPTY = -1
+
+
+def compute_first(productions, terminals, non_terminals):
+    return grammar_analysis.compute_first_sets(
+        productions, terminals, non_terminals, epsilon="ε"
+    )
 
 
 def compute_follow(productions, start_symbol, terminals, non_terminals, first_sets):
-    follow_sets = {nt: set() for nt in non_terminals}
-
-    if start_symbol:
-        follow_sets[start_symbol].add("$")
-
-    changed = True
-    while changed:
-        changed = False
-        for production_head, production_list in productions.items():
-            for production in production_list:
-                for i, symbol in enumerate(production):
-                    if symbol in non_terminals:
-                        beta = production[i + 1 :]
-
-                        if beta:
-                            first_of_beta = set()
-                            all_beta_can_derive_epsilon = True
-                            for beta_symbol in beta:
-                                first_of_beta.update(first_sets[beta_symbol])
-                                if "ε" not in first_sets[beta_symbol]:
-                                    all_beta_can_derive_epsilon = False
-                                    break
-
-                            old_len = len(follow_sets[symbol])
-                            follow_sets[symbol].update(first_of_beta - {"ε"})
-                            if len(follow_sets[symbol]) > old_len:
-                                changed = True
-
-                            if all_beta_can_derive_epsilon:
-                                old_len = len(follow_sets[symbol])
-                                follow_sets[symbol].update(follow_sets[production_head])
-                                if len(follow_sets[symbol]) > old_len:
-                                    changed = True
-                        else:
-                            if symbol != production_head:
-                                old_len = len(follow_sets[symbol])
-                                follow_sets[symbol].update(follow_sets[production_head])
-                                if len(follow_sets[symbol]) > old_len:
-                                    changed = True
-    return follow_sets
-
-
-def build_ll1_parsing_table(productions, terminals, non_terminals, FIRST, FOLLOW):
-    parsing_table = {}
+    return grammar_analysis.compute_follow_sets(
+        productions, start_symbol, non_terminals, first_sets, epsilon="ε"
+    )
 
-    all_terminals_with_dollar = terminals.union({"$"})
-    for nt in non_terminals:
-        for t in all_terminals_with_dollar:
-            parsing_table[(nt, t)] = []
+
+def build_ll1_parsing_table(productions, terminals, non_terminals, FIRST, FOLLOW, epsilon="ε"):
+    # Only filled cells are stored; a missing (nt, t) key is an error entry.
+    # epsilon must be the symbol FIRST and the productions use for the empty string.
+    parsing_table = {}
 
     for nt, rules in productions.items():
         for rule in rules:
             first_alpha = set()
             all_epsilon_possible = True
-            if rule == ["ε"]:
-                first_alpha.add("ε")
+            if rule == [epsilon]:
+                first_alpha.add(epsilon)
             else:
                 for symbol in rule:
-                    first_alpha.update(FIRST[symbol])
-                    if "ε" not in FIRST[symbol]:
+                    first_alpha.update(FIRST[symbol] - {epsilon})
+                    if epsilon not in FIRST[symbol]:
                         all_epsilon_possible = False
                         break
-                if all_epsilon_possible and "ε" not in first_alpha:
-                    first_alpha.add("ε")
+                if all_epsilon_possible and epsilon not in first_alpha:
+                    first_alpha.add(epsilon)
 
             for terminal in first_alpha:
-                if terminal == "ε":
+                if terminal == epsilon:
                     for follow_terminal in FOLLOW[nt]:
-                        if parsing_table[(nt, follow_terminal)]:
+                        if (nt, follow_terminal) in parsing_table:
                             print(
                                 f"LL(1) conflict detected at M[{nt}, {follow_terminal}]:"
                             )
                             print(
-                                f"  Existing rule: {nt} -> {' '.join(parsing_table[(nt, follow_terminal)][0])}"
+                                f"  Existing rule: {nt} -> {' '.join(parsing_table[(nt, follow_terminal)])}"
                             )
                             print(f"  New rule: {nt} -> {' '.join(rule)}")
                             return None
-                        parsing_table[(nt, follow_terminal)].append(rule)
+                        parsing_table[(nt, follow_terminal)] = rule
                 else:
-                    if parsing_table[(nt, terminal)]:
+                    if (nt, terminal) in parsing_table:
                         print(f"LL(1) conflict detected at M[{nt}, {terminal}]:")
                         print(
-                            f"  Existing rule: {nt} -> {' '.join(parsing_table[(nt, terminal)][0])}"
+                            f"  Existing rule: {nt} -> {' '.join(parsing_table[(nt, terminal)])}"
                         )
                         print(f"  New rule: {nt} -> {' '.join(rule)}")
                         return None  # Indicate conflict
-                    parsing_table[(nt, terminal)].append(rule)
-
-    final_parsing_table = {}
-    for (nt, t), rules_list in parsing_table.items():
-        if rules_list:
-            final_parsing_table[(nt, t)] = rules_list[0]
-        else:
-            final_parsing_table[(nt, t)] = None
-
-    return final_parsing_table
+                    parsing_table[(nt, terminal)] = rule
+
+    return parsing_table
+
+
+class CombTable:
+    """
+    Read-only n_rows x n_cols grid of ints compressed by row displacement.
+
+    Identical rows are stored once: row_map sends each row to its distinct row.
+    Each distinct row has a default (its most common value, EMPTY included) and
+    its other cells are overlaid on one shared comb vector at offset base[row]:
+    cell (row, col) is values[base[row] + col] if check[base[row] + col] is
+    row, otherwise default[row]. Lookups are exact, so an EMPTY cell stays EMPTY
+    unless it was explicitly set.
+    """
+
+    def __init__(self, n_rows, n_cols, row_map, default, base, values, check):
+        self.n_rows = n_rows
+        self.n_cols = n_cols
+        self.row_map = row_map
+        self.default = default
+        self.base = base
+        self.values = values
+        self.check = check
+
+    @classmethod
+    def from_rows(cls, rows, n_cols, fill=EMPTY):
+        """rows is a list of {col: value} dicts; missing columns hold fill."""
+        distinct = {}  # frozen row -> distinct row id
+        row_map = array("i")
+        distinct_rows = []
+        for cells in rows:
+            key = frozenset(cells.items())
+            row_id = distinct.get(key)
+            if row_id is None:
+                row_id = distinct[key] = len(distinct_rows)
+                distinct_rows.append(cells)
+            row_map.append(row_id)
+
+        default = array("i", [fill]) * len(distinct_rows)
+        entries = []  # (row_id, sorted cols that differ from the default)
+        for row_id, cells in enumerate(distinct_rows):
+            counts = {}
+            for value in cells.values():
+                counts[value] = counts.get(value, 0) + 1
+            counts[fill] = counts.get(fill, 0) + n_cols - len(cells)
+            row_default = max(counts, key=lambda value: (counts[value], value == fill))
+            default[row_id] = row_default
+            if row_default == fill:
+                cols = sorted(col for col, value in cells.items() if value != fill)
+            else:
+                cols = [col for col in range(n_cols) if cells.get(col, fill) != row_default]
+            if cols:
+                entries.append((row_id, cols))
+
+        # First fit, densest rows first.
+        entries.sort(key=lambda entry: -len(entry[1]))
+        base = array("i", [0]) * len(distinct_rows)
+        check = array("i")
+        values = array("i")
+        first_free = 0
+        for row_id, cols in entries:
+            start = max(0, first_free - cols[0])
+            while True:
+                for col in cols:
+                    slot = start + col
+                    if slot < len(check) and check[slot] != EMPTY:
+                        break
+                else:
+                    break
+                start += 1
+            base[row_id] = start
+            end = start + cols[-1] + 1
+            if end > len(check):
+                check.extend(array("i", [EMPTY]) * (end - len(check)))
+                values.extend(array("i", [fill]) * (end - len(values)))
+            cells = distinct_rows[row_id]
+            for col in cols:
+                check[start + col] = row_id
+                values[start + col] = cells.get(col, fill)
+            while first_free < len(check) and check[first_free] != EMPTY:
+                first_free += 1
+        return cls(len(rows), n_cols, row_map, default, base, values, check)
+
+    def get(self, row, col):
+        if 0 <= col < self.n_cols:
+            row = self.row_map[row]
+            slot = self.base[row] + col
+            if slot < len(self.check) and self.check[slot] == row:
+                return self.values[slot]
+            return self.default[row]
+        return EMPTY
+
+    def row(self, row):
+        return array("i", (self.get(row, col) for col in range(self.n_cols)))
+
+    def nbytes(self):
+        return sum(
+            a.itemsize * len(a)
+            for a in (self.row_map, self.default, self.base, self.values, self.check)
+        )
+
+
+class CompressedLL1Table:
+    """
+    LL(1) parsing table over interned symbol ids (see symbols.SymbolTable).
+
+    Each non-terminal id maps to a row and each terminal id to a column of a
+    CombTable whose cells are indexes into self.productions, a list of
+    (head_id, body_ids) pairs. Cells are collected sparsely and compressed
+    when from_parsing_table() finishes (or on freeze()), so the full |N| x |T|
+    grid is never allocated. The table is read-only once frozen.
+    """
+
+    def __init__(self, symbols, non_terminals, terminals):
+        self.symbols = symbols
+        self.non_terminal_ids = [symbols.intern(nt) for nt in sorted(non_terminals)]
+        self.terminal_ids = [symbols.intern(t) for t in sorted(terminals)]
+
+        self.row_of = array("i", [EMPTY]) * len(symbols)
+        self.col_of = array("i", [EMPTY]) * len(symbols)
+        for row, symbol_id in enumerate(self.non_terminal_ids):
+            self.row_of[symbol_id] = row
+        for col, symbol_id in enumerate(self.terminal_ids):
+            self.col_of[symbol_id] = col
+
+        self.cells = None
+        self._pending = [{} for _ in self.non_terminal_ids]
+        self.productions = []
+        self._production_index = {}
+
+    @classmethod
+    def from_parsing_table(cls, symbols, non_terminals, terminals, parsing_table):
+        """Builds the frozen table for a {(NonTerminal, Terminal): body} table."""
+        table = cls(symbols, non_terminals, terminals)
+        for (non_terminal, terminal), body in parsing_table.items():
+            if body:
+                table.set(non_terminal, terminal, body)
+        return table.freeze()
+
+    def set(self, non_terminal, terminal, body):
+        if self._pending is None:
+            raise ValueError("CompressedLL1Table is read-only once frozen")
+        symbols = self.symbols
+        head_id = symbols.id(non_terminal)
+        key = (head_id, tuple(symbols.intern(symbol) for symbol in body))
+        production = self._production_index.get(key)
+        if production is None:
+            production = self._production_index[key] = len(self.productions)
+            self.productions.append(key)
+        self._pending[self.row_of[head_id]][self.col_of[symbols.id(terminal)]] = production
+
+    def freeze(self):
+        if self._pending is not None:
+            self.cells = CombTable.from_rows(self._pending, len(self.terminal_ids))
+            self._pending = None
+        return self
+
+    def lookup(self, non_terminal_id, terminal_id):
+        """Returns the production index for M[non_terminal, terminal], or EMPTY."""
+        self._check_frozen()
+        if non_terminal_id >= len(self.row_of) or terminal_id >= len(self.col_of):
+            return EMPTY
+        row = self.row_of[non_terminal_id]
+        col = self.col_of[terminal_id]
+        if row == EMPTY or col == EMPTY:
+            return EMPTY
+        return self.cells.get(row, col)
+
+    def items(self):
+        """
+        Yields ((NonTerminal, Terminal), body) for every filled cell, like the
+        dict form, so it can be passed to convert_ll1_to_dpda.
+        """
+        self._check_frozen()
+        names = self.symbols.names
+        for row, head_id in enumerate(self.non_terminal_ids):
+            for col, terminal_id in enumerate(self.terminal_ids):
+                production = self.cells.get(row, col)
+                if production != EMPTY:
+                    body = [names[symbol_id] for symbol_id in self.productions[production][1]]
+                    yield (names[head_id], names[terminal_id]), body
+
+    def _check_frozen(self):
+        if self._pending is not None:
+            raise ValueError("CompressedLL1Table must be frozen with freeze() before it is read")
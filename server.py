@@ -0,0 +1,285 @@
+"""
+Parse service: keeps compiled grammars in memory and answers parse requests
+over a Unix socket or localhost TCP, one JSON object per line:
+
+    python server.py --unix /tmp/tla.sock -g grammar.txt
+    python server.py --port 8765 -g grammar.txt -g other_grammar.txt
+
+Request:  {"id": 1, "input": "a + b", "grammar": "grammar.txt", "tree": true}
+Response: {"id": 1, "accepted": true, "tree": {...}}
+
+"grammar" (default: the first -g) must be one of the -g files or a file under
+--grammar-dir; grammars are compiled on first use and kept in a size-bounded
+grammar_registry.GrammarRegistry. {"id": 2, "command": "stats"} returns the
+registry's hit/miss/eviction counters. "tree" is optional and other request
+keys are echoed back. Requests on one connection may be pipelined; responses
+come back in request order. Small inputs to LL(1) grammars are parsed on the
+event loop; larger ones, and all inputs to grammars parsed with the Earley
+engine (cubic on ambiguous grammars), go to a process pool so a long parse
+doesn't hold up other connections. A grammar that isn't loaded yet is
+compiled in a thread, off the event loop.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from batch import parse_record
+from grammar_cache import DEFAULT_CACHE_DIR
+from grammar_registry import DEFAULT_MAX_BYTES, GrammarRegistry
+
+DEFAULT_GRAMMAR_FILE = "grammar.txt"
+# Inputs up to this many characters are parsed inline on the event loop,
+# unless the grammar uses the Earley engine.
+DEFAULT_INLINE_LIMIT = 4096
+# Requests a connection may have in flight before the server stops reading it.
+MAX_PIPELINED = 64
+# Longest request line accepted.
+MAX_LINE = 64 * 1024 * 1024
+
+# Grammars loaded in each executor process.
+_worker_registry = None
+
+
+def _init_worker(cache_dir, max_bytes):
+    global _worker_registry
+    _worker_registry = GrammarRegistry(max_bytes=max_bytes, cache_dir=cache_dir)
+
+
+def _worker_parse(grammar_file, record, with_tree):
+    return parse_record(_worker_registry.get(grammar_file), record, with_tree)
+
+
+class ParseServer:
+    def __init__(
+        self,
+        grammar_files,
+        grammar_dir=None,
+        cache_dir=DEFAULT_CACHE_DIR,
+        jobs=None,
+        inline_limit=DEFAULT_INLINE_LIMIT,
+        max_bytes=DEFAULT_MAX_BYTES,
+    ):
+        if not grammar_files:
+            raise ValueError("at least one grammar file is required")
+        self.grammar_files = list(grammar_files)
+        self.default_grammar = grammar_files[0]
+        self.grammar_dir = os.path.realpath(grammar_dir) if grammar_dir else None
+        self.inline_limit = inline_limit
+        self.registry = GrammarRegistry(max_bytes=max_bytes, cache_dir=cache_dir)
+        # The -g grammars are compiled up front so the first requests don't wait.
+        for grammar_file in self.grammar_files:
+            self.registry.get(grammar_file)
+        self.executor = ProcessPoolExecutor(
+            max_workers=jobs, initializer=_init_worker, initargs=(cache_dir, max_bytes)
+        )
+        self.requests = 0
+
+    def resolve_grammar(self, name):
+        """Returns the path of the grammar a request asked for, or None if it isn't served."""
+        if name in self.grammar_files:
+            return name
+        if self.grammar_dir is None or not isinstance(name, str):
+            return None
+        path = os.path.realpath(os.path.join(self.grammar_dir, name))
+        if os.path.dirname(path) != self.grammar_dir or not os.path.isfile(path):
+            return None
+        return path
+
+    async def parse(self, request):
+        """Returns the response dict for one decoded request."""
+        if isinstance(request, dict) and request.get("command") == "stats":
+            return {
+                "id": request.get("id"),
+                "requests": self.requests,
+                "registry": self.registry.counters(),
+            }
+        if not isinstance(request, dict) or not isinstance(request.get("input"), str):
+            return {"id": _request_id(request), "error": "request needs a string 'input'"}
+
+        record = dict(request)
+        name = record.pop("grammar", self.default_grammar)
+        with_tree = bool(record.pop("tree", False))
+        grammar_file = self.resolve_grammar(name)
+        if grammar_file is None:
+            return {"id": _request_id(request), "error": f"unknown grammar {name!r}"}
+
+        self.requests += 1
+        loop = asyncio.get_running_loop()
+        compiled = self.registry.get_cached(grammar_file)
+        if compiled is None:
+            # Compiling (and sizing) a grammar can take a while; don't stall
+            # the other connections meanwhile.
+            compiled = await loop.run_in_executor(None, self.registry.get, grammar_file)
+        # The DPDA is linear in the input; an Earley parse of even a short
+        # input can take minutes on an ambiguous grammar.
+        if compiled.engine == "ll1" and len(record["input"]) <= self.inline_limit:
+            return parse_record(compiled, record, with_tree)
+        return await loop.run_in_executor(
+            self.executor, _worker_parse, grammar_file, record, with_tree
+        )
+
+    async def handle_connection(self, reader, writer):
+        # Responses are written in request order by write_responses while
+        # this coroutine keeps reading (and starting) later requests.
+        pending = deque()
+        ready = asyncio.Event()
+        done_reading = False
+        slots = asyncio.Semaphore(MAX_PIPELINED)
+
+        async def write_responses():
+            try:
+                while True:
+                    while not pending:
+                        if done_reading:
+                            return
+                        ready.clear()
+                        await ready.wait()
+                    response = await pending.popleft()
+                    slots.release()
+                    writer.write(json.dumps(response).encode() + b"\n")
+                    await writer.drain()
+            finally:
+                # Wakes the reader if it is waiting for a slot, so it sees
+                # the writer has stopped (e.g. the client reset the connection).
+                slots.release()
+
+        writer_task = asyncio.create_task(write_responses())
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (asyncio.LimitOverrunError, ValueError):
+                    pending.append(_done({"id": None, "error": "request line too long"}))
+                    ready.set()
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                await slots.acquire()
+                if writer_task.done():
+                    break
+                pending.append(asyncio.ensure_future(self._respond(line)))
+                ready.set()
+        except ConnectionError:
+            pass
+        finally:
+            done_reading = True
+            ready.set()
+            try:
+                await writer_task
+            except ConnectionError:
+                pass
+            for response in pending:
+                response.cancel()
+            writer.close()
+
+    async def _respond(self, line):
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            return {"id": None, "error": f"invalid JSON: {e}"}
+        try:
+            return await self.parse(request)
+        except Exception as e:  # one bad request must not take down the connection
+            return {"id": _request_id(request), "error": f"{type(e).__name__}: {e}"}
+
+    async def serve(self, unix_path=None, host="127.0.0.1", port=8765):
+        if unix_path:
+            server = await asyncio.start_unix_server(
+                self.handle_connection, path=unix_path, limit=MAX_LINE
+            )
+            where = unix_path
+        else:
+            server = await asyncio.start_server(
+                self.handle_connection, host=host, port=port, limit=MAX_LINE
+            )
+            where = f"{host}:{port}"
+        served = ", ".join(self.grammar_files)
+        if self.grammar_dir:
+            served += f" and {self.grammar_dir}/*"
+        print(f"Serving {served} on {where}", file=sys.stderr)
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, stop.set)
+            except (NotImplementedError, RuntimeError):
+                pass
+        async with server:
+            await stop.wait()
+        if unix_path and os.path.exists(unix_path):
+            os.unlink(unix_path)
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+
+
+def _request_id(request):
+    return request.get("id") if isinstance(request, dict) else None
+
+
+def _done(value):
+    future = asyncio.get_running_loop().create_future()
+    future.set_result(value)
+    return future
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument(
+        "-g",
+        "--grammar",
+        action="append",
+        help=f"grammar file to serve (repeatable; default {DEFAULT_GRAMMAR_FILE})",
+    )
+    arg_parser.add_argument(
+        "--grammar-dir",
+        help="also serve any grammar file in this directory, compiled on first use",
+    )
+    arg_parser.add_argument(
+        "--max-grammar-bytes",
+        type=int,
+        default=DEFAULT_MAX_BYTES,
+        help="approximate memory budget for compiled grammars kept in memory",
+    )
+    arg_parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket")
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", type=int, default=8765)
+    arg_parser.add_argument(
+        "--cache-dir",
+        default=DEFAULT_CACHE_DIR,
+        help="compiled grammar cache directory",
+    )
+    arg_parser.add_argument("-j", "--jobs", type=int, default=None)
+    arg_parser.add_argument(
+        "--inline-limit",
+        type=int,
+        default=DEFAULT_INLINE_LIMIT,
+        help="LL(1) inputs up to this many characters are parsed without the process pool",
+    )
+    args = arg_parser.parse_args(argv)
+
+    server = ParseServer(
+        args.grammar or [DEFAULT_GRAMMAR_FILE],
+        grammar_dir=args.grammar_dir,
+        cache_dir=args.cache_dir,
+        jobs=args.jobs,
+        inline_limit=args.inline_limit,
+        max_bytes=args.max_grammar_bytes,
+    )
+    try:
+        asyncio.run(server.serve(args.unix, args.host, args.port))
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Opt-in instrumentation: phase wall times and hot-path counters.
+
+Components take an optional ``stats`` argument (None by default). When it is
+None they check that once, outside their hot loops, and record nothing, so
+disabled stats cost nothing. Pass a Stats to collect:
+
+    stats = Stats()
+    compiled = compile_grammar("grammar.txt", stats=stats)
+    compiled.parse("a + b", stats=stats)
+    stats.dump(sys.stderr)
+"""
+
+import json
+import time
+from contextlib import contextmanager, nullcontext
+
+_NO_PHASE = nullcontext()
+
+
+class Stats:
+    def __init__(self):
+        self.counters = {}  # name -> int
+        self.maxima = {}  # name -> largest value seen
+        self.phases = {}  # name -> [seconds, calls]
+        # (state, stack_top) -> [table hits, regex-fallback hits] of DPDA expansions
+        self.transitions = {}
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def record_max(self, name, value):
+        if value > self.maxima.get(name, value - 1):
+            self.maxima[name] = value
+
+    def add_time(self, name, seconds, calls=1):
+        entry = self.phases.get(name)
+        if entry is None:
+            entry = self.phases[name] = [0.0, 0]
+        entry[0] += seconds
+        entry[1] += calls
+
+    @contextmanager
+    def phase(self, name):
+        """Adds the wall time of the with-block to phase name."""
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def transition_hit(self, state, stack_top, used_regex):
+        entry = self.transitions.get((state, stack_top))
+        if entry is None:
+            entry = self.transitions[(state, stack_top)] = [0, 0]
+        entry[1 if used_regex else 0] += 1
+
+    def merge(self, other):
+        """Adds other's numbers into this Stats (e.g. from worker processes)."""
+        for name, n in other.counters.items():
+            self.count(name, n)
+        for name, value in other.maxima.items():
+            self.record_max(name, value)
+        for name, (seconds, calls) in other.phases.items():
+            self.add_time(name, seconds, calls)
+        for (state, stack_top), (hits, regex_hits) in other.transitions.items():
+            entry = self.transitions.setdefault((state, stack_top), [0, 0])
+            entry[0] += hits
+            entry[1] += regex_hits
+
+    def to_dict(self):
+        return {
+            "phases": {
+                name: {"seconds": seconds, "calls": calls}
+                for name, (seconds, calls) in self.phases.items()
+            },
+            "counters": dict(self.counters),
+            "maxima": dict(self.maxima),
+            "transitions": [
+                {
+                    "state": state,
+                    "stack_top": stack_top,
+                    "transition_hits": hits,
+                    "regex_hits": regex_hits,
+                }
+                for (state, stack_top), (hits, regex_hits) in sorted(self.transitions.items())
+            ],
+        }
+
+    def to_json(self, indent=1):
+        return json.dumps(self.to_dict(), indent=indent)
+
+    def dump(self, f):
+        f.write(self.to_json() + "\n")
+
+
+def phase(stats, name):
+    """stats.phase(name), or a no-op context manager when stats is None."""
+    return _NO_PHASE if stats is None else stats.phase(name)
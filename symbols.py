@@ -0,0 +1,63 @@
+class SymbolTable:
+    """
+    Interns grammar symbols (terminals, non-terminals, stack and state names)
+    to small consecutive integers, so sets of symbols can be int bitsets and
+    tables can be dense integer arrays indexed by symbol id.
+    """
+
+    def __init__(self, names=()):
+        self.names = []
+        self._ids = {}
+        for name in names:
+            self.intern(name)
+
+    def intern(self, name):
+        symbol_id = self._ids.get(name)
+        if symbol_id is None:
+            symbol_id = self._ids[name] = len(self.names)
+            self.names.append(name)
+        return symbol_id
+
+    def id(self, name, default=-1):
+        """Returns the id of name, or default if it was never interned."""
+        return self._ids.get(name, default)
+
+    def name(self, symbol_id):
+        return self.names[symbol_id]
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self._ids
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def bits(self, names):
+        """Interns names and returns them as a bitset."""
+        result = 0
+        for name in names:
+            result |= 1 << self.intern(name)
+        return result
+
+    def names_of(self, bits):
+        """Returns the set of names in a bitset."""
+        return {self.names[symbol_id] for symbol_id in iter_bits(bits)}
+
+    def __getstate__(self):
+        return self.names
+
+    def __setstate__(self, names):
+        self.names = []
+        self._ids = {}
+        for name in names:
+            self.intern(name)
+
+
+def iter_bits(bits):
+    """Yields the indices of the set bits of a non-negative int, lowest first."""
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
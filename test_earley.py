@@ -0,0 +1,191 @@
+"""
+EarleyParser against a naive recognizer on small random grammars (ambiguous,
+left-recursive and nullable ones included), and against the DPDA on LL(1)
+grammars, where both must build the same tree.
+
+    python -m unittest test_earley
+"""
+
+import os
+import random
+import tempfile
+import unittest
+
+import grammar_families
+from earley import EarleyParser
+from grammar_compiler import compile_grammar
+from p1 import CFG
+from stats import Stats
+from tracing import NULL_TRACER
+
+GRAMMAR_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "grammar.txt")
+
+
+def recognizes(cfg, tokens):
+    """Whether cfg derives tokens, by fixed-point iteration over every span."""
+    n = len(tokens)
+    derives = set()  # (non_terminal, i, j)
+
+    def sequence(body, i, j):
+        if not body:
+            return i == j
+        symbol, rest = body[0], body[1:]
+        if symbol == "eps":
+            return sequence(rest, i, j)
+        if symbol not in cfg.non_terminals:
+            return i < j and tokens[i] == symbol and sequence(rest, i + 1, j)
+        return any(
+            (symbol, i, k) in derives and sequence(rest, k, j) for k in range(i, j + 1)
+        )
+
+    changed = True
+    while changed:
+        changed = False
+        for nt in cfg.non_terminals:
+            for i in range(n + 1):
+                for j in range(i, n + 1):
+                    if (nt, i, j) not in derives and any(
+                        sequence(body, i, j) for body in cfg.productions.get(nt, [])
+                    ):
+                        derives.add((nt, i, j))
+                        changed = True
+    return (cfg.start_symbol, 0, n) in derives
+
+
+def leaves_if_valid(cfg, root):
+    """The tree's tokens, or None if a node doesn't match one of its productions."""
+    leaves = []
+    pending = [root]
+    while pending:
+        node = pending.pop()
+        if node.symbol not in cfg.non_terminals:
+            leaves.append(node.token)
+            continue
+        children = [child.symbol for child in node.children]
+        bodies = [[s for s in body if s != "eps"] for body in cfg.productions[node.symbol]]
+        if children not in bodies:
+            return None
+        pending.extend(reversed(node.children))
+    return leaves
+
+
+def same_tree(a, b):
+    pending = [(a, b)]
+    while pending:
+        x, y = pending.pop()
+        if x.symbol != y.symbol or x.token != y.token or len(x.children) != len(y.children):
+            return False
+        pending.extend(zip(x.children, y.children))
+    return True
+
+
+class EarleyParserTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.workdir.cleanup()
+
+    def write_grammar(self, name, text):
+        path = os.path.join(self.workdir.name, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return path
+
+    def test_random_grammars_match_naive_recognizer(self):
+        rng = random.Random(1)
+        terminals = ["a", "b", "c"]
+        for _ in range(120):
+            non_terminals = ["S", "A", "B", "C"][: rng.randrange(1, 5)]
+            symbols = non_terminals + terminals + ["eps"]
+            lines = [
+                "START=S",
+                f"NON_TERMINALS={','.join(non_terminals)}",
+                "TERMINALS=a,b,c,eps",
+            ]
+            for nt in non_terminals:
+                bodies = []
+                for _ in range(rng.randrange(1, 4)):
+                    body = [rng.choice(symbols) for _ in range(rng.randrange(1, 4))]
+                    body = [s for s in body if s != "eps"] or ["eps"]
+                    bodies.append(" ".join(body))
+                lines.append(f"{nt} -> {' | '.join(bodies)}")
+            cfg = CFG(self.write_grammar("random.txt", "\n".join(lines) + "\n"), tracer=NULL_TRACER)
+            cfg.compute_first_sets()
+            cfg.compute_follow_sets()
+            parser = EarleyParser(cfg)
+
+            for n in range(6):
+                for _ in range(4):
+                    tokens = [rng.choice(terminals) for _ in range(n)]
+                    root = parser.parse(tokens, tracer=NULL_TRACER)
+                    self.assertEqual(root is not None, recognizes(cfg, tokens), (lines, tokens))
+                    if root is not None:
+                        self.assertEqual(leaves_if_valid(cfg, root), tokens, (lines, tokens))
+
+    def test_same_trees_as_dpda_on_ll1_grammars(self):
+        rng = random.Random(0)
+        compiled = compile_grammar(GRAMMAR_FILE)
+        cases = [
+            (compiled, compiled.tokenize(text))
+            for text in ["a + b * (c + 3)", "a", "((1))*x+y", "(a", "a + * b", ""]
+        ]
+        for path, family in grammar_families.write_grammars(self.workdir.name, 6):
+            compiled = compile_grammar(path)
+            for _ in range(10):
+                tokens = compiled.tokenize(family.make_input(rng.randrange(1, 30), rng))
+                cases.append((compiled, tokens))
+                if len(tokens) > 1:
+                    cases.append((compiled, tokens[:-1]))
+
+        for compiled, tokens in cases:
+            self.assertIsNone(compiled.earley)
+            expected = compiled.parse_tokens(tokens)
+            root = EarleyParser(compiled.cfg).parse(tokens, tracer=NULL_TRACER)
+            self.assertEqual(root is None, expected is None, tokens)
+            if root is not None:
+                self.assertTrue(same_tree(root, expected), tokens)
+
+    def test_conflicting_grammar_uses_earley(self):
+        path = self.write_grammar(
+            "ambiguous.txt",
+            "START=E\n"
+            "NON_TERMINALS=E,PLUS,ID\n"
+            "TERMINALS=\\+,[a-z]+,eps\n"
+            "E -> E PLUS E | ID\n"
+            "PLUS -> \\+\n"
+            "ID -> [a-z]+\n",
+        )
+        compiled = compile_grammar(path)
+        self.assertEqual(compiled.engine, "earley")
+        self.assertIn(("E", "[a-z]+"), compiled.ll1_conflicts)
+
+        root = compiled.parse("a + b + c")
+        self.assertIsNotNone(root)
+        self.assertEqual(leaves_if_valid(compiled.cfg, root), ["a", "+", "b", "+", "c"])
+        self.assertIsNone(compiled.parse("a + + b"))
+
+    def test_long_right_recursion(self):
+        # Not LL(1) (both productions start with ID), but unambiguous: with
+        # Leo's optimization the chart stays linear in the list length.
+        path = self.write_grammar(
+            "list.txt",
+            "START=L\n"
+            "NON_TERMINALS=L,PLUS,ID\n"
+            "TERMINALS=\\+,[a-z]+,eps\n"
+            "L -> ID PLUS L | ID\n"
+            "PLUS -> \\+\n"
+            "ID -> [a-z]+\n",
+        )
+        compiled = compile_grammar(path)
+        self.assertEqual(compiled.engine, "earley")
+        tokens = compiled.tokenize(" + ".join(["x"] * 5000))
+        stats = Stats()
+        root = compiled.parse_tokens(tokens, stats=stats)
+        self.assertIsNotNone(root)
+        self.assertEqual(leaves_if_valid(compiled.cfg, root), [t.lexeme for t in tokens])
+        self.assertLess(stats.counters["earley.items"], 20 * len(tokens))
+
+
+if __name__ == "__main__":
+    unittest.main()
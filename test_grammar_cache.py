@@ -0,0 +1,63 @@
+"""
+The on-disk grammar cache: entries are reused while the grammar is unchanged,
+and a grammar edited while it was being compiled is not cached under the
+old contents' hash.
+
+    python -m unittest test_grammar_cache
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import grammar_cache
+from grammar_cache import cache_path, grammar_hash, load_compiled_grammar
+from stats import Stats
+
+GRAMMAR_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "grammar.txt")
+
+
+class GrammarCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.workdir.name, "cache")
+        self.grammar_file = os.path.join(self.workdir.name, "grammar.txt")
+        shutil.copyfile(GRAMMAR_FILE, self.grammar_file)
+
+    def tearDown(self):
+        self.workdir.cleanup()
+
+    def test_unchanged_grammar_is_loaded_from_cache(self):
+        stats = Stats()
+        first = load_compiled_grammar(self.grammar_file, cache_dir=self.cache_dir, stats=stats)
+        self.assertTrue(os.path.exists(cache_path(grammar_hash(self.grammar_file), self.cache_dir)))
+        second = load_compiled_grammar(self.grammar_file, cache_dir=self.cache_dir, stats=stats)
+        self.assertEqual(stats.counters["grammar_cache.misses"], 1)
+        self.assertEqual(stats.counters["grammar_cache.hits"], 1)
+        self.assertEqual(second.parsing_table, first.parsing_table)
+        self.assertEqual(second.trf, first.trf)
+
+    def test_grammar_edited_during_compile_is_not_cached(self):
+        digest = grammar_hash(self.grammar_file)
+        compile_grammar = grammar_cache.compile_grammar
+
+        def edit_then_compile(grammar_file, **kwargs):
+            with open(grammar_file, "a", encoding="utf-8") as f:
+                f.write("F -> IDENTIFIER PLUS F\n")
+            return compile_grammar(grammar_file, **kwargs)
+
+        with mock.patch.object(grammar_cache, "compile_grammar", edit_then_compile):
+            compiled = load_compiled_grammar(self.grammar_file, cache_dir=self.cache_dir)
+        self.assertEqual(compiled.engine, "earley")
+        self.assertFalse(os.path.exists(cache_path(digest, self.cache_dir)))
+
+        # The next load compiles the edited grammar and caches it under its own hash.
+        compiled = load_compiled_grammar(self.grammar_file, cache_dir=self.cache_dir)
+        self.assertEqual(compiled.engine, "earley")
+        self.assertTrue(os.path.exists(cache_path(grammar_hash(self.grammar_file), self.cache_dir)))
+
+
+if __name__ == "__main__":
+    unittest.main()
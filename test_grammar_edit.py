@@ -0,0 +1,100 @@
+"""
+GrammarEditor against a full re-analysis: after every random edit, the edited
+CFG's FIRST/FOLLOW sets, LL(1) table, conflicts and DPDA transitions must be
+what analysing the edited grammar from scratch gives.
+
+    python -m unittest test_grammar_edit
+"""
+
+import copy
+import os
+import random
+import tempfile
+import unittest
+
+import grammar_families
+from grammar_edit import GrammarEditor
+from p1 import CFG, convert_ll1_to_dpda
+from tracing import NULL_TRACER
+
+GRAMMAR_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "grammar.txt")
+
+
+def analyse(grammar_file, productions):
+    """Returns (cfg, parsing_table, trf) for grammar_file with productions, from scratch."""
+    cfg = CFG(grammar_file, tracer=NULL_TRACER)
+    cfg.productions = copy.deepcopy(productions)
+    for bodies in cfg.productions.values():
+        for body in bodies:
+            for symbol in body:
+                cfg.symbols.intern(symbol)
+    cfg.compute_first_sets()
+    cfg.compute_follow_sets()
+    parsing_table = cfg.build_ll1_table()
+    return cfg, parsing_table, convert_ll1_to_dpda(cfg, parsing_table)
+
+
+class GrammarEditorTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.grammar_files = [GRAMMAR_FILE]
+        for path, _ in grammar_families.write_grammars(self.workdir.name, 6):
+            self.grammar_files.append(path)
+
+    def tearDown(self):
+        self.workdir.cleanup()
+
+    def assert_matches_full_analysis(self, grammar_file, cfg, editor):
+        fresh, parsing_table, trf = analyse(grammar_file, cfg.productions)
+        for nt in cfg.non_terminals:
+            self.assertEqual(cfg.first_sets.get(nt, set()), fresh.first_sets.get(nt, set()), nt)
+            self.assertEqual(cfg.follow_sets.get(nt, set()), fresh.follow_sets.get(nt, set()), nt)
+        self.assertEqual(editor.table, parsing_table)
+        self.assertEqual(editor.trf, trf)
+        conflicts = {cell: list(conflict.bodies) for cell, conflict in editor.conflicts.items()}
+        self.assertEqual(conflicts, fresh.ll1_conflicts())
+
+    def test_random_edits_match_full_analysis(self):
+        rng = random.Random(0)
+        for grammar_file in self.grammar_files:
+            for _ in range(10):
+                cfg = CFG(grammar_file, tracer=NULL_TRACER)
+                editor = GrammarEditor(cfg)
+                non_terminals = sorted(cfg.non_terminals)
+                terminals = sorted(cfg.terminals - {"$"})
+                for _ in range(25):
+                    head = rng.choice(non_terminals)
+                    if rng.random() < 0.4 and cfg.productions.get(head):
+                        editor.remove_production(head, rng.choice(cfg.productions[head]))
+                    else:
+                        symbols = non_terminals + terminals
+                        body = [rng.choice(symbols) for _ in range(rng.randrange(1, 4))]
+                        editor.add_production(head, ["eps"] if rng.random() < 0.1 else body)
+                    self.assert_matches_full_analysis(grammar_file, cfg, editor)
+
+    def test_add_then_remove_restores_analysis(self):
+        cfg = CFG(GRAMMAR_FILE, tracer=NULL_TRACER)
+        editor = GrammarEditor(cfg)
+        table = dict(editor.table)
+        trf = dict(editor.trf)
+
+        # Both F -> IDENTIFIER and the new production start with an identifier.
+        report = editor.add_production("F", ["IDENTIFIER", "PLUS", "F"])
+        self.assertFalse(report.ll1)
+        self.assertIn(("F", "[a-zA-Z_][a-zA-Z0-9_]*"), editor.conflicts)
+        editor.remove_production("F", ["IDENTIFIER", "PLUS", "F"])
+
+        self.assertEqual(editor.table, table)
+        self.assertEqual(editor.trf, trf)
+        self.assertEqual(editor.conflicts, {})
+
+    def test_invalid_edits_raise(self):
+        editor = GrammarEditor(CFG(GRAMMAR_FILE, tracer=NULL_TRACER))
+        with self.assertRaises(ValueError):
+            editor.remove_production("F", ["PLUS"])
+        with self.assertRaises(ValueError):
+            editor.add_production("NOT_A_SYMBOL", ["PLUS"])
+
+
+if __name__ == "__main__":
+    unittest.main()
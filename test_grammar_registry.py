@@ -0,0 +1,88 @@
+"""
+GrammarRegistry under concurrent get() calls: a grammar being compiled must
+not block lookups of other grammars, and is compiled once however many
+threads ask for it.
+
+    python -m unittest test_grammar_registry
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from grammar_registry import GrammarRegistry
+
+GRAMMAR_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "grammar.txt")
+
+
+class BlockingRegistry(GrammarRegistry):
+    """Holds the compile of self.slow until self.release is set."""
+
+    def __init__(self, slow):
+        super().__init__(cache_dir=None)
+        self.slow = slow
+        self.release = threading.Event()
+        self.compiling = threading.Event()
+        self.compiles = []
+
+    def _compile(self, grammar_file):
+        self.compiles.append(grammar_file)
+        if grammar_file == self.slow:
+            self.compiling.set()
+            self.release.wait(30)
+        return super()._compile(grammar_file)
+
+
+class GrammarRegistryTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.slow = os.path.join(self.workdir.name, "slow.txt")
+        shutil.copyfile(GRAMMAR_FILE, self.slow)
+        # Different contents, so a different digest.
+        self.fast = os.path.join(self.workdir.name, "fast.txt")
+        with open(GRAMMAR_FILE, encoding="utf-8") as src, open(self.fast, "w", encoding="utf-8") as f:
+            f.write(src.read() + "\n")
+
+    def tearDown(self):
+        self.workdir.cleanup()
+
+    def test_compile_does_not_block_other_grammars(self):
+        registry = BlockingRegistry(self.slow)
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(registry.get(self.slow)))
+            for _ in range(3)
+        ]
+        for thread in threads:
+            thread.start()
+        self.assertTrue(registry.compiling.wait(30))
+
+        self.assertIsNotNone(registry.get(self.fast))
+        self.assertIn(self.fast, registry)
+        self.assertNotIn(self.slow, registry)
+
+        registry.release.set()
+        for thread in threads:
+            thread.join(30)
+        self.assertEqual(len(results), 3)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual(registry.compiles.count(self.slow), 1)
+        self.assertEqual(registry.misses, 2)
+        self.assertEqual(registry.hits, 2)
+
+    def test_failed_compile_is_retried(self):
+        broken = os.path.join(self.workdir.name, "broken.txt")
+        with open(broken, "w", encoding="utf-8") as f:
+            f.write("START=S\n")
+        registry = GrammarRegistry(cache_dir=None)
+        for _ in range(2):
+            with self.assertRaises(Exception):
+                registry.get(broken)
+        self.assertEqual(registry.misses, 2)
+        self.assertEqual(len(registry), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+"""
+IncrementalParser.edit() against a parse from scratch: after every random
+edit, at several checkpoint intervals, the tree (or rejection) must be the
+one a fresh parse() of the edited tokens gives.
+
+    python -m unittest test_incremental
+"""
+
+import os
+import random
+import tempfile
+import unittest
+
+import grammar_families
+from grammar_compiler import compile_grammar
+from incremental import IncrementalParser
+
+GRAMMAR_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "grammar.txt")
+
+EXPRESSIONS = ["a + b * (c + 3)", "((x))", "1 * 2 * 3 + y", "(a + b) * (c + (d * e))", "+", ")"]
+
+
+def new_parser(compiled, checkpoint_interval):
+    return IncrementalParser(
+        compiled.index,
+        compiled.start_symbol,
+        compiled.terminals,
+        checkpoint_interval=checkpoint_interval,
+        classifier=compiled.classifier,
+    )
+
+
+def tree(result):
+    return result if result is None else result.to_dict()
+
+
+class IncrementalParserTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        rng = random.Random(0)
+        compiled = compile_grammar(GRAMMAR_FILE)
+        # (compiled grammar, token lists to build documents and edits from)
+        self.cases = [(compiled, [compiled.tokenize(text) for text in EXPRESSIONS])]
+        for path, family in grammar_families.write_grammars(self.workdir.name, 4):
+            compiled = compile_grammar(path)
+            pieces = [compiled.tokenize(family.make_input(rng.randrange(1, 20), rng)) for _ in range(6)]
+            self.cases.append((compiled, pieces))
+
+    def tearDown(self):
+        self.workdir.cleanup()
+
+    def assert_same_as_full_parse(self, compiled, parser, result, tokens):
+        self.assertEqual(parser.tokens, tokens)
+        expected = new_parser(compiled, parser.checkpoint_interval).parse(tokens)
+        self.assertEqual(tree(result), tree(expected), [t.lexeme for t in tokens])
+        self.assertEqual(parser.accepted, expected is not None)
+
+    def test_random_edits_match_full_parse(self):
+        rng = random.Random(1)
+        for compiled, pieces in self.cases:
+            for interval in (1, 2, 5, 64):
+                for _ in range(5):
+                    parser = new_parser(compiled, interval)
+                    tokens = [t for _ in range(rng.randrange(1, 5)) for t in rng.choice(pieces)]
+                    result = parser.parse(tokens)
+                    self.assert_same_as_full_parse(compiled, parser, result, tokens)
+                    for _ in range(20):
+                        start = rng.randrange(len(tokens) + 1)
+                        end = rng.randrange(start, min(len(tokens), start + 6) + 1)
+                        piece = rng.choice(pieces)
+                        cut = rng.randrange(len(piece) + 1)
+                        new_tokens = piece[:cut] if rng.random() < 0.5 else piece[cut:]
+                        tokens = tokens[:start] + new_tokens + tokens[end:]
+                        result = parser.edit(start, end, new_tokens)
+                        self.assert_same_as_full_parse(compiled, parser, result, tokens)
+
+    def test_edit_before_parse(self):
+        compiled, pieces = self.cases[0]
+        parser = new_parser(compiled, 2)
+        result = parser.edit(0, 0, pieces[0])
+        self.assert_same_as_full_parse(compiled, parser, result, pieces[0])
+
+    def test_out_of_range_edits_raise(self):
+        compiled, pieces = self.cases[0]
+        tokens = pieces[0]
+        parser = new_parser(compiled, 2)
+        expected = tree(parser.parse(tokens))
+        for start, end in [(-1, 0), (2, 1), (0, len(tokens) + 1), (len(tokens) + 1, len(tokens) + 1)]:
+            with self.assertRaises(IndexError):
+                parser.edit(start, end, pieces[1])
+        # A rejected edit leaves the document and its parse untouched.
+        self.assertEqual(parser.tokens, tokens)
+        self.assertEqual(tree(parser.result), expected)
+        result = parser.edit(0, 1, pieces[1][:1])
+        self.assert_same_as_full_parse(compiled, parser, result, pieces[1][:1] + tokens[1:])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+"""
+parse_tokens_parallel against a sequential DPDA parse: with chunks of a few
+tokens, split points inside parentheses (where a chunk's assumed stack is
+wrong and it has to be re-parsed) and rejected inputs, the result must be the
+same CompactTree, node for node, or None when the DPDA rejects.
+
+    python -m unittest test_parallel
+"""
+
+import os
+import random
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from unittest import mock
+
+import parallel
+from compact_tree import CompactTree
+from grammar_compiler import compile_grammar
+from p2 import DPDA
+
+GRAMMAR_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "grammar.txt")
+
+
+def expression(rng, depth):
+    """A random expression over grammar.txt with parentheses nested up to depth."""
+    terms = []
+    for _ in range(rng.randrange(1, 5)):
+        factors = []
+        for _ in range(rng.randrange(1, 3)):
+            if depth and rng.random() < 0.4:
+                factors.append(f"({expression(rng, depth - 1)})")
+            else:
+                factors.append(rng.choice(["a", "b1", "x_y", "7", "42"]))
+        terms.append(" * ".join(factors))
+    return " + ".join(terms)
+
+
+def columns(tree):
+    """tree's nodes as comparable columns, with symbol names instead of ids."""
+    if tree is None:
+        return None
+    return (
+        [tree.symbols[symbol_id] for symbol_id in tree.symbol_id],
+        list(tree.parent),
+        list(tree.first_child),
+        list(tree.next_sibling),
+        list(tree.span_start),
+        list(tree.span_end),
+        tree.lexemes,
+    )
+
+
+class ParallelParseTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.compiled = compile_grammar(GRAMMAR_FILE)
+        cls.executor = ProcessPoolExecutor(
+            max_workers=2, initializer=parallel._init_worker, initargs=(cls.compiled,)
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.executor.shutdown()
+
+    def sequential(self, tokens):
+        compiled = self.compiled
+        return DPDA(
+            compiled.index,
+            tokens,
+            compiled.start_symbol,
+            compiled.terminals,
+            classifier=compiled.classifier,
+            tree_builder=CompactTree(),
+        ).run()
+
+    def assert_same_as_sequential(self, tokens, min_chunk_tokens):
+        tree = parallel.parse_tokens_parallel(
+            self.compiled,
+            tokens,
+            jobs=2,
+            min_chunk_tokens=min_chunk_tokens,
+            executor=self.executor,
+        )
+        expected = self.sequential(tokens)
+        self.assertEqual(columns(tree), columns(expected), " ".join(t.lexeme for t in tokens))
+        return tree
+
+    def test_same_trees_as_sequential_parse(self):
+        rng = random.Random(0)
+        outcomes = []
+        run = parallel._run
+
+        def recording_run(*args):
+            outcome, stack = run(*args)
+            outcomes.append(outcome)
+            return outcome, stack
+
+        accepted = rejected = 0
+        with mock.patch.object(parallel, "_run", recording_run):
+            for _ in range(40):
+                tokens = self.compiled.tokenize(expression(rng, 3))
+                tree = self.assert_same_as_sequential(tokens, rng.choice([1, 2, 3, 8]))
+                accepted += tree is not None
+
+                # Rejected: a token dropped, or an operator doubled.
+                position = rng.randrange(len(tokens))
+                broken = tokens[:position] + tokens[position + 1 :]
+                self.assert_same_as_sequential(broken, rng.choice([1, 2, 3]))
+                doubled = tokens[:position] + self.compiled.tokenize("+ +") + tokens[position:]
+                tree = self.assert_same_as_sequential(doubled, rng.choice([1, 2, 3]))
+                rejected += tree is None
+
+        self.assertEqual(accepted, 40)
+        self.assertEqual(rejected, 40)
+        # Some split points fell inside parentheses.
+        self.assertIn(parallel.MISSED_SPLIT, outcomes)
+        self.assertIn(parallel.AT_SPLIT, outcomes)
+
+    def test_nested_parentheses(self):
+        text = " + ".join(["((a + b) * (c + (d + e)))", "f", "(g + (h))", "i * (j + k)"] * 8)
+        tokens = self.compiled.tokenize(text)
+        for min_chunk_tokens in (1, 2, 5):
+            self.assertIsNotNone(self.assert_same_as_sequential(tokens, min_chunk_tokens))
+        self.assertIsNone(self.assert_same_as_sequential(tokens[:-1], 2))
+        self.assertIsNone(self.assert_same_as_sequential(tokens[1:], 2))
+
+    def test_empty_and_short_inputs(self):
+        for text in ["", "a", "a + b", "+"]:
+            self.assert_same_as_sequential(self.compiled.tokenize(text), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+"""
+ParseServer request routing: which requests are parsed on the event loop and
+which are sent to the executor.
+
+    python -m unittest test_server
+"""
+
+import asyncio
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import server
+
+GRAMMAR_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "grammar.txt")
+
+AMBIGUOUS_GRAMMAR = (
+    "START=E\n"
+    "NON_TERMINALS=E,PLUS,ID\n"
+    "TERMINALS=\\+,[a-z]+,eps\n"
+    "E -> E PLUS E | ID\n"
+    "PLUS -> \\+\n"
+    "ID -> [a-z]+\n"
+)
+
+
+class CountingExecutor(ThreadPoolExecutor):
+    """Runs _worker_parse in a thread of this process and counts submissions."""
+
+    def __init__(self, cache_dir):
+        super().__init__(
+            max_workers=1,
+            initializer=server._init_worker,
+            initargs=(cache_dir, server.DEFAULT_MAX_BYTES),
+        )
+        self.submitted = 0
+
+    def submit(self, *args, **kwargs):
+        self.submitted += 1
+        return super().submit(*args, **kwargs)
+
+
+class ParseServerTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.ambiguous = os.path.join(self.workdir.name, "ambiguous.txt")
+        with open(self.ambiguous, "w", encoding="utf-8") as f:
+            f.write(AMBIGUOUS_GRAMMAR)
+        cache_dir = os.path.join(self.workdir.name, "cache")
+        self.server = server.ParseServer([GRAMMAR_FILE, self.ambiguous], cache_dir=cache_dir)
+        self.server.close()
+        self.executor = CountingExecutor(cache_dir)
+        self.server.executor = self.executor
+
+    def tearDown(self):
+        self.executor.shutdown()
+        self.workdir.cleanup()
+
+    def parse(self, request):
+        return asyncio.run(self.server.parse(request))
+
+    def test_small_ll1_input_parsed_inline(self):
+        response = self.parse({"id": 1, "input": "a + b * c"})
+        self.assertEqual(response, {"id": 1, "accepted": True})
+        self.assertEqual(self.executor.submitted, 0)
+
+    def test_large_ll1_input_sent_to_executor(self):
+        self.server.inline_limit = 4
+        response = self.parse({"id": 1, "input": "a + b * c"})
+        self.assertEqual(response, {"id": 1, "accepted": True})
+        self.assertEqual(self.executor.submitted, 1)
+
+    def test_earley_input_sent_to_executor_however_small(self):
+        self.assertEqual(self.server.registry.get(self.ambiguous).engine, "earley")
+        for request_id, text, accepted in [(1, "a + b + c", True), (2, "a + + b", False)]:
+            response = self.parse({"id": request_id, "input": text, "grammar": self.ambiguous})
+            self.assertEqual(response["accepted"], accepted, text)
+        self.assertEqual(self.executor.submitted, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
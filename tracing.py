@@ -0,0 +1,74 @@
+from collections import deque
+
+# Trace levels, from quietest to most verbose.
+OFF = 0
+SUMMARY = 1  # one line per parse / table build (accept, reject, conflicts)
+FULL = 2  # one line per automaton step
+
+LEVELS = {"off": OFF, "summary": SUMMARY, "full": FULL}
+
+
+def parse_level(level):
+    """Accepts a level constant or its name ('off', 'summary', 'full')."""
+    if isinstance(level, str):
+        try:
+            return LEVELS[level.lower()]
+        except KeyError:
+            raise ValueError(
+                f"Unknown trace level '{level}', expected one of {sorted(LEVELS)}"
+            )
+    return level
+
+
+def print_sink(message):
+    print(message)
+
+
+class RingBufferSink:
+    """Keeps only the last maxlen trace messages in memory."""
+
+    def __init__(self, maxlen=1000):
+        self.records = deque(maxlen=maxlen)
+
+    def __call__(self, message):
+        self.records.append(message)
+
+    def dump(self, sink=print_sink):
+        for message in self.records:
+            sink(message)
+
+    def clear(self):
+        self.records.clear()
+
+
+class Tracer:
+    """
+    Routes trace messages to a sink (any callable taking a string).
+
+    Callers are expected to read summary_enabled / full_enabled once, outside
+    their hot loops, and only build messages when the level is on; that way the
+    OFF level costs nothing per step.
+    """
+
+    def __init__(self, level=SUMMARY, sink=print_sink):
+        self.level = parse_level(level)
+        self.sink = sink
+
+    @property
+    def summary_enabled(self):
+        return self.level >= SUMMARY
+
+    @property
+    def full_enabled(self):
+        return self.level >= FULL
+
+    def summary(self, message):
+        if self.level >= SUMMARY:
+            self.sink(message)
+
+    def full(self, message):
+        if self.level >= FULL:
+            self.sink(message)
+
+
+NULL_TRACER = Tracer(OFF)
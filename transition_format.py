@@ -0,0 +1,308 @@
+"""
+Compact binary format for DPDA transition files.
+
+Text transition files (p2.load_transitions' "state input stack_top next push"
+lines and dpda.DPDA.read_from_file's header plus transition lines) are parsed
+line by line on every start. This module writes the same transitions as one
+binary file that loads without any text parsing:
+
+    python transition_format.py export dpda.txt -o dpda.tlat
+    python transition_format.py export dpda2.txt -o dpda2.tlat --format dpda
+
+Layout (little-endian, every section 4-byte aligned):
+
+    header     magic b"TLAT", u16 version, u8 kind (KIND_TRF or KIND_DPDA),
+               u8 id_width (2 or 4), u32 n_symbols, u32 n_transitions,
+               u32 symbols_offset, u32 records_offset, u32 machine_offset
+    symbols    u32 end offsets[n_symbols] into the blob that follows, which
+               holds every name in UTF-8 followed by a NUL byte
+    records    n_transitions x 5 symbol ids of id_width bytes (u16 when there
+               are at most 65536 symbols): state, input, stack_top,
+               next_state, push
+    machine    (KIND_DPDA only) u32 start_state, u32 start_stack, then the
+               states, input alphabet, stack alphabet and accept states, each
+               as a u32 count followed by that many symbol ids
+
+Every string (states, input symbols, stack symbols and whole push strings) is
+interned once in the symbol table. TransitionFile memory-maps a file and only
+reads the header up front; symbol names are decoded on first use and the
+transition dict is built when first asked for. p2.load_transitions and
+dpda.DPDA.read_from_file accept binary files directly.
+"""
+
+import argparse
+import mmap
+import struct
+import sys
+from array import array
+
+MAGIC = b"TLAT"
+# Bump whenever the layout changes; files with another version are rejected.
+FORMAT_VERSION = 1
+
+KIND_TRF = 0  # a p2 trf dict
+KIND_DPDA = 1  # a dpda.DPDA: transitions plus states, alphabets and start/accept
+
+_HEADER = struct.Struct("<4sHBBIIIII")
+_RECORD_FIELDS = 5
+
+
+class TransitionFileError(ValueError):
+    pass
+
+
+def is_binary(path):
+    """True if path starts with the binary format's magic bytes."""
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+class _SymbolInterner:
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+
+    def __call__(self, name):
+        symbol_id = self.ids.get(name)
+        if symbol_id is None:
+            symbol_id = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return symbol_id
+
+
+# array typecodes by id width.
+_TYPECODES = {2: "H", 4: "I"}
+
+
+def _pack_ints(values, typecode="I"):
+    data = array(typecode, values)
+    if sys.byteorder != "little":
+        data.byteswap()
+    return data.tobytes()
+
+
+def _write(path, kind, transitions, machine=None):
+    """transitions is {(state, input, stack_top): (next_state, push)} of strings."""
+    intern = _SymbolInterner()
+    records = []
+    for (state, input_symbol, stack_top), (next_state, push) in transitions.items():
+        records.extend(
+            (
+                intern(state),
+                intern(input_symbol),
+                intern(stack_top),
+                intern(next_state),
+                intern(push),
+            )
+        )
+
+    machine_bytes = b""
+    if machine is not None:
+        start_state, start_stack, sections = machine
+        words = [intern(start_state), intern(start_stack)]
+        for section in sections:
+            words.append(len(section))
+            words.extend(intern(name) for name in sorted(section))
+        machine_bytes = _pack_ints(words)
+
+    encoded = [name.encode("utf-8") + b"\0" for name in intern.names]
+    ends = []
+    end = 0
+    for name in encoded:
+        end += len(name)
+        ends.append(end)
+    blob = b"".join(encoded)
+    blob += b"\0" * (-len(blob) % 4)
+
+    id_width = 2 if len(encoded) <= 0x10000 else 4
+    record_bytes = _pack_ints(records, _TYPECODES[id_width])
+    record_bytes += b"\0" * (-len(record_bytes) % 4)
+
+    symbols_offset = _HEADER.size
+    records_offset = symbols_offset + 4 * len(ends) + len(blob)
+    machine_offset = records_offset + len(record_bytes) if machine is not None else 0
+    header = _HEADER.pack(
+        MAGIC,
+        FORMAT_VERSION,
+        kind,
+        id_width,
+        len(encoded),
+        len(records) // _RECORD_FIELDS,
+        symbols_offset,
+        records_offset,
+        machine_offset,
+    )
+    with open(path, "wb") as f:
+        f.write(header)
+        f.write(_pack_ints(ends))
+        f.write(blob)
+        f.write(record_bytes)
+        f.write(machine_bytes)
+
+
+def write_trf(trf, path):
+    """Writes a p2 trf dict {(state, input, stack_top): (next_state, push_string)}."""
+    _write(path, KIND_TRF, trf)
+
+
+def write_dpda(dpda, path):
+    """Writes a dpda.DPDA's transitions together with its states, alphabets and start/accept."""
+    sections = (dpda.states, dpda.input_alphabet, dpda.stack_alphabet, dpda.accept_states)
+    _write(path, KIND_DPDA, dpda.transitions, (dpda.start_state, dpda.start_stack, sections))
+
+
+class TransitionFile:
+    """
+    A memory-mapped binary transition file. Only the header is read when it is
+    opened; symbol names, the transition dict and the machine description are
+    decoded on first use.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._read_header(path)
+        except Exception:
+            self._map.close()
+            raise
+        self._names = [None] * self.n_symbols
+        self._transitions = None
+
+    def _read_header(self, path):
+        if len(self._map) < _HEADER.size:
+            raise TransitionFileError(f"{path}: too short for a transition file")
+        (
+            magic,
+            version,
+            self.kind,
+            id_width,
+            self.n_symbols,
+            self.n_transitions,
+            symbols_offset,
+            records_offset,
+            machine_offset,
+        ) = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise TransitionFileError(f"{path}: not a binary transition file")
+        if version != FORMAT_VERSION:
+            raise TransitionFileError(
+                f"{path}: format version {version}, expected {FORMAT_VERSION}"
+            )
+        if id_width not in _TYPECODES:
+            raise TransitionFileError(f"{path}: bad symbol id width {id_width}")
+        self._ends = self._int_view(symbols_offset, self.n_symbols)
+        self._blob_offset = symbols_offset + 4 * self.n_symbols
+        self.records = self._int_view(
+            records_offset, self.n_transitions * _RECORD_FIELDS, _TYPECODES[id_width]
+        )
+        self._machine_offset = machine_offset
+
+    def _int_view(self, offset, count, typecode="I"):
+        """A zero-copy view of count little-endian ints (u32, or u16 for "H") at offset."""
+        size = array(typecode).itemsize
+        if offset + size * count > len(self._map):
+            raise TransitionFileError("transition file is truncated")
+        data = memoryview(self._map)[offset : offset + size * count]
+        if sys.byteorder == "little":
+            return data.cast(typecode)
+        # Big-endian hosts get a swapped copy.
+        swapped = array(typecode)
+        swapped.frombytes(data)
+        swapped.byteswap()
+        return swapped
+
+    def name(self, symbol_id):
+        name = self._names[symbol_id]
+        if name is None:
+            start = self._ends[symbol_id - 1] if symbol_id else 0
+            offset = self._blob_offset
+            name = self._names[symbol_id] = str(
+                self._map[offset + start : offset + self._ends[symbol_id] - 1], "utf-8"
+            )
+        return name
+
+    def names(self):
+        """All symbol names, decoded in one pass."""
+        if self.n_symbols == 0:
+            return []
+        offset = self._blob_offset
+        blob = self._map[offset : offset + self._ends[-1] - 1]
+        return str(blob, "utf-8").split("\0")
+
+    def transitions(self):
+        """Returns {(state, input, stack_top): (next_state, push)}, built on first call."""
+        if self._transitions is None:
+            name_of = self.names().__getitem__
+            records = self.records
+            state, input_symbol, stack_top, next_state, push = (
+                map(name_of, records[i::_RECORD_FIELDS]) for i in range(_RECORD_FIELDS)
+            )
+            self._transitions = dict(
+                zip(zip(state, input_symbol, stack_top), zip(next_state, push))
+            )
+        return self._transitions
+
+    def machine(self):
+        """
+        Returns (start_state, start_stack, states, input_alphabet,
+        stack_alphabet, accept_states) of a KIND_DPDA file.
+        """
+        if self.kind != KIND_DPDA:
+            raise TransitionFileError("file holds a trf, not a DPDA")
+        offset = self._machine_offset
+        start_state, start_stack = self._int_view(offset, 2)
+        offset += 8
+        sections = []
+        for _ in range(4):
+            (count,) = self._int_view(offset, 1)
+            ids = self._int_view(offset + 4, count)
+            sections.append({self.name(symbol_id) for symbol_id in ids})
+            offset += 4 + 4 * count
+        return (self.name(start_state), self.name(start_stack), *sections)
+
+    def close(self):
+        # Views into the map must be released before it can be closed.
+        for view in (self._ends, self.records):
+            if isinstance(view, memoryview):
+                view.release()
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Binary DPDA transition files")
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="convert a text transition file")
+    export.add_argument("input", help="text transition file")
+    export.add_argument("-o", "--output", required=True, help="binary file to write")
+    export.add_argument(
+        "--format",
+        choices=("trf", "dpda"),
+        default="trf",
+        help="trf: p2.load_transitions lines; dpda: dpda.DPDA.read_from_file format",
+    )
+    args = arg_parser.parse_args(argv)
+
+    if args.format == "trf":
+        from p2 import load_transitions
+
+        transitions = load_transitions(args.input)
+        write_trf(transitions, args.output)
+    else:
+        from dpda import DPDA
+
+        machine = DPDA()
+        machine.read_from_file(args.input)
+        transitions = machine.transitions
+        write_dpda(machine, args.output)
+    print(f"Wrote {len(transitions)} transitions to {args.output}")
+
+
+if __name__ == "__main__":
+    main()